@@ -0,0 +1,113 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_aws_ssm import backup_to_file, restore_from_file
+from backup_cloud_ssm.backup_format import json_format
+from backup_cloud_ssm.rate_limit import put_parameter_tps
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+
+# sentinel marking the end of an iterator run on the executor
+end_of_items = object()
+
+
+class async_aws_ssm_dict:
+    """asyncio access to AWS SSM parameters
+
+    every call is made through an aws_ssm_dict, so values come back
+    in the same return_type shapes and errors are mapped to KeyError
+    and AttributeError in the same way.  The blocking boto3 calls run
+    on a thread pool of max_concurrency threads which share one client,
+    made on first use with its connection pool sized to match, so many
+    requests can be in flight at once without blocking the event loop.
+    Other keyword arguments are passed to aws_ssm_dict.
+    """
+
+    def __init__(self, max_concurrency=10, **kwargs):
+        self.sync_dict = aws_ssm_dict(max_pool_connections=max_concurrency, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def get(self, key: str):
+        return await self.run(self.sync_dict.__getitem__, key)
+
+    async def set(self, key: str, value, overwrite=False):
+        await self.run(self.sync_dict.put_param, key, value, overwrite=overwrite)
+
+    async def delete(self, key: str, wait=True):
+        await self.run(self.sync_dict.__delitem__, key, wait)
+
+    async def get_many(self, keys):
+        """look up keys in concurrent batches of ten
+
+        returns a (found, missing) pair as aws_ssm_dict.get_many does,
+        using its value cache.
+        """
+        return await self.run(self.sync_dict.get_many, list(keys), self.max_concurrency)
+
+    async def iterate_in_executor(self, iterable, batch_size=100):
+        """async iterator over a blocking iterable, batch_size items per hop"""
+        iterator = iter(iterable)
+
+        def next_batch():
+            batch = []
+            for item in iterator:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    break
+            else:
+                batch.append(end_of_items)
+            return batch
+
+        while True:
+            for item in await self.run(next_batch):
+                if item is end_of_items:
+                    return
+                yield item
+
+    def keys(self):
+        return self.iterate_in_executor(self.sync_dict.iterate_param_descs_for_names())
+
+    def items(self):
+        """async iterator of (key, value) pairs fetched a page at a time"""
+        return self.iterate_in_executor(self.sync_dict.iterate_items())
+
+    def __aiter__(self):
+        return self.keys()
+
+    async def backup_to_file(self, file, format=json_format, **kwargs):
+        await self.run(
+            backup_to_file, file, format=format, ssm_dict=self.sync_dict, **kwargs
+        )
+
+    async def restore_from_file(
+        self, file, jobs=10, rate=put_parameter_tps, private_key=None
+    ):
+        """restore a backup with up to jobs parameter writes in flight
+
+        the restore runs on the executor as backup_aws_ssm.restore_from_file,
+        which returns the per key results; encrypted backups are read
+        with private_key.
+        """
+        return await self.run(
+            restore_from_file,
+            file,
+            jobs=jobs,
+            rate=rate,
+            ssm_dict=self.sync_dict,
+            private_key=private_key,
+        )
@@ -1,16 +1,658 @@
+from datetime import datetime, timezone
 import argparse
+import json
 import sys
 import backup_cloud_ssm
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_aws_ssm import failed, summarise_restore
+from backup_cloud_ssm.backup_format import formats, json_format, jsonl_format
+from backup_cloud_ssm.backup_index import backup_index, diff_indexes, redacted
+from backup_cloud_ssm.checkpoint import resumable_backup, resumable_restore
+from backup_cloud_ssm.clients import shared_session
+from backup_cloud_ssm.envelope import compressions, load_public_key, load_private_key
+from backup_cloud_ssm.incremental import incremental_backup, compact
+from backup_cloud_ssm.instrument import api_stats
+from backup_cloud_ssm.orchestrate import backup_targets, make_targets
+from backup_cloud_ssm.rate_limit import put_parameter_tps, rate_controller
+from backup_cloud_ssm.repository import (
+    backup_repository,
+    backup_to_repository,
+    restore_from_repository,
+)
+from backup_cloud_ssm.replicate import sync
+from backup_cloud_ssm.restore_plan import diff_restore
+from backup_cloud_ssm.s3_stream import is_s3_url
+from backup_cloud_ssm.snapshot import snapshot_backup, snapshot_records
+
+# args.rate_controller before run_rate_controller has made it
+unset = object()
+
+
+def scoped_dict(args, return_type="value", region_name=None, controller=None):
+    """an aws_ssm_dict for the --path, --include and --exclude given
+
+    controller replaces the run's adaptive rate_controller, for a
+    dictionary in a region of its own.
+    """
+    if controller is None:
+        controller = run_rate_controller(args)
+    return aws_ssm_dict(
+        return_type=return_type,
+        region_name=region_name,
+        path=args.path,
+        include=args.include,
+        exclude=args.exclude,
+        stats=args.stats,
+        rate_controller=controller,
+    )
+
+
+def run_rate_controller(args):
+    """the run's adaptive rate_controller, made when first needed
+
+    commands which don't call SSM, or like sync make controllers of
+    their own, never pay for the account lookup and state files.
+    """
+    if args.rate_controller is unset:
+        args.rate_controller = region_rate_controller(args)
+    return args.rate_controller
+
+
+def region_rate_controller(args, region_name=None):
+    """an adaptive rate_controller for one region, if rates are adaptive
+
+    SSM throttles each account and region separately, so throttling
+    in one region shouldn't slow calls to another.  Rates kept in
+    --rate-state are filed under the account and region.
+    """
+    if not (args.adaptive_rate or args.rate_state):
+        return None
+    account_id = None
+    if args.rate_state is not None:
+        session = shared_session(region_name)
+        region_name = session.region_name
+        account_id = session.client("sts").get_caller_identity()["Account"]
+    return rate_controller(
+        state_dir=args.rate_state,
+        stats=args.stats,
+        region_name=region_name,
+        account_id=account_id,
+    )
+
+
+def restore_rate(args):
+    """the fixed PutParameter rate, unless adaptive rates are in use"""
+    return None if args.adaptive_rate or args.rate_state else args.rate
+
+
+def backup_output(args):
+    """the --output path or s3:// URL, or else stdout"""
+    if args.output is not None:
+        return args.output
+    return sys.stdout if args.encrypt_key is None else sys.stdout.buffer
+
+
+def restore_input(args):
+    """the --input path or s3:// URL, or else stdin"""
+    if args.input is not None:
+        return args.input
+    return sys.stdin if args.decrypt_key is None else sys.stdin.buffer
+
+
+def backup_public_key(args):
+    """the public key from --encrypt-key or None"""
+    if args.encrypt_key is None:
+        return None
+    return load_public_key(args.encrypt_key)
+
+
+def run_resumable_backup(args):
+    if args.output is None:
+        sys.exit("--output is needed for a checkpointed backup")
+    if is_s3_url(args.output):
+        sys.exit("a checkpointed backup must be written to a local file")
+    # the backup is appended to and cut back on resume, which an
+    # encrypted stream or a single json object can't be
+    unsupported = [
+        flag
+        for flag, given in (
+            ("--encrypt-key", args.encrypt_key is not None),
+            ("--snapshot", args.snapshot),
+            ("--manifest", args.manifest is not None),
+            ("--format json", args.format_given == json_format),
+        )
+        if given
+    ]
+    if unsupported:
+        sys.exit("--checkpoint can't be used with " + ", ".join(unsupported))
+    failures = resumable_backup(
+        args.output,
+        args.checkpoint,
+        resume=args.resume,
+        ssm_dict=scoped_dict(args, return_type="dict"),
+    )
+    for name in failures:
+        print("backup: failed: " + name, file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+def run_snapshot(args):
+    counts = snapshot_backup(
+        backup_output(args),
+        format=args.format,
+        ssm_dict=scoped_dict(args, return_type="dict"),
+        public_key=backup_public_key(args),
+        compression=args.compress,
+    )
+    print(
+        "snapshot: "
+        + ", ".join(k + ": " + str(v) for k, v in counts.as_dict().items()),
+        file=sys.stderr,
+    )
+
+
+def run_backup(args):
+    if args.checkpoint is not None:
+        run_resumable_backup(args)
+        return
+    if args.snapshot:
+        run_snapshot(args)
+        return
+    ssm_dict = scoped_dict(args, return_type="dict")
+    if args.manifest is None:
+        backup_cloud_ssm.backup_to_file(
+            backup_output(args),
+            format=args.format,
+            ssm_dict=ssm_dict,
+            public_key=backup_public_key(args),
+            compression=args.compress,
+        )
+        return
+    changed, deleted = incremental_backup(
+        backup_output(args),
+        args.manifest,
+        format=args.format,
+        full=args.full,
+        ssm_dict=ssm_dict,
+        public_key=backup_public_key(args),
+        compression=args.compress,
+    )
+    print(
+        "backup: changed: " + str(changed) + ", deleted: " + str(deleted),
+        file=sys.stderr,
+    )
+
+
+def run_multi_backup(args):
+    if args.output_dir is None:
+        sys.exit("--output-dir is needed when backing up several regions")
+    targets = make_targets(args.regions, args.profiles, args.assume_role)
+    results = backup_targets(
+        targets,
+        args.output_dir,
+        format=args.format,
+        max_workers=args.max_targets,
+        rate=args.target_rate,
+        path=args.path,
+        include=args.include,
+        exclude=args.exclude,
+        public_key=backup_public_key(args),
+        compression=args.compress,
+        stats=args.stats,
+    )
+    for result in results:
+        print(
+            result["output"]
+            + ": "
+            + result["status"]
+            + " "
+            + str(result["seconds"])
+            + "s",
+            file=sys.stderr,
+        )
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)
+
+
+def run_restore(args):
+    source, private_key = restore_input(args), None
+    if args.decrypt_key is not None:
+        private_key = load_private_key(args.decrypt_key)
+    if args.diff:
+        plan, results = diff_restore(
+            source,
+            ssm_dict=scoped_dict(args),
+            overwrite_changed=args.overwrite,
+            dry_run=args.dry_run,
+            jobs=args.jobs,
+            rate=restore_rate(args),
+            private_key=private_key,
+        )
+        if args.dry_run:
+            for line in plan.lines():
+                print(line)
+        print(
+            "plan: " + ", ".join(k + ": " + str(v) for k, v in plan.summary().items()),
+            file=sys.stderr,
+        )
+        if args.dry_run:
+            # nothing was written, so there are no results to summarise
+            return
+    elif args.checkpoint is not None:
+        results = resumable_restore(
+            source,
+            args.checkpoint,
+            resume=args.resume,
+            jobs=args.jobs,
+            rate=restore_rate(args),
+            ssm_dict=scoped_dict(args),
+            private_key=private_key,
+        )
+    else:
+        results = backup_cloud_ssm.restore_from_file(
+            source,
+            jobs=args.jobs,
+            rate=restore_rate(args),
+            ssm_dict=scoped_dict(args),
+            private_key=private_key,
+        )
+    summary = summarise_restore(results)
+    print(
+        "restore: " + ", ".join(k + ": " + str(v) for k, v in summary.items()),
+        file=sys.stderr,
+    )
+    if summary[failed]:
+        sys.exit(1)
+
+
+def run_compact(args):
+    private_key = None
+    if args.decrypt_key is not None:
+        private_key = load_private_key(args.decrypt_key)
+    compact(
+        args.files,
+        backup_output(args),
+        format=args.format,
+        private_key=private_key,
+        public_key=backup_public_key(args),
+        compression=args.compress,
+    )
+
+
+def run_repo(args):
+    if args.encrypt_key is not None:
+        # objects are stored by the hash of their plain content
+        sys.exit("repositories can't be encrypted; --encrypt-key isn't supported")
+    repository = backup_repository(args.repository)
+    if args.repo_command == "backup":
+        ssm_dict = scoped_dict(args, return_type="dict")
+        records = None
+        if args.snapshot:
+            records = snapshot_records(ssm_dict, datetime.now(timezone.utc))
+        print(backup_to_repository(repository, ssm_dict=ssm_dict, records=records))
+    elif args.repo_command == "list":
+        for snapshot_id in repository.snapshots():
+            print(snapshot_id)
+    elif args.repo_command == "restore":
+        results = restore_from_repository(
+            repository,
+            args.snapshot_id,
+            jobs=args.jobs,
+            rate=restore_rate(args),
+            ssm_dict=scoped_dict(args),
+        )
+        summary = summarise_restore(results)
+        print(
+            "restore: " + ", ".join(k + ": " + str(v) for k, v in summary.items()),
+            file=sys.stderr,
+        )
+        if summary[failed]:
+            sys.exit(1)
+    elif args.repo_command == "diff":
+        print(json.dumps(repository.diff(args.old, args.new), indent=2))
+    elif args.repo_command == "forget":
+        repository.forget(args.snapshot_id)
+    elif args.repo_command == "gc":
+        print("gc: removed " + str(repository.gc()) + " objects", file=sys.stderr)
+
+
+def run_sync(args):
+    """replicate parameters from one region to another until interrupted"""
+    try:
+        counts = sync(
+            scoped_dict(
+                args,
+                return_type="dict",
+                region_name=args.source,
+                controller=region_rate_controller(args, args.source),
+            ),
+            scoped_dict(
+                args,
+                return_type="dict",
+                region_name=args.target,
+                controller=region_rate_controller(args, args.target),
+            ),
+            args.state,
+            interval=args.interval,
+            jobs=args.jobs,
+            rate=restore_rate(args),
+            once=args.once,
+        )
+    except KeyboardInterrupt:
+        return
+    print(
+        "sync: " + ", ".join(k + ": " + str(v) for k, v in counts.items()),
+        file=sys.stderr,
+    )
+    if counts["failed"]:
+        sys.exit(1)
+
+
+def run_diff(args):
+    """compare two backups by their indexes"""
+    changes = []
+    with backup_index(args.old) as old, backup_index(args.new) as new:
+        for change, name, old_entry, new_entry in diff_indexes(old, new):
+            item = {"change": change, "name": name}
+            if args.values:
+                if old_entry is not None:
+                    item["old"] = redacted(old.record(old_entry), args.show_secrets)
+                if new_entry is not None:
+                    item["new"] = redacted(new.record(new_entry), args.show_secrets)
+            changes.append(item)
+    if args.json:
+        print(json.dumps(changes, indent=2))
+        return
+    marks = {"added": "+", "removed": "-", "changed": "~"}
+    for item in changes:
+        print(marks[item["change"]] + " " + item["name"])
+        for side in ("old", "new"):
+            if side in item:
+                print("    " + side + ": " + json.dumps(item[side]))
+
+
+def run_query(args):
+    """look up parameters in each backup, noting where they change"""
+    results = []
+    last = {}
+    for file in args.files:
+        with backup_index(file) as index:
+            found = {}
+            for entry in index.matching(args.pattern):
+                found[entry.name] = entry
+                results.append(
+                    {
+                        "file": file,
+                        "name": entry.name,
+                        "changed": last.get(entry.name) != entry.digest,
+                        "param": redacted(index.record(entry), args.show_secrets),
+                    }
+                )
+            for name in last:
+                if name not in found and last[name] is not None:
+                    results.append(
+                        {"file": file, "name": name, "changed": True, "param": None}
+                    )
+            last = dict.fromkeys(last)
+            last.update((name, entry.digest) for name, entry in found.items())
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        state = json.dumps(result["param"]) if result["param"] else "absent"
+        mark = "*" if result["changed"] else " "
+        print(mark + " " + result["file"] + " " + result["name"] + " " + state)
+
+
+def report_stats(args):
+    if args.show_stats:
+        for line in args.stats.report_lines():
+            print("stats: " + line, file=sys.stderr)
+    if args.stats_json:
+        args.stats.write_json(args.stats_json)
+    if args.stats_prometheus:
+        args.stats.write_prometheus_textfile(args.stats_prometheus)
+    if args.statsd:
+        args.stats.send_statsd(args.statsd)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Backup AWS SSM Parameter Store")
     parser.add_argument("--restore", help="restore from stdin", action="store_true")
+    parser.add_argument(
+        "--diff",
+        help="with --restore, compare with SSM first and only write differences",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--overwrite",
+        help="with --diff, replace parameters which differ from the backup",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--dry-run",
+        help="with --diff, print the plan without writing anything",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--jobs",
+        help="number of parameters to restore in parallel",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--rate",
+        help="maximum PutParameter calls per second during restore (default %(default)s)",
+        type=float,
+        default=put_parameter_tps,
+    )
+    parser.add_argument(
+        "--adaptive-rate",
+        help="adjust read and write rates to what SSM allows instead of --rate",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--rate-state",
+        help="share adaptive rates with other runs using this directory",
+    )
+    parser.add_argument(
+        "--format",
+        help="backup file format; restore recognises either (default "
+        + json_format
+        + ")",
+        choices=formats,
+    )
+    parser.add_argument(
+        "--encrypt-key",
+        help="compress and encrypt the backup to this PEM public key",
+    )
+    parser.add_argument(
+        "--compress",
+        help="compression used with --encrypt-key (default %(default)s)",
+        choices=compressions.keys(),
+        default="gzip",
+    )
+    parser.add_argument(
+        "--decrypt-key",
+        help="restore an encrypted backup using this PEM private key",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="make an incremental backup of parameters changed since this manifest",
+    )
+    parser.add_argument(
+        "--full",
+        help="with --manifest, back up everything and start a new manifest",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="back up parameters as they were when the backup started",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="save progress to this file so that a failed run can be resumed",
+    )
+    parser.add_argument(
+        "--resume",
+        help="with --checkpoint, carry on from the saved progress",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--output",
+        help="write the backup to this file or s3://bucket/key instead of stdout"
+        + " (needed with --checkpoint, which writes jsonl to a local file)",
+    )
+    parser.add_argument(
+        "--input",
+        help="restore from this file or s3://bucket/key instead of stdin",
+    )
+    parser.add_argument(
+        "--path",
+        help="only back up or restore parameters below this path (default %(default)s)",
+        default="/",
+    )
+    parser.add_argument(
+        "--include",
+        help="only parameters whose names match this glob; may be repeated",
+        action="append",
+    )
+    parser.add_argument(
+        "--exclude",
+        help="skip parameters whose names match this glob; may be repeated",
+        action="append",
+    )
+    parser.add_argument(
+        "--regions",
+        help="back up each of these regions to its own file in --output-dir",
+        nargs="+",
+    )
+    parser.add_argument(
+        "--profiles", help="with --regions, credential profiles to use", nargs="+"
+    )
+    parser.add_argument(
+        "--assume-role",
+        help="with --regions, role ARNs to assume in each account",
+        nargs="+",
+    )
+    parser.add_argument("--output-dir", help="directory for multi-region backups")
+    parser.add_argument(
+        "--max-targets",
+        help="number of region/account backups to run at once (default %(default)s)",
+        type=int,
+        default=8,
+    )
+    parser.add_argument(
+        "--target-rate",
+        help="maximum SSM calls per second for each region/account",
+        type=float,
+    )
+    parser.add_argument(
+        "--stats",
+        dest="show_stats",
+        help="print SSM API call, retry, throttle and sleep counts when done",
+        action="store_true",
+    )
+    parser.add_argument("--stats-json", help="write the API statistics to this file")
+    parser.add_argument(
+        "--stats-prometheus",
+        help="write the API statistics to this Prometheus textfile",
+    )
+    parser.add_argument(
+        "--statsd", help="send the API statistics to this StatsD host:port"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    compact_parser = subparsers.add_parser(
+        "compact", help="merge a base backup and later deltas into one backup"
+    )
+    compact_parser.add_argument("files", nargs="+", help="base backup then deltas")
+    compact_parser.add_argument(
+        "--format", choices=formats, default=jsonl_format, help="output format"
+    )
+    repo_parser = subparsers.add_parser(
+        "repo", help="keep deduplicated snapshots in a local repository"
+    )
+    repo_parser.add_argument("repository", help="repository directory")
+    repo_subparsers = repo_parser.add_subparsers(dest="repo_command", required=True)
+    repo_subparsers.add_parser("backup", help="save the parameters as a new snapshot")
+    repo_subparsers.add_parser("list", help="list the snapshots, oldest first")
+    restore_parser = repo_subparsers.add_parser("restore", help="restore a snapshot")
+    restore_parser.add_argument("snapshot_id")
+    diff_parser = repo_subparsers.add_parser(
+        "diff", help="list parameters added, removed and changed between snapshots"
+    )
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    forget_parser = repo_subparsers.add_parser("forget", help="delete a snapshot")
+    forget_parser.add_argument("snapshot_id")
+    repo_subparsers.add_parser(
+        "gc", help="remove records which no snapshot refers to any more"
+    )
+    diff_parser = subparsers.add_parser(
+        "diff", help="list the parameters which differ between two backup files"
+    )
+    diff_parser.add_argument("old", help="earlier backup file")
+    diff_parser.add_argument("new", help="later backup file")
+    diff_parser.add_argument(
+        "--values", help="show the old and new values", action="store_true"
+    )
+    query_parser = subparsers.add_parser(
+        "query", help="look up parameters in backup files, oldest first"
+    )
+    query_parser.add_argument("pattern", help="parameter name or glob")
+    query_parser.add_argument("files", nargs="+", help="backup files, oldest first")
+    sync_parser = subparsers.add_parser(
+        "sync", help="keep the parameters of one region copied to another"
+    )
+    sync_parser.add_argument("--source", required=True, help="region to copy from")
+    sync_parser.add_argument("--target", required=True, help="region to copy to")
+    sync_parser.add_argument(
+        "--state", required=True, help="file recording what has been copied"
+    )
+    sync_parser.add_argument(
+        "--interval", type=float, default=60, help="seconds between polls"
+    )
+    sync_parser.add_argument(
+        "--once", help="copy the changes once and exit", action="store_true"
+    )
+    for indexed_parser in (diff_parser, query_parser):
+        indexed_parser.add_argument(
+            "--json", help="write the results as JSON", action="store_true"
+        )
+        indexed_parser.add_argument(
+            "--show-secrets",
+            help="show SecureString values instead of redacting them",
+            action="store_true",
+        )
     args = parser.parse_args()
-    if args.restore:
-        backup_cloud_ssm.restore_from_file(sys.stdin)
-    else:
-        backup_cloud_ssm.backup_to_file(sys.stdout)
+    # a checkpointed backup needs to know whether a format was asked for
+    args.format_given = args.format
+    if args.format is None:
+        args.format = json_format
+    args.stats = api_stats()
+    args.rate_controller = unset
+
+    try:
+        if args.command == "compact":
+            run_compact(args)
+        elif args.command == "repo":
+            run_repo(args)
+        elif args.command == "diff":
+            run_diff(args)
+        elif args.command == "query":
+            run_query(args)
+        elif args.command == "sync":
+            run_sync(args)
+        elif args.restore:
+            run_restore(args)
+        elif args.regions:
+            run_multi_backup(args)
+        else:
+            run_backup(args)
+    finally:
+        report_stats(args)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,41 @@
-import boto3
-from hamcrest import assert_that, equal_to
 from typing import Dict, Tuple, Union
-from collections.abc import MutableMapping
-from botocore.exceptions import ParamValidationError
-from time import sleep
+from collections.abc import MutableMapping, ItemsView, ValuesView
+from backup_cloud_ssm.cache import ttl_lru_cache, not_found
+from backup_cloud_ssm.clients import routed_client, shared_client
+from backup_cloud_ssm.consistency import consistency_waiter, consistency_timeout
+from backup_cloud_ssm.instrument import api_stats
+from backup_cloud_ssm.records import parameter_record
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from time import monotonic
 import logging
 
+# the largest page size that SSM allows for describe_parameters
+describe_page_size = 50
+
+
+def glob_prefix(pattern: str):
+    """the literal part of a glob pattern before any wildcard"""
+    for i, c in enumerate(pattern):
+        if c in "*?[":
+            return pattern[:i]
+    return pattern
+
+
+class aws_ssm_items_view(ItemsView):
+    """items of an aws_ssm_dict, listed a page at a time as they are used"""
+
+    def __iter__(self):
+        yield from self._mapping.iterate_items()
+
+
+class aws_ssm_values_view(ValuesView):
+    """values of an aws_ssm_dict, listed a page at a time as they are used"""
+
+    def __iter__(self):
+        for name, value in self._mapping.iterate_items():
+            yield value
+
 
 class aws_ssm_dict(MutableMapping):
     """provide a flat dictionary with access to AWS SSM parameters
@@ -17,18 +47,160 @@ class aws_ssm_dict(MutableMapping):
     When the dictionary is created it can either deliver the raw
     parmeter contents or it can decrypt them.  The default is to decryptb
 
+    Lookups can optionally be cached by setting cache_ttl to the number
+    of seconds a value stays valid.  Descriptions are cached separately
+    for description_cache_ttl seconds (by default ten times cache_ttl)
+    since they change far less often.  Each cache holds at most
+    cache_size entries and also remembers parameters which were not
+    found.  Writes and deletes through the dictionary invalidate the
+    cached entries for their key.
+
+    Listing (iteration, backup and restore) can be limited to the
+    parameters below path and further to those names matching any of
+    the include globs and none of the exclude globs.  The path, the
+    literal prefixes of the include globs and the optional param_types
+    and key_id are passed to SSM as filters so that parameters outside
+    the scope are never listed or decrypted.
+
+    Every SSM call is counted in stats, an api_stats which can be
+    passed in to share it between several dictionaries.  Given a
+    rate_controller every call waits for its adaptive read or write
+    budget.
+
+    The SSM client is made on first use, so creating a dictionary
+    costs nothing until it is used.  Dictionaries in the same region
+    share one client, each seeing only its own calls in its stats;
+    max_pool_connections sizes its connection pool for callers making
+    more than ten calls at once.
+
     """
 
     def __init__(
-        self, decrypt=True, return_type="value", region_name=None, ssm_client=None
+        self,
+        decrypt=True,
+        return_type="value",
+        region_name=None,
+        ssm_client=None,
+        cache_ttl=None,
+        cache_size=1024,
+        description_cache_ttl=None,
+        path="/",
+        include=None,
+        exclude=None,
+        param_types=None,
+        key_id=None,
+        stats=None,
+        rate_controller=None,
+        max_pool_connections=None,
     ):
-        if ssm_client is None:
-            self.ssm = boto3.client("ssm", region_name=region_name)
-        else:
-            self.ssm = ssm_client
-        self.exceptions = self.ssm.exceptions
+        self.region_name = region_name
+        self.max_pool_connections = max_pool_connections
+        self.ssm_client = ssm_client
+        self.stats = stats if stats is not None else api_stats()
+        self.rate_controller = rate_controller
+        self.hooked_client = None
+        self.consistency_waiter = None
+        self.length = None
         self.decrypt = decrypt
         self.return_type = return_type
+        if cache_ttl is None:
+            self.value_cache = self.description_cache = None
+        else:
+            if description_cache_ttl is None:
+                description_cache_ttl = cache_ttl * 10
+            self.value_cache = ttl_lru_cache(cache_ttl, cache_size)
+            self.description_cache = ttl_lru_cache(description_cache_ttl, cache_size)
+        if path != "/":
+            path = path.rstrip("/")
+        self.path = path
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.param_types = param_types
+        self.key_id = key_id
+
+    @property
+    def ssm(self):
+        """the SSM client, made and hooked up the first time it is needed"""
+        if self.hooked_client is None:
+            hooks = [self.stats]
+            if self.rate_controller is not None:
+                hooks.append(self.rate_controller)
+            client = self.ssm_client
+            if client is None:
+                client = shared_client(
+                    "ssm",
+                    self.region_name,
+                    max_pool_connections=self.max_pool_connections,
+                )
+                client = routed_client(client, hooks)
+            elif isinstance(client, routed_client):
+                # another dictionary's view of a shared client
+                client = routed_client(client.client, hooks)
+            else:
+                # hooks are registered with unique ids, so a client is
+                # only hooked up once however many dictionaries use it
+                for hook in hooks:
+                    hook.attach(client)
+            self.hooked_client = client
+        return self.hooked_client
+
+    @property
+    def exceptions(self):
+        return self.ssm.exceptions
+
+    @property
+    def waiter(self):
+        if self.consistency_waiter is None:
+            self.consistency_waiter = consistency_waiter(self.ssm, stats=self.stats)
+        return self.consistency_waiter
+
+    def wanted(self, name: str):
+        """is name within the path and include/exclude scope of this dictionary"""
+        if self.path != "/" and not name.startswith(self.path + "/"):
+            return False
+        if self.include and not any(fnmatchcase(name, p) for p in self.include):
+            return False
+        return not any(fnmatchcase(name, p) for p in self.exclude)
+
+    def type_filters(self):
+        """ParameterFilters accepted by both listing calls"""
+        filters = []
+        if self.param_types:
+            filters.append(
+                {"Key": "Type", "Option": "Equals", "Values": list(self.param_types)}
+            )
+        if self.key_id is not None:
+            filters.append(
+                {"Key": "KeyId", "Option": "Equals", "Values": [self.key_id]}
+            )
+        return filters
+
+    def describe_filters(self):
+        filters = self.type_filters()
+        if self.path != "/":
+            filters.append(
+                {"Key": "Path", "Option": "Recursive", "Values": [self.path]}
+            )
+        prefixes = [glob_prefix(pattern) for pattern in self.include]
+        if prefixes and all(prefixes):
+            filters.append({"Key": "Name", "Option": "BeginsWith", "Values": prefixes})
+        return filters
+
+    def invalidate(self, key: str):
+        """forget anything cached about key"""
+        self.length = None
+        for cache in (self.value_cache, self.description_cache):
+            if cache is not None:
+                cache.invalidate(key)
+
+    def cache_stats(self):
+        """return hit and miss counts for the value and description caches"""
+        if self.value_cache is None:
+            return None
+        return {
+            "value": self.value_cache.stats(),
+            "description": self.description_cache.stats(),
+        }
 
     def __setitem__(self, key: str, value: Union[str, Tuple]):
         """set the SSM parameter, to match a value
@@ -36,6 +208,14 @@ class aws_ssm_dict(MutableMapping):
         given a string we use that by default as a securestring
         given a tuple we treat the first parameter as a type, the second as a value and optional third as a description
         """
+        self.put_param(key, value)
+
+    def put_param(self, key: str, value: Union[str, Tuple], overwrite=False):
+        """set the SSM parameter as __setitem__ does, optionally replacing it
+
+        without overwrite an existing parameter raises AttributeError
+        for ParameterAlreadyExists.
+        """
 
         description = None
         if isinstance(value, dict):
@@ -56,9 +236,15 @@ class aws_ssm_dict(MutableMapping):
             param_type = "SecureString"
             val_string = value
 
+        # botocore is loaded with the client; not importing it before
+        # keeps it out of commands which never call AWS
+        from botocore.exceptions import ParamValidationError
+
         request_params = dict(Name=key, Type=param_type, Value=val_string)
         if description is not None:
             request_params.update(dict(Description=description))
+        if overwrite:
+            request_params.update(dict(Overwrite=True))
         try:
             self.ssm.put_parameter(**request_params)
         except (
@@ -71,14 +257,17 @@ class aws_ssm_dict(MutableMapping):
             if "ValidationException" not in str(e):
                 raise e
             raise AttributeError(e)
+        finally:
+            self.invalidate(key)
 
-    def __delitem__(self, key, max_retries=15):
+    def __delitem__(self, key, wait=True):
         """delete a parameter and wait for it to be deleted
 
         We send the delete_parameter call to AWS which requests
         parameter deletion.  Unfortunately it seems that this takes
         some time after the call returns to complete.  This means we
-        means we wait to retry by default.
+        wait for the deletion to become visible by default; with
+        wait=False pass the key to wait_until_consistent later.
         """
 
         request_params = dict(Name=key)
@@ -86,76 +275,239 @@ class aws_ssm_dict(MutableMapping):
             self.ssm.delete_parameter(**request_params)
         except self.ssm.exceptions.ParameterNotFound as e:
             raise KeyError(e)
-        count = 0
-        sleep_secs = 100 / 1000
-        sleep_mult = 1.2
-        while True:
-            describe_response = self.ssm.describe_parameters(
-                Filters=[{"Key": "Name", "Values": [key]}]
-            )
-            try:
-                if "Description" not in describe_response["Parameters"][0]:
-                    break
-            except IndexError:
-                break
-            if count < max_retries:
-                logging.debug("sleeping " + str(sleep_secs) + " to give ssm time")
-                sleep(sleep_secs)
-                count += 1
-                sleep_secs = sleep_secs * sleep_mult
-            else:
-                raise Exception(
-                    "Description failed to clear after delete - nasty AWS!!!"
-                )
+        finally:
+            self.invalidate(key)
+        if wait:
+            self.waiter.expect_deleted([key])
+            self.waiter.wait([key])
+
+    def delete_parameters(self, keys, wait=True):
+        """delete many parameters, ten per DeleteParameters call
+
+        returns a (deleted, missing) pair of key lists.  Unless wait is
+        False we wait once, for all of the deleted keys together, for
+        the deletions to become visible.
+        """
+        keys = list(keys)
+        deleted = []
+        missing = []
+        for start in range(0, len(keys), 10):
+            batch = keys[start : start + 10]
+            response = self.ssm.delete_parameters(Names=batch)
+            deleted.extend(response.get("DeletedParameters", []))
+            missing.extend(response.get("InvalidParameters", []))
+            for key in batch:
+                self.invalidate(key)
+        if wait:
+            self.waiter.expect_deleted(deleted)
+            self.waiter.wait(deleted)
+        return (deleted, missing)
+
+    def wait_until_consistent(self, present=(), deleted=()):
+        """wait for earlier writes of present and deletes of deleted to show
+
+        writes are complete when the parameter is listed by
+        describe_parameters and deletes when it is no longer listed.
+        Nothing is remembered between calls, so pass every key to wait
+        for.  Raises consistency_timeout if SSM doesn't catch up in time.
+        """
+        present = list(present)
+        deleted = list(deleted)
+        self.waiter.expect_present(present)
+        self.waiter.expect_deleted(deleted)
+        self.waiter.wait(present + deleted)
 
     def iterate_parameter_list(self):
-        paginator = self.ssm.get_paginator("get_parameters_by_path")
-        page_iterator = paginator.paginate(
-            Path="/", Recursive=True, WithDecryption=True
+        for params, next_token in self.iterate_parameter_pages():
+            yield from params
+
+    def iterate_parameter_pages(self, next_token=None):
+        """list parameters a page at a time, starting from next_token
+
+        yields a (parameters, next_token) pair for each page; the token
+        can be passed back in to carry on listing after that page and
+        is None after the last one.
+        """
+        request_params = dict(
+            Path=self.path, Recursive=True, WithDecryption=self.decrypt
         )
-        for page in page_iterator:
-            for i in page["Parameters"]:
-                yield i
+        filters = self.type_filters()
+        if filters:
+            request_params.update(dict(ParameterFilters=filters))
+        while True:
+            if next_token is not None:
+                request_params.update(dict(NextToken=next_token))
+            page = self.ssm.get_parameters_by_path(**request_params)
+            next_token = page.get("NextToken")
+            yield (
+                [i for i in page["Parameters"] if self.wanted(i["Name"])],
+                next_token,
+            )
+            if next_token is None:
+                return
 
-    def iterate_param_descs_for_names(self):
+    def iterate_param_descs(self):
         paginator = self.ssm.get_paginator("describe_parameters")
-        page_iterator = paginator.paginate()
+        request_params = dict(PaginationConfig={"PageSize": describe_page_size})
+        filters = self.describe_filters()
+        if filters:
+            request_params.update(dict(ParameterFilters=filters))
+        page_iterator = paginator.paginate(**request_params)
         for page in page_iterator:
             for i in page["Parameters"]:
-                yield i["Name"]
+                if self.wanted(i["Name"]):
+                    yield i
+
+    def iterate_param_descs_for_names(self):
+        for i in self.iterate_param_descs():
+            yield i["Name"]
+
+    def iterate_param_history(self, key: str):
+        """every version of a parameter which SSM still holds (up to 100)"""
+        paginator = self.ssm.get_paginator("get_parameter_history")
+        page_iterator = paginator.paginate(Name=key, WithDecryption=self.decrypt)
+        try:
+            for page in page_iterator:
+                yield from page["Parameters"]
+        except self.ssm.exceptions.ParameterNotFound as e:
+            raise KeyError(e)
+
+    def iterate_parameter_batches(self, names, batch_size=10):
+        """fetch named parameters with GetParameters, batch_size at a time
+
+        yields a (parameters, invalid_names) pair for each call made.
+        GetParameters accepts at most 10 names per call.
+        """
+        names = list(names)
+        for start in range(0, len(names), batch_size):
+            yield self.get_parameters_batch(names[start : start + batch_size])
+
+    def get_parameters_batch(self, names):
+        """one GetParameters call returning (parameters, invalid_names)"""
+        response = self.ssm.get_parameters(Names=names, WithDecryption=self.decrypt)
+        return (response["Parameters"], response.get("InvalidParameters", []))
+
+    def iterate_records(self):
+        """iterate over parameter_records using bulk listing calls
+
+        rather than doing a get_parameter and describe_parameters call
+        for every key we list all of the descriptions (up to 50 per
+        call) and then all of the values (up to 10 per call) and join
+        the two by name.  Only the descriptions are held in memory.
+
+        Parameters which are visible in one listing but not the other
+        (SSM is eventually consistent) are fetched individually.
+        """
+        descriptions = {}
+        for desc in self.iterate_param_descs():
+            descriptions[desc["Name"]] = desc.get("Description", "")
+
+        for param in self.iterate_parameter_list():
+            name = param["Name"]
+            try:
+                description = descriptions.pop(name)
+            except KeyError:
+                description = self.retrieve_description(name)
+            yield parameter_record.from_param(param, description)
+
+        for params, invalid in self.iterate_parameter_batches(descriptions.keys()):
+            for param in params:
+                yield parameter_record.from_param(param, descriptions[param["Name"]])
+            for name in invalid:
+                logging.warning("parameter " + name + " vanished during listing")
+
+    def iterate_for_dicts(self):
+        """iterate over (name, dict) pairs using bulk listing calls"""
+        for record in self.iterate_records():
+            yield (record.name, record.as_dict())
 
     def iterate_for_tuples(self):
-        for i in self.iterate_param_descs_for_names():
-            name = i["Name"]
-            yield (name, self.get_param_as_tuple(name))
+        for record in self.iterate_records():
+            yield (record.name, record.as_tuple())
 
     def iterate_for_values(self):
         for i in self.iterate_parameter_list():
             yield (i["Name"], i["Value"])
 
+    def iterate_items(self):
+        """(key, value) pairs in the return_type shape from bulk listing"""
+        if self.return_type == "dict":
+            items = self.iterate_for_dicts()
+        elif self.return_type == "tuple":
+            items = self.iterate_for_tuples()
+        elif self.return_type == "value":
+            items = self.iterate_for_values()
+        else:
+            raise Exception("unknown return type: " + self.return_type)
+        count = 0
+        for item in items:
+            count += 1
+            yield item
+        self.remember_length(count)
+
+    def items(self):
+        return aws_ssm_items_view(self)
+
+    def values(self):
+        return aws_ssm_values_view(self)
+
     def __iter__(self):
-        yield from self.iterate_param_descs_for_names()
+        count = 0
+        for name in self.iterate_param_descs_for_names():
+            count += 1
+            yield name
+        self.remember_length(count)
+
+    def remember_length(self, count: int):
+        self.length = (count, monotonic())
 
     def __len__(self):
-        pass
+        """count the parameters, 50 per describe_parameters call
+
+        when caching is enabled the count from the last complete
+        listing is reused until it is older than cache_ttl or a
+        parameter is written or deleted through this dictionary.
+        """
+        if self.length is not None and self.value_cache is not None:
+            count, when = self.length
+            if monotonic() - when < self.value_cache.ttl:
+                return count
+        return sum(1 for name in self)
+
+    def __bool__(self):
+        for name in self.iterate_param_descs_for_names():
+            return True
+        return False
 
     def get_param(self, key: str):
+        if self.value_cache is not None:
+            try:
+                response = self.value_cache.get(key)
+            except KeyError:
+                pass
+            else:
+                if response is not_found:
+                    raise KeyError("parameter not found (cached): " + key)
+                return response
         try:
             response = self.ssm.get_parameter(Name=key, WithDecryption=self.decrypt)
         except self.ssm.exceptions.ParameterNotFound as e:
+            if self.value_cache is not None:
+                self.value_cache.put(key, not_found)
             raise KeyError(e)
         assert response["Parameter"]["Name"] == key
+        if self.value_cache is not None:
+            self.value_cache.put(key, response)
         return response
 
-    def desc_param(self, key: str, max_retries=15):
+    def desc_param(self, key: str):
         """get the description of a parameter we _know_ is there
 
         this tries to get the AWS parameter description from inside a
-        describe_parameters response for a parameter with the
-        parameter as the first (and only) parameter in the parameter
-        list.  In the case that the initial call fails it retries
-        (max_retries times) in case a parameter has been created but
-        the data about it is not yet in sync.
+        describe_parameters response for the parameter.  In the case
+        that the initial call fails the consistency waiter keeps
+        checking, until its deadline, in case a parameter has been
+        created but the data about it is not yet in sync.
 
         """
 
@@ -166,58 +518,47 @@ class aws_ssm_dict(MutableMapping):
 
         this means that even though we only want the first result, we
         still have to paginate through what may be a number of
-        responses with empty parameter lists.
+        responses with empty parameter lists, which the waiter does.
         """
 
-        count = 0
-        sleep_secs = 100 / 1000
-        sleep_mult = 1.2
-        while True:
-            paginator = self.ssm.get_paginator("describe_parameters")
-            page_iterator = paginator.paginate(
-                Filters=[{"Key": "Name", "Values": [key]}]
-            )
-            param_pages = [page["Parameters"] for page in page_iterator]
-            paramlist = [param for sublist in param_pages for param in sublist]
-            ret_paramlist = [x for x in paramlist if x["Name"] == key]
-            if len(ret_paramlist) == 0:
-                if count > max_retries:
-                    raise KeyError("description retry count exceeded - aborting")
-                count += 1
-                logging.debug(
-                    "sleeping "
-                    + str(sleep_secs)
-                    + " to give ssm time to retrieve description"
-                )
-                sleep(sleep_secs)
-                sleep_secs = sleep_secs * sleep_mult
-            else:
-                break
-        assert len(ret_paramlist) == 1, "Paramlist wrong length: " + str(ret_paramlist)
-        assert ret_paramlist[0]["Name"] == key
-        return ret_paramlist[0]
+        self.waiter.expect_present([key])
+        try:
+            found = self.waiter.wait([key])
+        except consistency_timeout as e:
+            raise KeyError("description retry count exceeded - aborting: " + str(e))
+        assert found[key]["Name"] == key
+        return found[key]
 
     def retrieve_description(self, key: str):
+        if self.description_cache is not None:
+            try:
+                return self.description_cache.get(key)
+            except KeyError:
+                pass
         parameter_describe = self.desc_param(key)
         try:
             description = parameter_describe["Description"]
         except KeyError:
             description = ""
+        if self.description_cache is not None:
+            self.description_cache.put(key, description)
         return description
 
+    @staticmethod
+    def param_to_dict(param, description: str):
+        return {
+            "value": param["Value"],
+            "type": param["Type"],
+            "description": description,
+        }
+
     def get_param_as_dict(self, key: str):
         get_response = self.get_param(key)
         description = self.retrieve_description(key)
-
-        retval = {
-            "value": get_response["Parameter"]["Value"],
-            "type": get_response["Parameter"]["Type"],
-            "description": description,
-        }
-        return retval
+        return self.param_to_dict(get_response["Parameter"], description)
 
     def get_param_as_tuple(self, key: str):
-        get_response = self.ssm.get_parameter(Name=key, WithDecryption=self.decrypt)
+        get_response = self.get_param(key)
         description = self.retrieve_description(key)
         return (
             get_response["Parameter"]["Type"],
@@ -238,35 +579,129 @@ class aws_ssm_dict(MutableMapping):
             return self.get_param_as_value(key)
         raise Exception("unknown return type: " + self.return_type)
 
+    def shape_param(self, param, description: str = None):
+        """convert a GetParameters style parameter to the return_type shape"""
+        if self.return_type == "dict":
+            return self.param_to_dict(param, description)
+        elif self.return_type == "tuple":
+            return (param["Type"], param["Value"], description)
+        elif self.return_type == "value":
+            return param["Value"]
+        raise Exception("unknown return type: " + self.return_type)
+
+    def fetch_parameters(self, keys, max_workers=4):
+        """fetch parameters in GetParameters batches of ten
+
+        batches are run concurrently on up to max_workers threads.
+        Returns a (parameters, missing) pair where parameters maps
+        each key found to its GetParameters result.
+        """
+        params = {}
+        missing = []
+        wanted = []
+        for key in dict.fromkeys(keys):
+            if self.value_cache is None:
+                wanted.append(key)
+                continue
+            try:
+                response = self.value_cache.get(key)
+            except KeyError:
+                wanted.append(key)
+                continue
+            if response is not_found:
+                missing.append(key)
+            else:
+                params[key] = response["Parameter"]
+
+        batches = [wanted[i : i + 10] for i in range(0, len(wanted), 10)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for found, invalid in executor.map(self.get_parameters_batch, batches):
+                for param in found:
+                    params[param["Name"]] = param
+                    if self.value_cache is not None:
+                        self.value_cache.put(param["Name"], {"Parameter": param})
+                for key in invalid:
+                    missing.append(key)
+                    if self.value_cache is not None:
+                        self.value_cache.put(key, not_found)
+        return (params, missing)
+
+    def describe_many(self, keys):
+        """return a dictionary of descriptions for keys we know exist
+
+        names are looked up with describe_parameters, up to 50 names
+        per request; any which are not yet visible fall back to the
+        retrying retrieve_description.
+        """
+        descriptions = {}
+        wanted = []
+        for key in keys:
+            if self.description_cache is not None:
+                try:
+                    descriptions[key] = self.description_cache.get(key)
+                    continue
+                except KeyError:
+                    pass
+            wanted.append(key)
+
+        paginator = self.ssm.get_paginator("describe_parameters")
+        for start in range(0, len(wanted), 50):
+            page_iterator = paginator.paginate(
+                ParameterFilters=[
+                    {
+                        "Key": "Name",
+                        "Option": "Equals",
+                        "Values": wanted[start : start + 50],
+                    }
+                ]
+            )
+            for page in page_iterator:
+                for desc in page["Parameters"]:
+                    description = desc.get("Description", "")
+                    descriptions[desc["Name"]] = description
+                    if self.description_cache is not None:
+                        self.description_cache.put(desc["Name"], description)
+
+        for key in wanted:
+            if key not in descriptions:
+                descriptions[key] = self.retrieve_description(key)
+        return descriptions
+
+    def get_many(self, keys, max_workers=4):
+        """look up many keys with as few calls as possible
+
+        returns a (found, missing) pair where found maps each key that
+        exists to its value in the return_type shape and missing lists
+        the keys which don't exist.
+        """
+        params, missing = self.fetch_parameters(keys, max_workers)
+        if self.return_type == "value":
+            descriptions = {}
+        else:
+            descriptions = self.describe_many(params.keys())
+        found = {
+            key: self.shape_param(param, descriptions.get(key))
+            for key, param in params.items()
+        }
+        return (found, missing)
+
+    def fetch_dict(self, keys, max_workers=4):
+        """return a dictionary of those keys which exist"""
+        return self.get_many(keys, max_workers)[0]
+
     def upload_dictionary(self, my_dict: Dict[str, str]):
         for i in my_dict.keys():
             self[i] = my_dict[i]
 
     def remove_dictionary(self, my_dict: Dict[str, str]):
-        keys = [x for x in my_dict.keys()]
-        for i in keys:
-            self.pop(i, None)
+        self.delete_parameters(my_dict.keys())
 
     def verify_dictionary(self, my_dict: Dict[str, str]):
-        for i in my_dict.keys():
-            test_value = my_dict[i]
-            if isinstance(test_value, dict):
-                ssm_param = self.get_param_as_dict(i)
-                assert_that(ssm_param["type"], equal_to(test_value["type"]))
-                assert_that(ssm_param["value"], equal_to(test_value["value"]))
-                assert_that(
-                    ssm_param["description"], equal_to(test_value["description"])
-                )
-            if isinstance(test_value, str):
-                assert_that(self.get_param_as_value(i), equal_to(test_value))
+        from backup_cloud_ssm.verify import verify_dictionary
+
+        verify_dictionary(self, my_dict)
 
     def verify_deleted_dictionary(self, my_dict: Dict[str, str]):
-        except_count = 0
-        for i in my_dict.keys():
-            try:
-                self[i]
-            except KeyError:
-                except_count += 1
-                continue
-            assert False, "still found key: " + i + " in dictionary"
-        assert except_count == len(my_dict.keys())
+        from backup_cloud_ssm.verify import verify_deleted_dictionary
+
+        verify_deleted_dictionary(self, my_dict)
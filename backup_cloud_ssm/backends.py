@@ -0,0 +1,646 @@
+from botocore.exceptions import ClientError, ParamValidationError
+from botocore.hooks import HierarchicalEmitter
+from collections import namedtuple
+from datetime import datetime, timezone
+import bisect
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# local stand-ins for SSM parameter store
+#
+# an ssm_backend keeps parameters the way SSM does - types, values,
+# descriptions, a history of up to 100 versions, paginated listings
+# and filters - on top of four storage primitives which memory_backend
+# and sqlite_backend implement.  backend_client puts the boto3 client
+# surface which aws_ssm_dict uses in front of a backend:
+#
+#   ssm_dict = aws_ssm_dict(ssm_client=backend_client(memory_backend()))
+#
+# with the same response shapes, errors and botocore events, so
+# api_stats and rate_controller work unchanged.
+
+parameter_types = ("String", "StringList", "SecureString")
+default_key_id = "alias/aws/ssm"
+max_versions = 100
+max_value_bytes = 4096
+max_name_length = 2048
+max_hierarchy_depth = 15
+max_names_per_call = 10
+max_by_path_results = 10
+default_describe_results = 10
+max_describe_results = 50
+max_history_results = 50
+name_pattern = re.compile(r"^[a-zA-Z0-9_.\-/]+$")
+
+
+class backend_error(Exception):
+    """an SSM error response, named by its code"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def not_found(name):
+    return backend_error("ParameterNotFound", "Parameter " + name + " not found.")
+
+
+def validate_name(name):
+    if len(name) > max_name_length:
+        raise backend_error("ValidationException", "Parameter name is too long")
+    if not name_pattern.match(name) or name.endswith("/") or "//" in name:
+        raise backend_error(
+            "ValidationException", "Parameter name is not valid: " + name
+        )
+    if "/" in name and not name.startswith("/"):
+        raise backend_error(
+            "ValidationException",
+            "Parameter name must be a fully qualified name: " + name,
+        )
+    if name.count("/") > max_hierarchy_depth:
+        raise backend_error(
+            "HierarchyLevelLimitExceededException",
+            "Parameter name has more than 15 levels: " + name,
+        )
+    if name.lstrip("/").lower().startswith(("aws", "ssm")):
+        raise backend_error(
+            "ValidationException",
+            'Parameter name: can\'t be prefixed with "aws" or "ssm": ' + name,
+        )
+
+
+def in_path(name, path, recursive):
+    if path == "/":
+        rest = name.lstrip("/")
+    elif name.startswith(path.rstrip("/") + "/"):
+        rest = name[len(path.rstrip("/")) + 1 :]
+    else:
+        return False
+    return recursive or "/" not in rest
+
+
+def matches_filter(version, name, parameter_filter):
+    key = parameter_filter["Key"]
+    option = parameter_filter.get("Option", "Equals")
+    values = parameter_filter.get("Values", [])
+    if key == "Type":
+        return version["Type"] in values
+    if key == "KeyId":
+        return version.get("KeyId") in values
+    if key == "Name":
+        if option == "BeginsWith":
+            return any(
+                name.startswith(v) or name.startswith("/" + v.lstrip("/"))
+                for v in values
+            )
+        return name in values or name.lstrip("/") in [v.lstrip("/") for v in values]
+    if key == "Path":
+        return any(in_path(name, v, option == "Recursive") for v in values)
+    raise backend_error("InvalidFilterKey", "unsupported filter key: " + key)
+
+
+class ssm_backend:
+    """parameter store semantics over four storage primitives
+
+    subclasses provide load(name) and save(name, entry) of an entry
+    dictionary (the parameter's versions, oldest first, and when it
+    was deleted), remove(name), and names(start_after) iterating over
+    stored names in order.
+
+    SSM's listing by description is only eventually consistent; given
+    a visibility_delay describe_page shows each parameter as it was
+    that many seconds ago, so new parameters appear and deleted ones
+    linger as they do in SSM.  clock gives the time in seconds.
+    """
+
+    def __init__(self, visibility_delay=0.0, clock=time.time):
+        self.visibility_delay = visibility_delay
+        self.clock = clock
+        self.lock = threading.RLock()
+
+    def load(self, name):
+        raise NotImplementedError
+
+    def save(self, name, entry):
+        raise NotImplementedError
+
+    def remove(self, name):
+        raise NotImplementedError
+
+    def names(self, start_after=""):
+        raise NotImplementedError
+
+    def current(self, name):
+        """the latest version of a live parameter or None"""
+        entry = self.load(name)
+        if entry is None or entry["deleted"] is not None:
+            return None
+        return entry["versions"][-1]
+
+    def visible(self, name):
+        """the version describe_parameters shows, after visibility_delay"""
+        entry = self.load(name)
+        if entry is None:
+            return None
+        if self.visibility_delay <= 0:
+            return None if entry["deleted"] is not None else entry["versions"][-1]
+        as_of = self.clock() - self.visibility_delay
+        if entry["deleted"] is not None and entry["deleted"] <= as_of:
+            return None
+        shown = None
+        for version in entry["versions"]:
+            if version["LastModifiedDate"] <= as_of:
+                shown = version
+        return shown
+
+    def get(self, name):
+        with self.lock:
+            version = self.current(name)
+        if version is None:
+            raise not_found(name)
+        return version
+
+    def put(
+        self, name, param_type, value, description=None, key_id=None, overwrite=False
+    ):
+        """store a new version of a parameter; returns its version number"""
+        validate_name(name)
+        if param_type is not None and param_type not in parameter_types:
+            raise backend_error(
+                "ValidationException", "Parameter type is not valid: " + param_type
+            )
+        if len(value.encode("utf-8")) > max_value_bytes:
+            raise backend_error(
+                "ValidationException", "Parameter value is longer than 4096 bytes"
+            )
+        with self.lock:
+            entry = self.load(name)
+            if entry is None or entry["deleted"] is not None:
+                if param_type is None:
+                    raise backend_error(
+                        "ValidationException",
+                        "A parameter type is required when you create a parameter.",
+                    )
+                # SSM starts the history again for a deleted parameter
+                entry = {"versions": [], "deleted": None}
+                previous = None
+            else:
+                if not overwrite:
+                    raise backend_error(
+                        "ParameterAlreadyExists", "The parameter already exists."
+                    )
+                previous = entry["versions"][-1]
+                param_type = param_type or previous["Type"]
+                if description is None:
+                    description = previous["Description"]
+                if key_id is None:
+                    key_id = previous.get("KeyId")
+            version = {
+                "Name": name,
+                "Type": param_type,
+                "Value": value,
+                "Description": description or "",
+                "Version": previous["Version"] + 1 if previous else 1,
+                "LastModifiedDate": self.clock(),
+            }
+            if param_type == "SecureString":
+                version["KeyId"] = key_id or default_key_id
+            entry["versions"] = (entry["versions"] + [version])[-max_versions:]
+            self.save(name, entry)
+            return version["Version"]
+
+    def delete(self, name):
+        with self.lock:
+            entry = self.load(name)
+            if entry is None or entry["deleted"] is not None:
+                raise not_found(name)
+            if self.visibility_delay > 0:
+                entry["deleted"] = self.clock()
+                self.save(name, entry)
+            else:
+                self.remove(name)
+
+    def history(self, name):
+        with self.lock:
+            entry = self.load(name)
+        if entry is None or entry["deleted"] is not None:
+            raise not_found(name)
+        return entry["versions"]
+
+    def page(self, view, wanted, next_token, max_results, candidates=None):
+        """up to max_results (name, version) pairs after next_token
+
+        candidates, sorted, limits the names looked at; by default
+        every stored name is.
+        """
+        found = []
+        last = None
+        with self.lock:
+            if candidates is None:
+                names = self.names(next_token or "")
+            else:
+                names = (name for name in candidates if name > (next_token or ""))
+            for name in names:
+                version = view(name)
+                if version is None or not wanted(name, version):
+                    continue
+                if len(found) == max_results:
+                    return (found, last)
+                found.append(version)
+                last = name
+        return (found, None)
+
+    def list_page(self, path, recursive, filters, next_token, max_results):
+        """a page of GetParametersByPath: (versions, next_token)"""
+        for f in filters:
+            if f["Key"] in ("Name", "Path"):
+                raise backend_error(
+                    "ValidationException",
+                    "The following filter key is not valid: " + f["Key"],
+                )
+
+        def wanted(name, version):
+            return in_path(name, path, recursive) and all(
+                matches_filter(version, name, f) for f in filters
+            )
+
+        return self.page(self.current, wanted, next_token, max_results)
+
+    def describe_page(self, filters, next_token, max_results):
+        """a page of DescribeParameters: (versions, next_token)"""
+
+        def wanted(name, version):
+            return all(matches_filter(version, name, f) for f in filters)
+
+        # look names given in an Equals filter up directly rather than
+        # scanning everything, as consistency checks do all the time
+        candidates = None
+        for f in filters:
+            if f["Key"] == "Name" and f.get("Option", "Equals") == "Equals":
+                stripped = [v.lstrip("/") for v in f.get("Values", [])]
+                candidates = sorted(set(stripped + ["/" + v for v in stripped]))
+        return self.page(self.visible, wanted, next_token, max_results, candidates)
+
+
+class memory_backend(ssm_backend):
+    """parameters held in a dictionary, for tests and benchmarks"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.entries = {}
+        self.sorted_names = []
+
+    def load(self, name):
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        return {"versions": entry["versions"], "deleted": entry["deleted"]}
+
+    def save(self, name, entry):
+        if name not in self.entries:
+            bisect.insort(self.sorted_names, name)
+        self.entries[name] = entry
+
+    def remove(self, name):
+        del self.entries[name]
+        del self.sorted_names[bisect.bisect_left(self.sorted_names, name)]
+
+    def names(self, start_after=""):
+        # pages are built under the backend's lock so the list can't
+        # change while it is walked
+        position = bisect.bisect_right(self.sorted_names, start_after)
+        while position < len(self.sorted_names):
+            yield self.sorted_names[position]
+            position += 1
+
+
+class sqlite_backend(ssm_backend):
+    """parameters kept in an SQLite database file
+
+    a production size account can be built once and reused between
+    runs.  Each parameter is one row holding its versions as JSON.
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS parameters"
+            + " (name TEXT PRIMARY KEY, entry TEXT NOT NULL)"
+        )
+
+    def close(self):
+        self.db.close()
+
+    def load(self, name):
+        row = self.db.execute(
+            "SELECT entry FROM parameters WHERE name = ?", (name,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save(self, name, entry):
+        self.db.execute(
+            "INSERT OR REPLACE INTO parameters (name, entry) VALUES (?, ?)",
+            (name, json.dumps(entry)),
+        )
+
+    def remove(self, name):
+        self.db.execute("DELETE FROM parameters WHERE name = ?", (name,))
+
+    def names(self, start_after=""):
+        rows = self.db.execute(
+            "SELECT name FROM parameters WHERE name > ? ORDER BY name", (start_after,)
+        )
+        for row in rows:
+            yield row[0]
+
+
+operation_model = namedtuple("operation_model", ["name"])
+client_meta = namedtuple("client_meta", ["events", "region_name"])
+
+error_codes = (
+    "ParameterNotFound",
+    "ParameterAlreadyExists",
+    "ParameterVersionNotFound",
+    "HierarchyLevelLimitExceededException",
+    "InvalidFilterKey",
+    "InvalidNextToken",
+)
+
+
+class backend_exceptions:
+    """the exception classes of a boto3 SSM client"""
+
+    ClientError = ClientError
+
+
+for code in error_codes:
+    setattr(backend_exceptions, code, type(code, (ClientError,), {}))
+
+
+def timestamp_to_datetime(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+class backend_paginator:
+    def __init__(self, method):
+        self.method = method
+
+    def paginate(self, PaginationConfig=None, **kwargs):
+        config = PaginationConfig or {}
+        if "PageSize" in config:
+            kwargs["MaxResults"] = config["PageSize"]
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            if page.get("NextToken") is None:
+                return
+            kwargs["NextToken"] = page["NextToken"]
+
+
+class backend_client:
+    """the parts of a boto3 SSM client which aws_ssm_dict uses, over a backend
+
+    requests are validated as botocore and SSM validate them; errors
+    are raised as the client's exception classes.  Every call emits
+    the before-call, before-send, needs-retry and after-call events a
+    real client does.
+    """
+
+    def __init__(self, backend, region_name="us-east-1", account_id="123456789012"):
+        self.backend = backend
+        self.account_id = account_id
+        self.meta = client_meta(HierarchicalEmitter(), region_name)
+        self.exceptions = backend_exceptions
+
+    def call(self, operation, handler, params):
+        model = operation_model(operation)
+        context = {}
+        event = ".ssm." + operation
+        events = self.meta.events
+        events.emit("before-call" + event, model=model, params=params, context=context)
+        events.emit("before-send" + event, request=None)
+        try:
+            parsed = handler(**params)
+            error = None
+        except backend_error as e:
+            error = e
+            parsed = {"Error": {"Code": e.code, "Message": str(e)}}
+        parsed["ResponseMetadata"] = {
+            "HTTPStatusCode": 400 if error else 200,
+            "RetryAttempts": 0,
+        }
+        events.emit(
+            "needs-retry" + event,
+            response=(None, parsed),
+            endpoint=None,
+            operation=model,
+            attempts=1,
+            caught_exception=None,
+            request_dict=params,
+        )
+        events.emit(
+            "after-call" + event,
+            http_response=None,
+            parsed=parsed,
+            model=model,
+            context=context,
+        )
+        if error is not None:
+            error_class = getattr(self.exceptions, error.code, ClientError)
+            raise error_class(parsed, operation)
+        return parsed
+
+    @staticmethod
+    def require(value, name, kind=str):
+        if not isinstance(value, kind) or (kind is str and not value):
+            raise ParamValidationError(
+                report="Invalid type or length for parameter " + name
+            )
+
+    def shape(self, version, decrypt, full=True):
+        """a GetParameter(s) style parameter from a stored version"""
+        value = version["Value"]
+        if version["Type"] == "SecureString" and not decrypt:
+            value = "kms:" + version["KeyId"] + ":" + value
+        param = {
+            "Name": version["Name"],
+            "Type": version["Type"],
+            "Value": value,
+            "Version": version["Version"],
+            "LastModifiedDate": timestamp_to_datetime(version["LastModifiedDate"]),
+            "DataType": "text",
+        }
+        if full:
+            param["ARN"] = (
+                "arn:aws:ssm:"
+                + self.meta.region_name
+                + ":"
+                + self.account_id
+                + ":parameter/"
+                + version["Name"].lstrip("/")
+            )
+        return param
+
+    def describe(self, version):
+        desc = {
+            "Name": version["Name"],
+            "Type": version["Type"],
+            "LastModifiedDate": timestamp_to_datetime(version["LastModifiedDate"]),
+            "LastModifiedUser": "arn:aws:iam::" + self.account_id + ":user/local",
+            "Version": version["Version"],
+            "Tier": "Standard",
+            "Policies": [],
+            "DataType": "text",
+        }
+        # like SSM, an empty description isn't returned at all
+        if version["Description"]:
+            desc["Description"] = version["Description"]
+        if "KeyId" in version:
+            desc["KeyId"] = version["KeyId"]
+        return desc
+
+    def get_parameter(self, **params):
+        def handler(Name=None, WithDecryption=False):
+            self.require(Name, "Name")
+            return {"Parameter": self.shape(self.backend.get(Name), WithDecryption)}
+
+        return self.call("GetParameter", handler, params)
+
+    def get_parameters(self, **params):
+        def handler(Names=None, WithDecryption=False):
+            self.require(Names, "Names", list)
+            if len(Names) > max_names_per_call:
+                raise backend_error(
+                    "ValidationException", "at most 10 names can be requested"
+                )
+            found = []
+            invalid = []
+            for name in dict.fromkeys(Names):
+                try:
+                    found.append(self.shape(self.backend.get(name), WithDecryption))
+                except backend_error:
+                    invalid.append(name)
+            return {"Parameters": found, "InvalidParameters": invalid}
+
+        return self.call("GetParameters", handler, params)
+
+    def get_parameters_by_path(self, **params):
+        def handler(
+            Path=None,
+            Recursive=False,
+            WithDecryption=False,
+            ParameterFilters=(),
+            MaxResults=max_by_path_results,
+            NextToken=None,
+        ):
+            self.require(Path, "Path")
+            if MaxResults > max_by_path_results:
+                raise backend_error("ValidationException", "MaxResults is at most 10")
+            versions, next_token = self.backend.list_page(
+                Path, Recursive, list(ParameterFilters), NextToken, MaxResults
+            )
+            page = {"Parameters": [self.shape(v, WithDecryption) for v in versions]}
+            if next_token is not None:
+                page["NextToken"] = next_token
+            return page
+
+        return self.call("GetParametersByPath", handler, params)
+
+    def describe_parameters(self, **params):
+        def handler(
+            ParameterFilters=(), MaxResults=default_describe_results, NextToken=None
+        ):
+            if MaxResults > max_describe_results:
+                raise backend_error("ValidationException", "MaxResults is at most 50")
+            versions, next_token = self.backend.describe_page(
+                list(ParameterFilters), NextToken, MaxResults
+            )
+            page = {"Parameters": [self.describe(v) for v in versions]}
+            if next_token is not None:
+                page["NextToken"] = next_token
+            return page
+
+        return self.call("DescribeParameters", handler, params)
+
+    def get_parameter_history(self, **params):
+        def handler(
+            Name=None,
+            WithDecryption=False,
+            MaxResults=max_history_results,
+            NextToken=None,
+        ):
+            self.require(Name, "Name")
+            versions = self.backend.history(Name)
+            start = int(NextToken or 0)
+            page = {
+                "Parameters": [
+                    dict(
+                        self.describe(version),
+                        Value=self.shape(version, WithDecryption)["Value"],
+                        Labels=[],
+                    )
+                    for version in versions[start : start + MaxResults]
+                ]
+            }
+            if start + MaxResults < len(versions):
+                page["NextToken"] = str(start + MaxResults)
+            return page
+
+        return self.call("GetParameterHistory", handler, params)
+
+    def put_parameter(self, **params):
+        def handler(
+            Name=None,
+            Value=None,
+            Type=None,
+            Description=None,
+            KeyId=None,
+            Overwrite=False,
+        ):
+            self.require(Name, "Name")
+            self.require(Value, "Value")
+            version = self.backend.put(Name, Type, Value, Description, KeyId, Overwrite)
+            return {"Version": version, "Tier": "Standard"}
+
+        return self.call("PutParameter", handler, params)
+
+    def delete_parameter(self, **params):
+        def handler(Name=None):
+            self.require(Name, "Name")
+            self.backend.delete(Name)
+            return {}
+
+        return self.call("DeleteParameter", handler, params)
+
+    def delete_parameters(self, **params):
+        def handler(Names=None):
+            self.require(Names, "Names", list)
+            if len(Names) > max_names_per_call:
+                raise backend_error(
+                    "ValidationException", "at most 10 names can be deleted"
+                )
+            deleted = []
+            invalid = []
+            for name in dict.fromkeys(Names):
+                try:
+                    self.backend.delete(name)
+                    deleted.append(name)
+                except backend_error:
+                    invalid.append(name)
+            return {"DeletedParameters": deleted, "InvalidParameters": invalid}
+
+        return self.call("DeleteParameters", handler, params)
+
+    def get_paginator(self, operation):
+        methods = {
+            "describe_parameters": self.describe_parameters,
+            "get_parameter_history": self.get_parameter_history,
+            "get_parameters_by_path": self.get_parameters_by_path,
+        }
+        return backend_paginator(methods[operation])
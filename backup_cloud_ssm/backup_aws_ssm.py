@@ -1,43 +1,169 @@
 from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
-import json
+from backup_cloud_ssm.rate_limit import (
+    token_bucket,
+    is_throttling_error,
+    put_parameter_tps,
+)
+from backup_cloud_ssm.backup_format import (
+    open_backup,
+    is_tombstone,
+    read_records,
+    write_records,
+    json_format,
+)
+from backup_cloud_ssm.envelope import open_encrypted_backup
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from random import random
+from time import sleep
 import logging
 import sys
 
 logger = logging.getLogger()
 
+# per key results from restoring a parameter
+created = "created"
+overwritten = "overwritten"
+identical = "identical"
+already_exists = "already-exists"
+failed = "failed"
+
 
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
 
-def backup_to_file(file):
-    ssm_dict = aws_ssm_dict(return_type="dict")
-    contents = {}
-    for i in ssm_dict.keys():
+def backup_to_file(
+    file, format=json_format, ssm_dict=None, public_key=None, compression="gzip"
+):
+    """write a backup of all parameters as they are listed
+
+    records are streamed to the file so memory use does not grow with
+    the number of parameters.  Pass an ssm_dict created with a path or
+    include/exclude globs to back up only part of the parameter store.
+
+    Given a public_key the backup is compressed and then encrypted so
+    that it can only be read with the matching private key; file must
+    then be a path or a binary file.
+    """
+    if ssm_dict is None:
+        ssm_dict = aws_ssm_dict(return_type="dict")
+    if public_key is None:
+        opened = open_backup(file, "w")
+    else:
+        opened = open_encrypted_backup(file, "w", public_key, compression)
+    with opened as f:
+        write_records(f, ssm_dict.iterate_for_dicts(), format)
+
+
+def retry_throttled(ssm_dict, call, limiter=None, max_retries=8):
+    """return call(), backing off and retrying while SSM throttles it"""
+    count = 0
+    sleep_secs = 200 / 1000
+    sleep_mult = 2
+    while True:
+        if limiter is not None:
+            limiter.acquire()
         try:
-            contents[i] = ssm_dict[i]
-        except KeyError:
-            eprint("failed to find expected parameter:", i)
-            raise
-    try:
-        with open(file, "w") as f:
-            json.dump(contents, f)
-    except TypeError:
-        json.dump(contents, file)
+            return call()
+        except ssm_dict.exceptions.ClientError as e:
+            if not is_throttling_error(e) or count >= max_retries:
+                raise
+            logger.debug("throttled - sleeping " + str(sleep_secs) + " before retry")
+            backoff_secs = sleep_secs * (1 + random())
+            sleep(backoff_secs)
+            ssm_dict.stats.add_sleep("throttle_backoff", backoff_secs)
+            count += 1
+            sleep_secs = sleep_secs * sleep_mult
+
 
+def restore_parameter(
+    ssm_dict, key, value, limiter=None, max_retries=8, overwrite=False
+):
+    """write one parameter, backing off and retrying when throttled
 
-def restore_from_file(file):
-    ssm_dict = aws_ssm_dict()
+    returns created, overwritten or, when the parameter exists and
+    overwrite is not set, identical or already_exists depending on
+    whether it matches the backup; other errors are raised.
+    """
     try:
-        with open(file) as f:
-            contents = json.load(f)
-    except TypeError:
-        contents = json.load(file)
-    for i in contents.keys():
+        retry_throttled(
+            ssm_dict,
+            lambda: ssm_dict.put_param(key, value, overwrite=overwrite),
+            limiter,
+            max_retries,
+        )
+        return overwritten if overwrite else created
+    except AttributeError as e:
+        if "ParameterAlreadyExists" not in str(e):
+            raise
+        if isinstance(value, dict) and ssm_dict.get_param_as_dict(key) == value:
+            logger.debug("Parameter " + key + " already exists and matches")
+            return identical
+        logger.warning("Parameter " + key + " already exists with a different value!")
+        return already_exists
+
+
+def restore_from_file(
+    file, jobs=1, rate=put_parameter_tps, ssm_dict=None, private_key=None
+):
+    """restore parameters from a backup, `jobs` at a time
+
+    records are read from the file incrementally (in either backup
+    format) and writes start as soon as the first one is parsed.
+    Encrypted backups are decrypted and decompressed as they are read
+    given the private_key.  See restore_records for the rest.
+    """
+    if private_key is None:
+        opened = open_backup(file)
+    else:
+        opened = open_encrypted_backup(file, "r", private_key)
+    with opened as f:
+        return restore_records(read_records(f), jobs, rate, ssm_dict)
+
+
+def restore_records(records, jobs=1, rate=put_parameter_tps, ssm_dict=None):
+    """restore (name, dict) records, `jobs` at a time
+
+    records outside the path and include/exclude scope of ssm_dict
+    and tombstones are skipped.  All writes share one token bucket so
+    that at most `rate` PutParameter calls are made per second however
+    many jobs run.  Returns a dictionary mapping each key to its
+    result (created, identical, already_exists or failed); failures
+    are logged rather than aborting the restore.
+    """
+    if ssm_dict is None:
+        ssm_dict = aws_ssm_dict()
+    limiter = token_bucket(rate, stats=ssm_dict.stats) if rate else None
+    results = {}
+
+    def record_result(key, future):
         try:
-            ssm_dict[i] = contents[i]
-        except AttributeError as e:
-            if "ParameterAlreadyExists" in str(e):
-                logger.warning("Parameter " + i + " already exists!")
-            else:
-                raise
+            results[key] = future.result()
+        except Exception as e:
+            logger.error("failed to restore parameter " + key + ": " + str(e))
+            results[key] = failed
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        in_flight = {}
+        for key, value in records:
+            if is_tombstone(value):
+                logger.debug("skipping deleted parameter " + key)
+                continue
+            if not ssm_dict.wanted(key):
+                continue
+            future = executor.submit(restore_parameter, ssm_dict, key, value, limiter)
+            in_flight[future] = key
+            if len(in_flight) >= jobs * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record_result(in_flight.pop(future), future)
+        for future in in_flight:
+            record_result(in_flight[future], future)
+    return results
+
+
+def summarise_restore(results):
+    summary = {created: 0, overwritten: 0, identical: 0, already_exists: 0, failed: 0}
+    for status in results.values():
+        summary[status] += 1
+    return summary
@@ -0,0 +1,158 @@
+from backup_cloud_ssm.s3_stream import is_s3_url, open_s3_backup
+from contextlib import contextmanager
+import json
+
+json_format = "json"
+jsonl_format = "jsonl"
+formats = (json_format, jsonl_format)
+
+read_size = 64 * 1024
+
+# the record written in incremental backups for a deleted parameter
+tombstone = {"deleted": True}
+
+
+@contextmanager
+def open_backup(file, mode="r"):
+    """open file if it is a path, otherwise use it as an open file
+
+    paths of the form s3://bucket/key are streamed to and from S3.
+    """
+    if is_s3_url(file):
+        with open_s3_backup(file, mode) as f:
+            yield f
+        return
+    try:
+        f = open(file, mode)
+    except TypeError:
+        yield file
+        return
+    with f:
+        yield f
+
+
+def is_tombstone(param):
+    return param.get("deleted", False) is True
+
+
+def write_records(f, records, format=json_format):
+    """write (name, dict) pairs to f as they are produced
+
+    the "json" format is a single object mapping each parameter name
+    to its dictionary, exactly as json.dump would write it.  The
+    "jsonl" format has one object per line with the parameter name
+    stored under "name".
+    """
+    if format == jsonl_format:
+        for name, param in records:
+            record = {"name": name}
+            record.update(param)
+            f.write(json.dumps(record) + "\n")
+    elif format == json_format:
+        f.write("{")
+        separator = ""
+        for name, param in records:
+            f.write(separator + json.dumps(name) + ": " + json.dumps(param))
+            separator = ", "
+        f.write("}")
+    else:
+        raise Exception("unknown backup format: " + format)
+
+
+class json_stream:
+    """incremental reader for a stream of JSON text
+
+    values are decoded from a buffer which is refilled from the file
+    whenever a value runs past its end.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        if self.eof:
+            return False
+        data = self.f.read(read_size)
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """return the next non whitespace character or "" at the end"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        c = self.peek()
+        if c == "" or c not in chars:
+            raise ValueError(
+                "corrupt backup: expected one of '" + chars + "' but found '" + c + "'"
+            )
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # a number could continue in the data not yet read
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def read_records(f):
+    """yield (name, dict) pairs from a backup in either format
+
+    the format is recognised from the first member of the first
+    object: in jsonl every record starts with the "name" key and a
+    string value whereas in the json format every value is an object.
+    """
+    stream = json_stream(f)
+    if stream.peek() == "":
+        return
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    key = stream.value()
+    stream.expect(":")
+    value = stream.value()
+
+    if key == "name" and isinstance(value, str):
+        name = value
+        param = {}
+        while stream.expect(",}") == ",":
+            member = stream.value()
+            stream.expect(":")
+            param[member] = stream.value()
+        yield (name, param)
+        while stream.peek() != "":
+            param = stream.value()
+            yield (param.pop("name"), param)
+        return
+
+    yield (key, value)
+    while stream.expect(",}") == ",":
+        key = stream.value()
+        stream.expect(":")
+        yield (key, stream.value())
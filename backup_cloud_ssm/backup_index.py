@@ -0,0 +1,271 @@
+from backup_cloud_ssm.aws_ssm_dict import glob_prefix
+from backup_cloud_ssm.backup_format import json_stream
+from backup_cloud_ssm.repository import record_bytes, record_hash
+from collections import namedtuple
+from fnmatch import fnmatchcase
+import json
+import mmap
+import os
+
+# an index is kept next to each backup file as <backup>.idx:
+#
+#   a JSON header line recording the size and mtime of the backup
+#   then one line per parameter, sorted by name:
+#     name <tab> record hash <tab> type <tab> byte offset <tab> byte length
+#
+# the offset and length locate the parameter's record in the backup so
+# that it can be read without parsing the rest of the file.  Parameter
+# names can't contain tabs or newlines.
+index_suffix = ".idx"
+index_version = 1
+
+index_entry = namedtuple("index_entry", ["name", "digest", "type", "offset", "length"])
+
+# diff changes
+added = "added"
+removed = "removed"
+changed = "changed"
+
+
+def is_jsonl(f):
+    """recognise the backup format as read_records does, then rewind"""
+    stream = json_stream(f)
+    jsonl = False
+    if stream.peek() == "{":
+        stream.expect("{")
+        if stream.peek() != "}":
+            key = stream.value()
+            stream.expect(":")
+            jsonl = key == "name" and isinstance(stream.value(), str)
+    f.seek(0)
+    return jsonl
+
+
+def scan_jsonl(f):
+    """(name, param, offset, length) for each record of a jsonl backup"""
+    offset = 0
+    for line in f:
+        if line.strip():
+            param = json.loads(line.decode("utf-8"))
+            yield (param.pop("name"), param, offset, len(line))
+        offset += len(line)
+
+
+def scan_json(text):
+    """(name, param, offset, length) for each member of a json backup
+
+    offsets and lengths are in characters of text.
+    """
+    decoder = json.JSONDecoder()
+
+    def skip(pos, expected):
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text) or text[pos] not in expected:
+            raise ValueError(
+                "corrupt backup: expected one of '" + expected + "' at " + str(pos)
+            )
+        return pos
+
+    pos = skip(0, "{") + 1
+    if text[skip(pos, '"}')] == "}":
+        return
+    while True:
+        name, pos = decoder.raw_decode(text, skip(pos, '"'))
+        start = skip(skip(pos, ":") + 1, "{")
+        param, pos = decoder.raw_decode(text, start)
+        yield (name, param, start, pos - start)
+        pos = skip(pos, ",}")
+        if text[pos] == "}":
+            return
+        pos += 1
+
+
+def scan_json_bytes(data):
+    """scan_json of UTF-8 data with offsets and lengths in bytes"""
+    text = data.decode("utf-8")
+    if len(text) == len(data):
+        yield from scan_json(text)
+        return
+    char_pos = 0
+    byte_pos = 0
+    for name, param, offset, length in scan_json(text):
+        byte_pos += len(text[char_pos:offset].encode("utf-8"))
+        char_pos = offset
+        yield (name, param, byte_pos, len(text[offset : offset + length].encode()))
+
+
+def build_index(backup_file, index_file):
+    """write a sorted name index of backup_file to index_file"""
+    stat = os.stat(backup_file)
+    with open(backup_file, "rb") as f:
+        if is_jsonl(f):
+            scanned = scan_jsonl(f)
+        else:
+            scanned = scan_json_bytes(f.read())
+        entries = sorted(
+            index_entry(
+                name,
+                record_hash(record_bytes(name, param)),
+                param.get("type", ""),
+                offset,
+                length,
+            )
+            for name, param, offset, length in scanned
+        )
+    header = {
+        "version": index_version,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "count": len(entries),
+    }
+    temp_file = index_file + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        for entry in entries:
+            f.write("\t".join(str(field) for field in entry) + "\n")
+    os.replace(temp_file, index_file)
+
+
+def parse_entry(line):
+    name, digest, param_type, offset, length = line.decode("utf-8").split("\t")
+    return index_entry(name, digest, param_type, int(offset), int(length))
+
+
+class backup_index:
+    """sorted name index of a plain (unencrypted) backup file
+
+    the index is built the first time it is needed and cached next to
+    the backup, to be rebuilt whenever the backup's size or mtime
+    changes.  Both files are memory mapped: lookups binary search the
+    index and read only the records they need from the backup, and
+    entries() walks the index in name order without loading it.
+    """
+
+    def __init__(self, backup_file, index_file=None):
+        self.backup_file = backup_file
+        self.index_file = index_file or backup_file + index_suffix
+        if not self.current():
+            build_index(backup_file, self.index_file)
+        self.index_f = open(self.index_file, "rb")
+        self.index = mmap.mmap(self.index_f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.body = self.index.find(b"\n") + 1
+        self.backup_f = open(backup_file, "rb")
+        self.backup = None
+
+    def current(self):
+        """is there a cached index which matches the backup file"""
+        try:
+            with open(self.index_file, "rb") as f:
+                header = json.loads(f.readline())
+        except (FileNotFoundError, ValueError):
+            return False
+        stat = os.stat(self.backup_file)
+        return (
+            header.get("version") == index_version
+            and header.get("size") == stat.st_size
+            and header.get("mtime_ns") == stat.st_mtime_ns
+        )
+
+    def close(self):
+        self.index.close()
+        self.index_f.close()
+        if self.backup is not None:
+            self.backup.close()
+        self.backup_f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def next_line(self, pos):
+        return self.index.find(b"\n", pos) + 1
+
+    def name_at(self, pos):
+        return self.index[pos : self.index.find(b"\t", pos)].decode("utf-8")
+
+    def entry_at(self, pos):
+        return parse_entry(self.index[pos : self.next_line(pos) - 1])
+
+    def lower_bound(self, name):
+        """position of the first index line whose name is not before name"""
+        lo = self.body
+        hi = len(self.index)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            line = mid if mid == lo else self.next_line(mid - 1)
+            if line >= hi:
+                line = lo
+            if self.name_at(line) < name:
+                lo = self.next_line(line)
+            else:
+                hi = line
+        return lo
+
+    def entries(self, start=None):
+        """index entries in name order, from start or the beginning"""
+        pos = self.body if start is None else start
+        while pos < len(self.index):
+            end = self.next_line(pos)
+            yield parse_entry(self.index[pos : end - 1])
+            pos = end
+
+    def lookup(self, name):
+        """the index entry for name or None if it isn't in the backup"""
+        pos = self.lower_bound(name)
+        if pos < len(self.index) and self.name_at(pos) == name:
+            return self.entry_at(pos)
+        return None
+
+    def matching(self, pattern):
+        """entries whose names match a glob, found from its literal prefix"""
+        prefix = glob_prefix(pattern)
+        for entry in self.entries(self.lower_bound(prefix)):
+            if not entry.name.startswith(prefix):
+                return
+            if fnmatchcase(entry.name, pattern):
+                yield entry
+
+    def record(self, entry):
+        """read the parameter dictionary for an entry from the backup"""
+        if self.backup is None:
+            self.backup = mmap.mmap(self.backup_f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self.backup[entry.offset : entry.offset + entry.length]
+        param = json.loads(data.decode("utf-8"))
+        param.pop("name", None)
+        return param
+
+
+def diff_indexes(old, new):
+    """merge join two indexes yielding (change, name, old_entry, new_entry)
+
+    both indexes are walked once in name order so the cost is linear
+    in the number of parameters and no records are read.
+    """
+    old_entries = old.entries()
+    new_entries = new.entries()
+    old_entry = next(old_entries, None)
+    new_entry = next(new_entries, None)
+    while old_entry is not None or new_entry is not None:
+        if new_entry is None or (
+            old_entry is not None and old_entry.name < new_entry.name
+        ):
+            yield (removed, old_entry.name, old_entry, None)
+            old_entry = next(old_entries, None)
+        elif old_entry is None or new_entry.name < old_entry.name:
+            yield (added, new_entry.name, None, new_entry)
+            new_entry = next(new_entries, None)
+        else:
+            if old_entry.digest != new_entry.digest:
+                yield (changed, new_entry.name, old_entry, new_entry)
+            old_entry = next(old_entries, None)
+            new_entry = next(new_entries, None)
+
+
+def redacted(param, show_secrets=False):
+    """param with any SecureString value hidden unless show_secrets"""
+    if show_secrets or param.get("type") != "SecureString":
+        return param
+    return dict(param, value="<redacted>")
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from time import monotonic
+import threading
+
+# cached in place of a value to remember that a parameter doesn't exist
+not_found = object()
+
+
+class ttl_lru_cache:
+    """a thread safe cache whose entries expire after ttl seconds
+
+    at most max_entries are kept; when the cache is full the least
+    recently used entry is discarded.  get() raises KeyError on a miss
+    and hits and misses are counted.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            try:
+                expiry, value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            if expiry < monotonic():
+                del self.entries[key]
+                self.misses += 1
+                raise KeyError(key)
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
@@ -0,0 +1,230 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_aws_ssm import restore_parameter, failed
+from backup_cloud_ssm.backup_format import (
+    open_backup,
+    read_records,
+    write_records,
+    is_tombstone,
+    jsonl_format,
+)
+from backup_cloud_ssm.envelope import open_encrypted_backup
+from backup_cloud_ssm.rate_limit import token_bucket, put_parameter_tps
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import json
+import logging
+import os
+
+logger = logging.getLogger()
+
+# how often progress is saved: pages of parameters listed during a backup
+# and records completed during a restore
+backup_checkpoint_pages = 10
+restore_checkpoint_records = 100
+
+
+def load_checkpoint(checkpoint_file, kind):
+    """return the saved checkpoint or None if there isn't one"""
+    try:
+        with open(checkpoint_file) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("kind") != kind:
+        raise Exception(checkpoint_file + " is not a checkpoint for a " + kind)
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    """replace the checkpoint atomically so a crash leaves the previous one"""
+    temp_file = checkpoint_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_file, checkpoint_file)
+
+
+def finish_checkpoint(checkpoint_file, checkpoint):
+    """keep the checkpoint only if there are failed keys left to retry"""
+    if checkpoint["failed"]:
+        save_checkpoint(checkpoint_file, checkpoint)
+    elif os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
+def resumable_backup(
+    file,
+    checkpoint_file,
+    resume=False,
+    ssm_dict=None,
+    every=backup_checkpoint_pages,
+):
+    """back up to a jsonl file, saving checkpoints so a failed run can resume
+
+    the parameters are listed a page at a time and after every `every`
+    pages the listing's NextToken and the size of the backup file are
+    saved to checkpoint_file.  With resume the file is cut back to the
+    last checkpoint and listing carries on from its token; the names
+    already in the file are not written again.
+
+    a parameter which can't be backed up (such as one which never
+    shows up in describe_parameters) is added to a retry list in the
+    checkpoint instead of stopping the backup.  The checkpoint is
+    removed once everything is backed up; while any keys have failed
+    it is kept and resuming retries just those keys.
+
+    returns the list of names which could not be backed up.
+    """
+    if ssm_dict is None:
+        ssm_dict = aws_ssm_dict(return_type="dict")
+    checkpoint = load_checkpoint(checkpoint_file, "backup") if resume else None
+    if checkpoint is None:
+        checkpoint = {
+            "kind": "backup",
+            "next_token": None,
+            "listed": False,
+            "offset": 0,
+            "failed": [],
+        }
+        open(file, "w").close()
+    else:
+        logger.info("resuming backup from " + checkpoint_file)
+    os.truncate(file, checkpoint["offset"])
+    with open_backup(file) as f:
+        written = set(name for name, param in read_records(f))
+    failures = set(checkpoint["failed"])
+
+    descriptions = {}
+    for desc in ssm_dict.iterate_param_descs():
+        if desc["Name"] not in written:
+            descriptions[desc["Name"]] = desc.get("Description", "")
+
+    def shaped(params):
+        for param in params:
+            name = param["Name"]
+            if name in written:
+                continue
+            try:
+                description = descriptions.pop(name)
+            except KeyError:
+                try:
+                    description = ssm_dict.retrieve_description(name)
+                except KeyError as e:
+                    logger.error("failed to back up " + name + ": " + str(e))
+                    failures.add(name)
+                    continue
+            failures.discard(name)
+            written.add(name)
+            yield (name, ssm_dict.param_to_dict(param, description))
+
+    with open_backup(file, "a") as f:
+
+        def save(**changes):
+            f.flush()
+            checkpoint.update(changes)
+            checkpoint.update(dict(offset=f.tell(), failed=sorted(failures)))
+            save_checkpoint(checkpoint_file, checkpoint)
+
+        if not checkpoint["listed"]:
+            pages = ssm_dict.iterate_parameter_pages(checkpoint["next_token"])
+            for count, (params, next_token) in enumerate(pages, 1):
+                write_records(f, shaped(params), jsonl_format)
+                if next_token is None:
+                    save(next_token=None, listed=True)
+                elif count % every == 0:
+                    save(next_token=next_token)
+
+        # parameters described but not listed by path (SSM is eventually
+        # consistent) and those which failed before
+        remaining = set(descriptions.keys()) | failures
+        for params, invalid in ssm_dict.iterate_parameter_batches(sorted(remaining)):
+            write_records(f, shaped(params), jsonl_format)
+            for name in invalid:
+                logger.warning("parameter " + name + " vanished during listing")
+                failures.discard(name)
+        f.flush()
+        checkpoint.update(dict(offset=f.tell(), failed=sorted(failures)))
+    finish_checkpoint(checkpoint_file, checkpoint)
+    return sorted(failures)
+
+
+def resumable_restore(
+    file,
+    checkpoint_file,
+    resume=False,
+    jobs=1,
+    rate=put_parameter_tps,
+    ssm_dict=None,
+    private_key=None,
+    every=restore_checkpoint_records,
+):
+    """restore a backup, saving checkpoints so a failed run can resume
+
+    records are numbered in the order they are read and every `every`
+    completed records the number of leading records which have all
+    been applied is saved to checkpoint_file along with the keys which
+    failed.  With resume those records are skipped, apart from the
+    failed keys which are tried again.  Writes already made after the
+    checkpoint are repeated harmlessly: they are found to be identical.
+
+    returns a dictionary of per key results as restore_from_file does.
+    The checkpoint is removed once every key has been restored.
+    """
+    if ssm_dict is None:
+        ssm_dict = aws_ssm_dict()
+    checkpoint = load_checkpoint(checkpoint_file, "restore") if resume else None
+    if checkpoint is None:
+        checkpoint = {"kind": "restore", "done": 0, "failed": []}
+    else:
+        logger.info("resuming restore from " + checkpoint_file)
+    skip = checkpoint["done"]
+    retry = set(checkpoint["failed"])
+    failures = set(retry)
+    limiter = token_bucket(rate, stats=ssm_dict.stats) if rate else None
+    results = {}
+    completed = set()
+    progress = dict(done=checkpoint["done"], count=0)
+
+    def complete(index):
+        completed.add(index)
+        while progress["done"] in completed:
+            completed.discard(progress["done"])
+            progress["done"] += 1
+
+    def record_result(index, key, future):
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            logger.error("failed to restore parameter " + key + ": " + str(e))
+            results[key] = failed
+        if results[key] == failed:
+            failures.add(key)
+        else:
+            failures.discard(key)
+        complete(index)
+        progress["count"] += 1
+        if progress["count"] % every == 0:
+            checkpoint.update(dict(done=progress["done"], failed=sorted(failures)))
+            save_checkpoint(checkpoint_file, checkpoint)
+
+    if private_key is None:
+        opened = open_backup(file)
+    else:
+        opened = open_encrypted_backup(file, "r", private_key)
+    with ThreadPoolExecutor(max_workers=jobs) as executor, opened as f:
+        in_flight = {}
+        for index, (key, value) in enumerate(read_records(f)):
+            if index < skip and key not in retry:
+                continue
+            if is_tombstone(value) or not ssm_dict.wanted(key):
+                complete(index)
+                continue
+            future = executor.submit(restore_parameter, ssm_dict, key, value, limiter)
+            in_flight[future] = (index, key)
+            if len(in_flight) >= jobs * 2:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record_result(*in_flight.pop(future), future)
+        for future in in_flight:
+            record_result(*in_flight[future], future)
+    checkpoint.update(dict(done=progress["done"], failed=sorted(failures)))
+    finish_checkpoint(checkpoint_file, checkpoint)
+    return results
@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+import functools
+import threading
+import weakref
+
+# boto3 takes longer to import than the rest of the tool put together,
+# so it is only imported when the first client is made; commands which
+# never call AWS (--help, diff, query, compact) don't pay for it.
+lock = threading.Lock()
+sessions = {}
+clients = weakref.WeakValueDictionary()
+# the events api_stats and rate_controller hook, which a shared client
+# sends on to the handlers of the routed_client making the call
+routed_events = (
+    "before-call",
+    "after-call",
+    "after-call-error",
+    "before-send",
+    "needs-retry",
+)
+calling = threading.local()
+
+
+def shared_session(region_name=None, profile_name=None):
+    """one boto3 session per region and profile for the whole process
+
+    clients made from the same session share its loaded service models
+    and resolved credentials, so only the first pays to set them up.
+    """
+    key = (region_name, profile_name)
+    with lock:
+        session = sessions.get(key)
+        if session is None:
+            import boto3
+
+            session = boto3.session.Session(
+                region_name=region_name, profile_name=profile_name
+            )
+            sessions[key] = session
+        return session
+
+
+def shared_client(
+    service, region_name=None, profile_name=None, max_pool_connections=None
+):
+    """a client shared by everyone asking for the same service and region
+
+    each caller wraps it in a routed_client carrying its own hooks
+    (api_stats, rate_controller); the client itself is hooked up once
+    to send every event to the hooks of whichever caller made the call.
+    Callers making many calls at once can ask for a client whose
+    connection pool holds max_pool_connections rather than botocore's
+    default of ten.  A client lasts as long as someone holds it.
+    """
+    key = (service, region_name, profile_name, max_pool_connections)
+    session = shared_session(region_name, profile_name)
+    with lock:
+        client = clients.get(key)
+        if client is None:
+            config = None
+            if max_pool_connections is not None:
+                from botocore.config import Config
+
+                config = Config(max_pool_connections=max_pool_connections)
+            # creating clients from one session isn't thread safe
+            client = session.client(service, config=config)
+            for event in routed_events:
+                client.meta.events.register(
+                    event + "." + service,
+                    functools.partial(dispatch, event + "." + service),
+                    unique_id="routed-" + event,
+                )
+            clients[key] = client
+        return client
+
+
+def dispatch(event, **kwargs):
+    """send an event to the handlers of the call running in this thread"""
+    response = None
+    for handlers in getattr(calling, "handlers", ()):
+        handler = handlers.get(event)
+        if handler is not None:
+            result = handler(**kwargs)
+            if response is None:
+                response = result
+    return response
+
+
+@contextmanager
+def routed_to(handlers):
+    previous = getattr(calling, "handlers", ())
+    calling.handlers = handlers
+    try:
+        yield
+    finally:
+        calling.handlers = previous
+
+
+class routed_paginator:
+    """a paginator whose pages are fetched as calls of a routed_client"""
+
+    def __init__(self, paginator, handlers):
+        self.paginator = paginator
+        self.handlers = handlers
+
+    def paginate(self, **kwargs):
+        pages = iter(self.paginator.paginate(**kwargs))
+        while True:
+            with routed_to(self.handlers):
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page
+
+
+class routed_client:
+    """one caller's view of a shared client
+
+    calls made through it (including the pages of its paginators) send
+    their events only to hooks, the objects with a handlers() method
+    which this caller would otherwise attach() to a client of its own.
+    Everything else is the shared client's.
+    """
+
+    def __init__(self, client, hooks):
+        self.client = client
+        self.hooks = tuple(hooks)
+        self.handlers = tuple(hook.handlers() for hook in self.hooks)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if name == "get_paginator":
+            return lambda operation: routed_paginator(
+                attribute(operation), self.handlers
+            )
+        if name.startswith("_") or not callable(attribute) or name == "can_paginate":
+            return attribute
+        return functools.partial(self.call, attribute)
+
+    def call(self, method, *args, **kwargs):
+        with routed_to(self.handlers):
+            return method(*args, **kwargs)
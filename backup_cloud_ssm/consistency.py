@@ -0,0 +1,130 @@
+from random import random
+from time import monotonic, sleep
+import logging
+import threading
+
+# ParameterFilters accept at most 50 values
+describe_names_per_call = 50
+
+
+class consistency_timeout(Exception):
+    pass
+
+
+class consistency_waiter:
+    """wait for SSM's eventually consistent view to catch up with changes
+
+    keys which have been written are expected to become visible in
+    describe_parameters and keys which have been deleted are expected
+    to disappear from it (or at least to lose their description, which
+    can linger after the parameter itself is gone).  All pending keys
+    are checked together, 50 names per describe_parameters call, with
+    a growing, jittered interval between sweeps until they are all
+    consistent or the deadline passes, when they are dropped.  Time
+    spent sleeping is added to sleep_secs and, given an api_stats,
+    recorded there too.
+    """
+
+    def __init__(
+        self,
+        ssm,
+        interval=0.1,
+        multiplier=1.2,
+        max_interval=2.0,
+        deadline=10.0,
+        stats=None,
+    ):
+        self.ssm = ssm
+        self.stats = stats
+        self.interval = interval
+        self.multiplier = multiplier
+        self.max_interval = max_interval
+        self.deadline = deadline
+        self.deleting = set()
+        self.creating = set()
+        self.lock = threading.Lock()
+        self.sleep_secs = 0.0
+
+    def expect_present(self, keys):
+        with self.lock:
+            self.creating.update(keys)
+            self.deleting.difference_update(keys)
+
+    def expect_deleted(self, keys):
+        with self.lock:
+            self.deleting.update(keys)
+            self.creating.difference_update(keys)
+
+    def pending(self):
+        with self.lock:
+            return self.creating | self.deleting
+
+    def sweep(self, names):
+        """describe all of names returning a dictionary of the ones visible"""
+        names = list(names)
+        descs = {}
+        paginator = self.ssm.get_paginator("describe_parameters")
+        for start in range(0, len(names), describe_names_per_call):
+            page_iterator = paginator.paginate(
+                ParameterFilters=[
+                    {
+                        "Key": "Name",
+                        "Option": "Equals",
+                        "Values": names[start : start + describe_names_per_call],
+                    }
+                ]
+            )
+            for page in page_iterator:
+                for desc in page["Parameters"]:
+                    descs[desc["Name"]] = desc
+        return descs
+
+    def settled(self, name, desc):
+        """is name consistent given its describe result, or None if not visible"""
+        with self.lock:
+            if name in self.deleting:
+                done = desc is None or "Description" not in desc
+                if done:
+                    self.deleting.discard(name)
+            else:
+                done = desc is not None
+                if done:
+                    self.creating.discard(name)
+        return done
+
+    def wait(self, keys=None):
+        """wait until keys (by default everything pending) are consistent
+
+        returns the describe results for those keys which are present.
+        """
+        pending = self.pending()
+        if keys is not None:
+            pending = pending.intersection(keys)
+        found = {}
+        start = monotonic()
+        interval = self.interval
+        while pending:
+            descs = self.sweep(pending)
+            for name in list(pending):
+                desc = descs.get(name)
+                if self.settled(name, desc):
+                    pending.discard(name)
+                    if desc is not None:
+                        found[name] = desc
+            if not pending:
+                break
+            if monotonic() - start > self.deadline:
+                with self.lock:
+                    self.creating.difference_update(pending)
+                    self.deleting.difference_update(pending)
+                raise consistency_timeout(
+                    "SSM did not become consistent for: " + ", ".join(sorted(pending))
+                )
+            sleep_secs = interval * (1 + random() / 4)
+            logging.debug("sleeping " + str(sleep_secs) + " to give ssm time")
+            sleep(sleep_secs)
+            self.sleep_secs += sleep_secs
+            if self.stats is not None:
+                self.stats.add_sleep("consistency", sleep_secs)
+            interval = min(interval * self.multiplier, self.max_interval)
+        return found
@@ -0,0 +1,243 @@
+from backup_cloud_ssm.backup_format import open_backup
+from contextlib import contextmanager
+import io
+import os
+import struct
+import zlib
+
+# encrypted backup layout:
+#
+#   header:  magic, compression id (1 byte), wrapped key length (2 bytes),
+#            data key wrapped with RSA-OAEP, nonce prefix (4 bytes)
+#   chunks:  final flag (1 byte), ciphertext length (4 bytes), AES-GCM
+#            ciphertext of up to chunk_size bytes of compressed data
+#
+# every chunk is authenticated along with the header, its flag and its
+# sequence number so chunks can't be altered, reordered or dropped and
+# a backup missing its final chunk is rejected.
+magic = b"SSMBKUP1"
+compressions = {"none": 0, "gzip": 1, "zstd": 2}
+default_chunk_size = 64 * 1024
+
+
+def require_cryptography():
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from cryptography.hazmat.primitives.asymmetric import padding
+        from cryptography.hazmat.primitives import hashes
+    except ImportError:
+        raise ImportError(
+            "encrypted backups need the cryptography package: "
+            + "pip install backup_ssm[encrypt]"
+        )
+    oaep = padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None,
+    )
+    return (AESGCM, oaep)
+
+
+def load_public_key(path):
+    from cryptography.hazmat.primitives import serialization
+
+    with open(path, "rb") as f:
+        return serialization.load_pem_public_key(f.read())
+
+
+def load_private_key(path, password=None):
+    from cryptography.hazmat.primitives import serialization
+
+    with open(path, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=password)
+
+
+def make_compressor(compression):
+    if compression == "none":
+        return None
+    if compression == "gzip":
+        return zlib.compressobj(wbits=31)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().compressobj()
+    raise Exception("unknown compression: " + compression)
+
+
+def make_decompressor(compression):
+    if compression == "none":
+        return None
+    if compression == "gzip":
+        return zlib.decompressobj(wbits=31)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise Exception("unknown compression: " + compression)
+
+
+def chunk_aad(header, final, counter):
+    return header + (b"\x01" if final else b"\x00") + struct.pack(">Q", counter)
+
+
+class encrypting_raw(io.RawIOBase):
+    """compress and then encrypt everything written, a chunk at a time
+
+    a random data key is generated for each backup and stored in the
+    header wrapped with the public key, so only the holder of the
+    private key can recover it.  Closing writes the final chunk unless
+    the backup was aborted; the underlying file is left open.
+    """
+
+    def __init__(
+        self, f, public_key, compression="gzip", chunk_size=default_chunk_size
+    ):
+        AESGCM, oaep = require_cryptography()
+        data_key = AESGCM.generate_key(bit_length=256)
+        self.aead = AESGCM(data_key)
+        wrapped_key = public_key.encrypt(data_key, oaep)
+        self.nonce_prefix = os.urandom(4)
+        self.header = (
+            magic
+            + bytes([compressions[compression]])
+            + struct.pack(">H", len(wrapped_key))
+            + wrapped_key
+            + self.nonce_prefix
+        )
+        self.f = f
+        self.f.write(self.header)
+        self.compressor = make_compressor(compression)
+        self.chunk_size = chunk_size
+        self.pending = bytearray()
+        self.counter = 0
+        self.aborted = False
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.pending += data
+        while len(self.pending) > self.chunk_size:
+            self.write_chunk(self.pending[: self.chunk_size], final=False)
+            del self.pending[: self.chunk_size]
+        return len(b)
+
+    def write_chunk(self, data, final):
+        nonce = self.nonce_prefix + struct.pack(">Q", self.counter)
+        ciphertext = self.aead.encrypt(
+            nonce, bytes(data), chunk_aad(self.header, final, self.counter)
+        )
+        self.f.write(
+            (b"\x01" if final else b"\x00") + struct.pack(">I", len(ciphertext))
+        )
+        self.f.write(ciphertext)
+        self.counter += 1
+
+    def close(self):
+        if not self.closed and not self.aborted:
+            if self.compressor is not None:
+                self.pending += self.compressor.flush()
+            while len(self.pending) > self.chunk_size:
+                self.write_chunk(self.pending[: self.chunk_size], final=False)
+                del self.pending[: self.chunk_size]
+            self.write_chunk(self.pending, final=True)
+            self.pending = bytearray()
+            self.f.flush()
+        super().close()
+
+
+class decrypting_raw(io.RawIOBase):
+    """read back a stream written by encrypting_raw one chunk at a time"""
+
+    def __init__(self, f, private_key):
+        AESGCM, oaep = require_cryptography()
+        self.f = f
+        start = self.read_exact(len(magic) + 3)
+        if start[: len(magic)] != magic:
+            raise ValueError("not an encrypted ssm backup")
+        compression_id = start[len(magic)]
+        (key_length,) = struct.unpack(">H", start[len(magic) + 1 :])
+        wrapped_key = self.read_exact(key_length)
+        self.nonce_prefix = self.read_exact(4)
+        self.header = start + wrapped_key + self.nonce_prefix
+        self.aead = AESGCM(private_key.decrypt(wrapped_key, oaep))
+        compression = [k for k, v in compressions.items() if v == compression_id]
+        if not compression:
+            raise ValueError("unknown compression in backup header")
+        self.decompressor = make_decompressor(compression[0])
+        self.buffer = bytearray()
+        self.finished = False
+        self.counter = 0
+
+    def read_exact(self, size):
+        data = b""
+        while len(data) < size:
+            more = self.f.read(size - len(data))
+            if not more:
+                raise ValueError("encrypted backup is truncated")
+            data += more
+        return data
+
+    def readable(self):
+        return True
+
+    def read_chunk(self):
+        from cryptography.exceptions import InvalidTag
+
+        flag, length = struct.unpack(">BI", self.read_exact(5))
+        final = flag == 1
+        nonce = self.nonce_prefix + struct.pack(">Q", self.counter)
+        try:
+            data = self.aead.decrypt(
+                nonce,
+                self.read_exact(length),
+                chunk_aad(self.header, final, self.counter),
+            )
+        except InvalidTag:
+            raise ValueError("encrypted backup is corrupt or the key is wrong")
+        self.counter += 1
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+            if final:
+                data += self.decompressor.flush()
+        self.buffer += data
+        self.finished = final
+
+    def readinto(self, b):
+        while not self.buffer and not self.finished:
+            self.read_chunk()
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        del self.buffer[:n]
+        return n
+
+
+@contextmanager
+def open_encrypted_backup(
+    file, mode="r", key=None, compression="gzip", chunk_size=default_chunk_size
+):
+    """open a backup for text records, encrypting or decrypting it
+
+    with mode "w" key is the public key to encrypt to and with mode
+    "r" the private key to decrypt with.  file may be a path or a
+    binary file object, which is left open.
+    """
+    with open_backup(file, mode + "b") as f:
+        if mode == "w":
+            raw = encrypting_raw(f, key, compression, chunk_size)
+            text = io.TextIOWrapper(io.BufferedWriter(raw), encoding="utf-8")
+        else:
+            raw = decrypting_raw(f, key)
+            text = io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8")
+        try:
+            yield text
+        except BaseException:
+            # never finish a partial backup so that it can't pass for whole
+            if mode == "w":
+                raw.aborted = True
+            raise
+        finally:
+            text.close()
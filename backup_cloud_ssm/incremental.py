@@ -0,0 +1,134 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_format import (
+    open_backup,
+    read_records,
+    write_records,
+    is_tombstone,
+    tombstone,
+    jsonl_format,
+)
+from backup_cloud_ssm.envelope import open_encrypted_backup
+import json
+import logging
+import os
+
+logger = logging.getLogger()
+
+
+def load_manifest(manifest_file):
+    """return the name -> version manifest or None if there isn't one"""
+    try:
+        with open(manifest_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(manifest_file, manifest):
+    """replace the manifest atomically so a failed run leaves the old one"""
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_file, manifest_file)
+
+
+def manifest_entry(desc):
+    return {
+        "version": desc["Version"],
+        "last_modified": desc["LastModifiedDate"].isoformat(),
+    }
+
+
+def incremental_backup(
+    file,
+    manifest_file,
+    format=jsonl_format,
+    full=False,
+    ssm_dict=None,
+    public_key=None,
+    compression="gzip",
+):
+    """back up only parameters which changed since the manifest was written
+
+    the metadata of every parameter is listed with describe_parameters
+    and compared with the manifest from the previous run; values are
+    fetched (and so decrypted) only for new or changed parameters.
+    Parameters in the manifest which no longer exist are written as
+    tombstones.  Without a manifest, or with full set, every parameter
+    is written.  The manifest is replaced once the backup is complete.
+    Given a public_key the delta is encrypted as backup_to_file does.
+
+    returns a tuple of the counts of (changed, deleted) parameters.
+    """
+    if ssm_dict is None:
+        ssm_dict = aws_ssm_dict(return_type="dict")
+    old_manifest = None if full else load_manifest(manifest_file)
+    if old_manifest is None:
+        old_manifest = {}
+        logger.info("no manifest in use - making a full backup")
+
+    new_manifest = {}
+    changed = {}
+    for desc in ssm_dict.iterate_param_descs():
+        name = desc["Name"]
+        entry = new_manifest[name] = manifest_entry(desc)
+        if old_manifest.get(name) != entry:
+            changed[name] = desc.get("Description", "")
+    deleted = [name for name in old_manifest if name not in new_manifest]
+
+    def records():
+        for params, invalid in ssm_dict.iterate_parameter_batches(changed.keys()):
+            for param in params:
+                name = param["Name"]
+                yield (name, ssm_dict.param_to_dict(param, changed[name]))
+            for name in invalid:
+                logger.warning("parameter " + name + " vanished during listing")
+                del new_manifest[name]
+                if name in old_manifest:
+                    deleted.append(name)
+        for name in deleted:
+            yield (name, tombstone)
+
+    if public_key is None:
+        opened = open_backup(file, "w")
+    else:
+        opened = open_encrypted_backup(file, "w", public_key, compression)
+    with opened as f:
+        write_records(f, records(), format)
+    save_manifest(manifest_file, new_manifest)
+    return (len(changed), len(deleted))
+
+
+def compact(
+    files,
+    output,
+    format=jsonl_format,
+    private_key=None,
+    public_key=None,
+    compression="gzip",
+):
+    """collapse a base backup and following deltas into one snapshot
+
+    files are applied in order so later records replace earlier ones
+    and tombstones remove the parameter from the snapshot.  Encrypted
+    files are read with private_key and given a public_key the
+    snapshot is encrypted too.
+    """
+    snapshot = {}
+    for file in files:
+        if private_key is None:
+            opened = open_backup(file)
+        else:
+            opened = open_encrypted_backup(file, "r", private_key)
+        with opened as f:
+            for name, param in read_records(f):
+                if is_tombstone(param):
+                    snapshot.pop(name, None)
+                else:
+                    snapshot[name] = param
+    if public_key is None:
+        opened = open_backup(output, "w")
+    else:
+        opened = open_encrypted_backup(output, "w", public_key, compression)
+    with opened as f:
+        write_records(f, snapshot.items(), format)
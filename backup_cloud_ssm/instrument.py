@@ -0,0 +1,250 @@
+from backup_cloud_ssm.rate_limit import throttling_codes
+from time import monotonic
+import bisect
+import json
+import os
+import socket
+import threading
+
+# upper bounds, in seconds, of the latency histogram buckets
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class operation_stats:
+    """counts and latency histogram for one API operation"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.latency_sum = 0.0
+        # one count per bucket plus a final one for anything slower
+        self.buckets = [0] * (len(latency_buckets) + 1)
+
+    def observe(self, seconds):
+        self.latency_sum += seconds
+        self.buckets[bisect.bisect_left(latency_buckets, seconds)] += 1
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttles": self.throttles,
+            "latency_sum": round(self.latency_sum, 6),
+            "latency_buckets": dict(
+                zip([str(b) for b in latency_buckets] + ["+Inf"], self.buckets)
+            ),
+        }
+
+
+class api_stats:
+    """thread safe counts of SSM API calls, retries, throttles and sleeps
+
+    attach() hooks a boto3 client's events so that every call made
+    through it is counted per operation along with its latency
+    (including botocore's own retries), the retries botocore made and
+    any throttling responses.  Time spent deliberately sleeping - rate
+    limiting, backing off or waiting for SSM to become consistent - is
+    recorded with add_sleep() under a reason.  handlers() gives the same
+    hooks by event for a routed_client to send a shared client's events to.
+    """
+
+    def __init__(self):
+        self.operations = {}
+        self.sleep_secs = {}
+        self.lock = threading.Lock()
+
+    def handlers(self):
+        return {
+            "before-call.ssm": self.before_call,
+            "after-call.ssm": self.after_call,
+            "after-call-error.ssm": self.after_call_error,
+            "needs-retry.ssm": self.needs_retry,
+        }
+
+    def attach(self, client):
+        for event, handler in self.handlers().items():
+            # unique ids (which botocore shares across events) stop a
+            # client being counted twice by the same stats
+            unique_id = "api-stats-" + str(id(self)) + "-" + event
+            client.meta.events.register(event, handler, unique_id=unique_id)
+        return client
+
+    def operation(self, name):
+        try:
+            return self.operations[name]
+        except KeyError:
+            return self.operations.setdefault(name, operation_stats())
+
+    def before_call(self, model, context, **kwargs):
+        context["api_stats_start"] = monotonic()
+        context["api_stats_operation"] = model.name
+
+    def after_call(self, model, parsed, context, http_response=None, **kwargs):
+        seconds = monotonic() - context.pop("api_stats_start", monotonic())
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        with self.lock:
+            stats = self.operation(model.name)
+            stats.calls += 1
+            stats.retries += retries
+            if "Error" in parsed:
+                stats.errors += 1
+            stats.observe(seconds)
+
+    def after_call_error(self, context, **kwargs):
+        # failures to get any response (e.g. connection errors) only
+        # carry the context we filled in before the call
+        seconds = monotonic() - context.pop("api_stats_start", monotonic())
+        with self.lock:
+            stats = self.operation(context.get("api_stats_operation", "unknown"))
+            stats.calls += 1
+            stats.errors += 1
+            stats.observe(seconds)
+
+    def needs_retry(self, response, operation, **kwargs):
+        """count throttling responses, including those botocore retries"""
+        if response is None:
+            return None
+        try:
+            code = response[1]["Error"]["Code"]
+        except (KeyError, TypeError):
+            return None
+        if code in throttling_codes:
+            with self.lock:
+                self.operation(operation.name).throttles += 1
+        return None
+
+    def add_sleep(self, reason, seconds):
+        with self.lock:
+            self.sleep_secs[reason] = self.sleep_secs.get(reason, 0.0) + seconds
+
+    def snapshot(self):
+        """a JSON serialisable copy of all of the counts"""
+        with self.lock:
+            return {
+                "operations": {
+                    name: stats.as_dict()
+                    for name, stats in sorted(self.operations.items())
+                },
+                "sleep_secs": {
+                    reason: round(seconds, 6)
+                    for reason, seconds in sorted(self.sleep_secs.items())
+                },
+            }
+
+    def report_lines(self):
+        """a human readable summary, one line per operation and sleep reason"""
+        snapshot = self.snapshot()
+        for name, stats in snapshot["operations"].items():
+            mean = stats["latency_sum"] / stats["calls"] if stats["calls"] else 0
+            yield (
+                name
+                + ": calls "
+                + str(stats["calls"])
+                + ", errors "
+                + str(stats["errors"])
+                + ", retries "
+                + str(stats["retries"])
+                + ", throttles "
+                + str(stats["throttles"])
+                + ", mean latency "
+                + str(round(mean * 1000, 1))
+                + "ms"
+            )
+        for reason, seconds in snapshot["sleep_secs"].items():
+            yield "sleep " + reason + ": " + str(round(seconds, 3)) + "s"
+
+    def prometheus_text(self, prefix="ssm_backup"):
+        """the counts in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for counter in ("calls", "errors", "retries", "throttles"):
+            metric = prefix + "_api_" + counter + "_total"
+            lines.append("# TYPE " + metric + " counter")
+            for name, stats in snapshot["operations"].items():
+                lines.append(
+                    metric + '{operation="' + name + '"} ' + str(stats[counter])
+                )
+        metric = prefix + "_api_latency_seconds"
+        lines.append("# TYPE " + metric + " histogram")
+        for name, stats in snapshot["operations"].items():
+            total = 0
+            for bound, count in stats["latency_buckets"].items():
+                total += count
+                lines.append(
+                    metric
+                    + '_bucket{operation="'
+                    + name
+                    + '",le="'
+                    + bound
+                    + '"} '
+                    + str(total)
+                )
+            lines.append(
+                metric + '_sum{operation="' + name + '"} ' + str(stats["latency_sum"])
+            )
+            lines.append(metric + '_count{operation="' + name + '"} ' + str(total))
+        metric = prefix + "_sleep_seconds_total"
+        lines.append("# TYPE " + metric + " counter")
+        for reason, seconds in snapshot["sleep_secs"].items():
+            lines.append(metric + '{reason="' + reason + '"} ' + str(seconds))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_textfile(self, path, prefix="ssm_backup"):
+        """write prometheus_text() for node_exporter's textfile collector
+
+        the file is replaced atomically so the collector never reads a
+        partly written file.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text(prefix))
+        os.replace(tmp_path, path)
+
+    def statsd_lines(self, prefix="ssm_backup"):
+        """the counts as StatsD counters and gauges"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, stats in snapshot["operations"].items():
+            for counter in ("calls", "errors", "retries", "throttles"):
+                lines.append(
+                    prefix
+                    + ".api."
+                    + name
+                    + "."
+                    + counter
+                    + ":"
+                    + str(stats[counter])
+                    + "|c"
+                )
+            if stats["calls"]:
+                mean_ms = stats["latency_sum"] * 1000 / stats["calls"]
+                lines.append(
+                    prefix
+                    + ".api."
+                    + name
+                    + ".latency_mean_ms:"
+                    + str(round(mean_ms, 3))
+                    + "|g"
+                )
+        for reason, seconds in snapshot["sleep_secs"].items():
+            lines.append(
+                prefix + ".sleep." + reason + "_seconds:" + str(seconds) + "|g"
+            )
+        return lines
+
+    def send_statsd(self, address, prefix="ssm_backup"):
+        """send statsd_lines() over UDP to a "host:port" address"""
+        host, port = address.rsplit(":", 1)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for line in self.statsd_lines(prefix):
+                sock.sendto(line.encode("utf-8"), (host, int(port)))
+        finally:
+            sock.close()
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
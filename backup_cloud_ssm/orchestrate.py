@@ -0,0 +1,190 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_aws_ssm import backup_to_file
+from backup_cloud_ssm.backup_format import json_format
+from backup_cloud_ssm.clients import shared_session
+from backup_cloud_ssm.rate_limit import token_bucket, limit_client
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger()
+
+backup_target = namedtuple("backup_target", ["region", "profile", "role_arn"])
+
+
+def make_targets(regions, profiles=None, role_arns=None):
+    """every combination of region with each profile and role to assume
+
+    roles are assumed using the credentials of each profile (or the
+    default credentials when no profiles are given).
+    """
+    return [
+        backup_target(region, profile, role_arn)
+        for profile in (profiles or [None])
+        for role_arn in (role_arns or [None])
+        for region in regions
+    ]
+
+
+def target_name(target):
+    parts = [target.profile]
+    if target.role_arn is not None:
+        # arn:aws:iam::<account>:role/<name> - use the account and role name
+        arn_parts = target.role_arn.split(":")
+        parts.append(arn_parts[4] + "-" + arn_parts[-1].split("/")[-1])
+    parts.append(target.region)
+    name = "_".join(p for p in parts if p)
+    return re.sub(r"[^A-Za-z0-9_.-]", "-", name)
+
+
+class assume_role_provider:
+    """a botocore credential provider for credentials from assuming a role
+
+    the role isn't assumed until the credentials are first used and
+    refresh_using is called again to assume it afresh shortly before
+    they expire, judged by time_fetcher (by default the local clock).
+    """
+
+    METHOD = "assume-role"
+    CANONICAL_NAME = None
+
+    def __init__(self, refresh_using, time_fetcher=None):
+        self.refresh_using = refresh_using
+        self.time_fetcher = time_fetcher
+
+    def load(self):
+        from botocore.credentials import DeferredRefreshableCredentials
+
+        clock = {}
+        if self.time_fetcher is not None:
+            clock["time_fetcher"] = self.time_fetcher
+        return DeferredRefreshableCredentials(
+            refresh_using=self.refresh_using, method=self.METHOD, **clock
+        )
+
+
+class session_pool:
+    """one boto3 session per set of credentials, shared between targets
+
+    sessions aren't safe to use from several threads while clients are
+    being created so creation is done under a lock; the clients
+    themselves can be shared.  Roles are assumed when their
+    credentials are first used and again shortly before they expire,
+    so runs can last longer than a role session.
+    """
+
+    def __init__(self, session_name="aws-ssm-backup"):
+        self.session_name = session_name
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def session(self, profile=None, role_arn=None):
+        key = (profile, role_arn)
+        with self.lock:
+            if key not in self.sessions:
+                session = shared_session(profile_name=profile)
+                if role_arn is not None:
+                    session = self.assume_role_session(session, role_arn)
+                self.sessions[key] = session
+            return self.sessions[key]
+
+    def assume_role_session(self, source, role_arn):
+        """a session whose credentials assume role_arn and refresh themselves"""
+        import boto3
+        import botocore.session
+        from botocore.credentials import (
+            AssumeRoleCredentialFetcher,
+            CredentialResolver,
+        )
+
+        def sts_client(*args, **kwargs):
+            with self.lock:
+                return source.client(*args, **kwargs)
+
+        fetcher = AssumeRoleCredentialFetcher(
+            client_creator=sts_client,
+            source_credentials=source.get_credentials(),
+            role_arn=role_arn,
+            extra_args={"RoleSessionName": self.session_name},
+        )
+        core_session = botocore.session.Session()
+        # the role is the only place this session looks for credentials
+        core_session.register_component(
+            "credential_provider",
+            CredentialResolver([assume_role_provider(fetcher.fetch_credentials)]),
+        )
+        return boto3.Session(botocore_session=core_session)
+
+    def client(self, service, target):
+        session = self.session(target.profile, target.role_arn)
+        with self.lock:
+            return session.client(service, region_name=target.region)
+
+
+def backup_targets(
+    targets,
+    output_dir,
+    format=json_format,
+    max_workers=8,
+    rate=None,
+    sessions=None,
+    public_key=None,
+    compression="gzip",
+    **scope
+):
+    """back up each target to its own file in output_dir concurrently
+
+    at most max_workers targets run at once and each target's SSM
+    calls are limited to rate per second.  scope holds the path,
+    include/exclude and stats arguments for aws_ssm_dict.  A failed target
+    doesn't stop the others; the result for every target (status,
+    timing, output file and any error) is returned and also written to
+    summary.json in output_dir.  Given a public_key every backup is
+    encrypted to it and its file name ends in .enc.
+    """
+    if sessions is None:
+        sessions = session_pool()
+    os.makedirs(output_dir, exist_ok=True)
+
+    def run_target(target):
+        name = target_name(target) + "." + format
+        if public_key is not None:
+            name += ".enc"
+        output_file = os.path.join(output_dir, name)
+        result = {
+            "region": target.region,
+            "profile": target.profile,
+            "role_arn": target.role_arn,
+            "output": output_file,
+        }
+        start = monotonic()
+        try:
+            client = sessions.client("ssm", target)
+            if rate:
+                limit_client(client, token_bucket(rate, stats=scope.get("stats")))
+            ssm_dict = aws_ssm_dict(return_type="dict", ssm_client=client, **scope)
+            backup_to_file(
+                output_file,
+                format=format,
+                ssm_dict=ssm_dict,
+                public_key=public_key,
+                compression=compression,
+            )
+            result["status"] = "ok"
+        except Exception as e:
+            logger.error("backup of " + target_name(target) + " failed: " + str(e))
+            result["status"] = "failed"
+            result["error"] = str(e)
+        result["seconds"] = round(monotonic() - start, 3)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_target, targets))
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(results, f, indent=2)
+    return results
@@ -0,0 +1,240 @@
+from contextlib import contextmanager
+from time import monotonic, sleep, time
+import json
+import os
+import threading
+
+# default requests per second for PutParameter.  SSM's standard quota
+# for writes is low; raise this only if the account limit has been
+# increased.
+put_parameter_tps = 3
+
+# error codes SSM uses to say that a request was throttled
+throttling_codes = ("ThrottlingException", "Throttling")
+
+# operations which use the write budget of a rate_controller; all others
+# (GetParameter*, DescribeParameters, ...) use the read budget
+write_operations = (
+    "PutParameter",
+    "DeleteParameter",
+    "DeleteParameters",
+    "LabelParameterVersion",
+)
+
+
+class token_bucket:
+    """a thread safe token bucket limiting calls to `rate` per second
+
+    up to `capacity` tokens accumulate while the bucket is idle so
+    that short bursts are allowed.  acquire() blocks until a token is
+    available; the time spent waiting is recorded as "rate_limit"
+    sleep in the optional api_stats.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, stats=None):
+        self.rate = rate
+        self.stats = stats
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.last = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.last) * self.rate
+                )
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+            if self.stats is not None:
+                self.stats.add_sleep("rate_limit", wait)
+
+
+def is_throttling_error(e: Exception):
+    try:
+        return e.response["Error"]["Code"] in throttling_codes
+    except (AttributeError, KeyError, TypeError):
+        return False
+
+
+def limit_client(client, limiter, operations=None):
+    """make calls through a boto3 client wait for a token from limiter
+
+    operations optionally restricts the limit to the named API
+    operations (e.g. "PutParameter").
+    """
+
+    def acquire(model, **kwargs):
+        if operations is None or model.name in operations:
+            limiter.acquire()
+
+    client.meta.events.register("before-call", acquire)
+    return client
+
+
+class aimd_bucket:
+    """a token bucket whose rate adapts to throttling
+
+    the rate is additive increase, multiplicative decrease: each
+    successful call adds increase / rate, so the rate climbs by about
+    increase calls per second for every second of successful calls up
+    to max_rate, and a throttled call multiplies it by decrease, down
+    to min_rate, and empties the bucket.  The rate is cut at most once
+    per 1/rate seconds so that a burst of throttles from calls which
+    were already in flight only counts once.
+
+    given a state_file the bucket lives in that file, which is locked
+    while it is updated, so every thread and process on the host using
+    the same file shares one budget.  The learned rate is kept between
+    runs.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float = 0.5,
+        max_rate: float = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        state_file: str = None,
+        stats=None,
+    ):
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.increase = increase
+        self.decrease = decrease
+        self.state_file = state_file
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.state = {"rate": rate, "tokens": 1.0, "last": time(), "last_cut": 0.0}
+
+    @contextmanager
+    def locked_state(self):
+        with self.lock:
+            if self.state_file is None:
+                yield self.state
+                return
+            import fcntl
+
+            with open(self.state_file, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                data = f.read()
+                state = json.loads(data) if data else dict(self.state)
+                yield state
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+
+    def rate(self):
+        with self.locked_state() as state:
+            return state["rate"]
+
+    def acquire(self):
+        while True:
+            with self.locked_state() as state:
+                now = time()
+                elapsed = max(0.0, now - state["last"])
+                state["tokens"] = min(
+                    max(1.0, state["rate"]), state["tokens"] + elapsed * state["rate"]
+                )
+                state["last"] = now
+                if state["tokens"] >= 1:
+                    state["tokens"] -= 1
+                    return
+                wait = (1 - state["tokens"]) / state["rate"]
+            sleep(wait)
+            if self.stats is not None:
+                self.stats.add_sleep("rate_limit", wait)
+
+    def succeeded(self):
+        with self.locked_state() as state:
+            state["rate"] = min(
+                self.max_rate, state["rate"] + self.increase / state["rate"]
+            )
+
+    def throttled(self):
+        with self.locked_state() as state:
+            now = time()
+            if now - state["last_cut"] >= 1 / state["rate"]:
+                state["rate"] = max(self.min_rate, state["rate"] * self.decrease)
+                state["last_cut"] = now
+                state["tokens"] = min(state["tokens"], 0.0)
+
+
+class rate_controller:
+    """adaptive read and write budgets for every call through SSM clients
+
+    attach() makes each attempt (botocore's own retries included) wait
+    for a token from the read or write aimd_bucket for its operation,
+    and feeds the outcome back so that the rate rises while calls
+    succeed and falls back when SSM throttles.  Given a state_dir the
+    budgets are shared with every process on the host using the same
+    directory for the same account_id and region_name; SSM throttles
+    each account and region separately so each has its own files.
+    """
+
+    def __init__(
+        self,
+        read_rate=10.0,
+        write_rate=put_parameter_tps,
+        max_read_rate=40.0,
+        max_write_rate=10.0,
+        state_dir=None,
+        stats=None,
+        region_name=None,
+        account_id=None,
+    ):
+        read_file = write_file = None
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+            # <account>-<region>-read-rate.json
+            prefix = "".join(p + "-" for p in (account_id, region_name) if p)
+            read_file = os.path.join(state_dir, prefix + "read-rate.json")
+            write_file = os.path.join(state_dir, prefix + "write-rate.json")
+        self.read = aimd_bucket(
+            read_rate, max_rate=max_read_rate, state_file=read_file, stats=stats
+        )
+        self.write = aimd_bucket(
+            write_rate, max_rate=max_write_rate, state_file=write_file, stats=stats
+        )
+
+    def bucket(self, operation):
+        return self.write if operation in write_operations else self.read
+
+    def rates(self):
+        return {"read": self.read.rate(), "write": self.write.rate()}
+
+    def handlers(self):
+        return {
+            "before-send.ssm": self.before_send,
+            "needs-retry.ssm": self.needs_retry,
+        }
+
+    def attach(self, client):
+        for event, handler in self.handlers().items():
+            unique_id = "rate-controller-" + str(id(self)) + "-" + event
+            client.meta.events.register(event, handler, unique_id=unique_id)
+        return client
+
+    def before_send(self, event_name, **kwargs):
+        self.bucket(event_name.split(".")[-1]).acquire()
+
+    def needs_retry(self, response, operation, **kwargs):
+        if response is None:
+            return None
+        try:
+            code = response[1]["Error"]["Code"]
+        except (KeyError, TypeError):
+            code = None
+        if code in throttling_codes:
+            self.bucket(operation.name).throttled()
+        elif code is None:
+            self.bucket(operation.name).succeeded()
+        return None
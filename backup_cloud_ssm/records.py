@@ -0,0 +1,167 @@
+from array import array
+from datetime import datetime, timezone
+import sys
+
+
+class parameter_record:
+    """one parameter without the rest of the boto3 response around it
+
+    the SSM responses that listing works from carry an ARN, data type,
+    response metadata and more for every parameter.  A record keeps
+    only what backup, restore and diffing use, in slots rather than a
+    dictionary, with the type string interned so that every record of
+    a type shares one.  version and last_modified are None when the
+    call the record came from didn't return them.
+    """
+
+    __slots__ = ("name", "type", "value", "description", "version", "last_modified")
+
+    def __init__(
+        self, name, type, value, description="", version=None, last_modified=None
+    ):
+        self.name = name
+        self.type = sys.intern(type) if type is not None else None
+        self.value = value
+        self.description = description
+        self.version = version
+        self.last_modified = last_modified
+
+    @classmethod
+    def from_param(cls, param, description=None):
+        """a record from a GetParameter(s)/DescribeParameters style dict"""
+        if description is None:
+            description = param.get("Description", "")
+        return cls(
+            param["Name"],
+            param.get("Type"),
+            param.get("Value"),
+            description,
+            param.get("Version"),
+            param.get("LastModifiedDate"),
+        )
+
+    @classmethod
+    def from_dict(cls, name, param):
+        """a record from a backup's (name, dict) pair"""
+        return cls(name, param["type"], param["value"], param.get("description", ""))
+
+    def as_dict(self):
+        return {"value": self.value, "type": self.type, "description": self.description}
+
+    def as_tuple(self):
+        return (self.type, self.value, self.description)
+
+    def __eq__(self, other):
+        if not isinstance(other, parameter_record):
+            return NotImplemented
+        return all(getattr(self, s) == getattr(other, s) for s in self.__slots__)
+
+    def __repr__(self):
+        return (
+            "parameter_record("
+            + ", ".join(s + "=" + repr(getattr(self, s)) for s in self.__slots__)
+            + ")"
+        )
+
+
+# stand ins for a missing version or modification time in the number
+# columns of a parameter_batch; SSM versions start at 1
+no_version = 0
+no_time = float("nan")
+
+
+class parameter_batch:
+    """many parameter records stored column by column
+
+    each field is a column: strings in lists (types interned), versions
+    and modification times (as POSIX timestamps) in compact arrays.
+    Holding a large account this way costs a fraction of the memory of
+    a dictionary or record object per parameter.  Records can be looked
+    up by name or position and are made on demand, as are the dict and
+    tuple shapes which aws_ssm_dict's return_type gives.
+    """
+
+    def __init__(self, records=()):
+        self.names = []
+        self.types = []
+        self.values = []
+        self.descriptions = []
+        self.versions = array("q")
+        self.times = array("d")
+        self.positions = {}
+        for record in records:
+            self.append(record)
+
+    def append(self, record):
+        """add a parameter_record, replacing any earlier one of the same name"""
+        position = self.positions.get(record.name)
+        if position is None:
+            self.positions[record.name] = len(self.names)
+            self.names.append(record.name)
+            self.types.append(None)
+            self.values.append(None)
+            self.descriptions.append(None)
+            self.versions.append(no_version)
+            self.times.append(no_time)
+            position = len(self.names) - 1
+        self.types[position] = sys.intern(record.type) if record.type else record.type
+        self.values[position] = record.value
+        self.descriptions[position] = record.description
+        self.versions[position] = record.version or no_version
+        if record.last_modified is None:
+            self.times[position] = no_time
+        else:
+            self.times[position] = record.last_modified.timestamp()
+
+    def add_dict(self, name, param):
+        """add a backup's (name, dict) pair"""
+        self.append(parameter_record.from_dict(name, param))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def position(self, name):
+        """the position of name in the batch or None"""
+        return self.positions.get(name)
+
+    def record(self, position):
+        time = self.times[position]
+        return parameter_record(
+            self.names[position],
+            self.types[position],
+            self.values[position],
+            self.descriptions[position],
+            self.versions[position] or None,
+            None if time != time else datetime.fromtimestamp(time, timezone.utc),
+        )
+
+    def get(self, name):
+        """the record for name or None"""
+        position = self.positions.get(name)
+        return None if position is None else self.record(position)
+
+    def as_dict(self, position):
+        return {
+            "value": self.values[position],
+            "type": self.types[position],
+            "description": self.descriptions[position],
+        }
+
+    def as_tuple(self, position):
+        return (
+            self.types[position],
+            self.values[position],
+            self.descriptions[position],
+        )
+
+    def __iter__(self):
+        for position in range(len(self.names)):
+            yield self.record(position)
+
+    def items(self):
+        """(name, dict) pairs as backups and restores use them"""
+        for position, name in enumerate(self.names):
+            yield (name, self.as_dict(position))
@@ -0,0 +1,120 @@
+from backup_cloud_ssm.backup_aws_ssm import restore_parameter, retry_throttled, failed
+from backup_cloud_ssm.incremental import load_manifest, save_manifest, manifest_entry
+from backup_cloud_ssm.rate_limit import token_bucket, put_parameter_tps
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+import logging
+
+logger = logging.getLogger()
+
+
+def sync_once(source, target, state_file, jobs=1, limiter=None):
+    """copy the changes made in source since the last run to target
+
+    the state file is a manifest, as used for incremental backups, of
+    the version of every parameter already copied.  Only parameter
+    metadata is listed from source; values are fetched (ten per call)
+    just for parameters which are new or changed, and these are
+    written to target with overwrite.  Parameters which have gone from
+    source are deleted from target, ten per call.  Parameters which
+    fail to copy or delete keep their old manifest entry so the next
+    run tries them again.  The manifest is saved even when the pass
+    fails part way through so that what was copied isn't copied again.
+
+    SecureStrings are encrypted in target with its default key.
+
+    returns a dictionary of counts of updated, deleted and failed
+    parameters.
+    """
+    manifest = load_manifest(state_file) or {}
+    current = {}
+    changed = {}
+    for desc in source.iterate_param_descs():
+        name = desc["Name"]
+        entry = current[name] = manifest_entry(desc)
+        if manifest.get(name) != entry:
+            changed[name] = desc.get("Description", "")
+    deleted = [name for name in manifest if name not in current]
+
+    def copy(param):
+        name = param["Name"]
+        value = source.param_to_dict(param, changed[name])
+        try:
+            return (
+                name,
+                restore_parameter(target, name, value, limiter, overwrite=True),
+            )
+        except Exception as e:
+            logger.error("failed to copy parameter " + name + ": " + str(e))
+            return (name, failed)
+
+    counts = {"updated": 0, "deleted": 0, "failed": 0}
+    new_manifest = dict(manifest)
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for params, invalid in source.iterate_parameter_batches(changed.keys()):
+                for name, result in executor.map(copy, params):
+                    if result == failed:
+                        counts["failed"] += 1
+                    else:
+                        new_manifest[name] = current[name]
+                        counts["updated"] += 1
+                for name in invalid:
+                    # gone since it was described; deleted on the next run
+                    logger.info("parameter " + name + " vanished during sync")
+
+        for start in range(0, len(deleted), 10):
+            batch = deleted[start : start + 10]
+            try:
+                retry_throttled(
+                    target,
+                    lambda: target.delete_parameters(batch, wait=False),
+                    limiter,
+                )
+            except Exception as e:
+                logger.error("failed to delete " + ", ".join(batch) + ": " + str(e))
+                counts["failed"] += len(batch)
+                continue
+            for name in batch:
+                del new_manifest[name]
+            counts["deleted"] += len(batch)
+    finally:
+        save_manifest(state_file, new_manifest)
+    return counts
+
+
+def sync(
+    source,
+    target,
+    state_file,
+    interval=60,
+    jobs=1,
+    rate=put_parameter_tps,
+    once=False,
+):
+    """replicate source to target, polling for changes every interval seconds
+
+    source and target are aws_ssm_dicts (with return_type "dict") for
+    the two regions; their path and include/exclude scope limit what
+    is replicated.  Writes to target are limited to rate per second.
+    Progress is kept in state_file so that a restarted sync only
+    copies what changed while it was stopped.  With once a single
+    pass is made and its counts are returned; otherwise a pass which
+    fails (on a network error, say) is logged and the next poll
+    carries on from what was saved.
+    """
+    limiter = token_bucket(rate, stats=target.stats) if rate else None
+    while True:
+        try:
+            counts = sync_once(source, target, state_file, jobs, limiter)
+        except Exception as e:
+            if once:
+                raise
+            logger.error("sync pass failed: " + str(e))
+        else:
+            logger.info(
+                "sync: " + ", ".join(k + ": " + str(v) for k, v in counts.items())
+            )
+            if once:
+                return counts
+        sleep(interval)
@@ -0,0 +1,186 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_aws_ssm import restore_records
+from backup_cloud_ssm.rate_limit import put_parameter_tps
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+
+# repository layout:
+#
+#   objects/<first two hex digits>/<rest of sha256>   one parameter record
+#   snapshots/<snapshot id>.json                        name -> object hash
+#   lock                                                held while writing
+#
+# a record is stored once however many snapshots contain it, so each
+# new snapshot only writes its manifest and the records which changed.
+
+
+def record_bytes(name, param):
+    """the canonical encoding of a record, which its hash is taken from"""
+    record = {"name": name}
+    record.update(param)
+    return json.dumps(record, sort_keys=True).encode("utf-8")
+
+
+def record_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def atomic_write(path, data):
+    """replace path with data, readable only by its owner"""
+    temp_path = path + ".tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class backup_repository:
+    """a directory of deduplicated snapshots of the parameter store
+
+    each parameter record (name, type, value and description) is
+    stored as an object named by the SHA-256 of its content and each
+    snapshot is a manifest mapping parameter names to objects.
+    Unchanged parameters cost nothing in a new snapshot and two
+    snapshots can be compared by their manifests alone.  SecureString
+    values are stored decrypted, so the directories are created for
+    and the files readable by their owner only.
+
+    saving snapshots holds a shared lock on the repository and gc() an
+    exclusive one, so that gc never removes the objects of a snapshot
+    whose manifest isn't written yet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.objects_dir = os.path.join(path, "objects")
+        self.snapshots_dir = os.path.join(path, "snapshots")
+        self.lock_file = os.path.join(path, "lock")
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        os.makedirs(self.objects_dir, mode=0o700, exist_ok=True)
+        os.makedirs(self.snapshots_dir, mode=0o700, exist_ok=True)
+
+    @contextmanager
+    def locked(self, exclusive=False):
+        import fcntl
+
+        with open(self.lock_file, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put_object(self, name, param):
+        """store a record unless it is already present; returns its hash"""
+        data = record_bytes(name, param)
+        digest = record_hash(data)
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            atomic_write(path, data)
+        return digest
+
+    def get_object(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            record = json.loads(f.read().decode("utf-8"))
+        return (record.pop("name"), record)
+
+    def snapshot_path(self, snapshot_id):
+        return os.path.join(self.snapshots_dir, snapshot_id + ".json")
+
+    def save_snapshot(self, records):
+        """store (name, dict) records as a new snapshot; returns its id"""
+        with self.locked():
+            created = datetime.now(timezone.utc)
+            manifest = {
+                "created": created.isoformat(),
+                "parameters": {
+                    name: self.put_object(name, param) for name, param in records
+                },
+            }
+            snapshot_id = created.strftime("%Y%m%dT%H%M%S%fZ")
+            atomic_write(
+                self.snapshot_path(snapshot_id),
+                json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+            )
+        return snapshot_id
+
+    def snapshots(self):
+        """the ids of all snapshots, oldest first"""
+        return sorted(
+            name[: -len(".json")]
+            for name in os.listdir(self.snapshots_dir)
+            if name.endswith(".json")
+        )
+
+    def load_snapshot(self, snapshot_id):
+        """the name -> object hash manifest of a snapshot"""
+        try:
+            with open(self.snapshot_path(snapshot_id)) as f:
+                return json.load(f)["parameters"]
+        except FileNotFoundError:
+            raise KeyError("no such snapshot: " + snapshot_id)
+
+    def snapshot_records(self, snapshot_id):
+        """(name, dict) pairs for each parameter in a snapshot"""
+        for name, digest in sorted(self.load_snapshot(snapshot_id).items()):
+            yield self.get_object(digest)
+
+    def forget(self, snapshot_id):
+        """delete a snapshot; its objects stay until gc()"""
+        try:
+            os.remove(self.snapshot_path(snapshot_id))
+        except FileNotFoundError:
+            raise KeyError("no such snapshot: " + snapshot_id)
+
+    def diff(self, old_id, new_id):
+        """the names added, removed and changed between two snapshots"""
+        old = self.load_snapshot(old_id)
+        new = self.load_snapshot(new_id)
+        return {
+            "added": sorted(name for name in new if name not in old),
+            "removed": sorted(name for name in old if name not in new),
+            "changed": sorted(
+                name for name in new if name in old and old[name] != new[name]
+            ),
+        }
+
+    def gc(self):
+        """remove objects no snapshot refers to; returns how many went"""
+        with self.locked(exclusive=True):
+            referenced = set()
+            for snapshot_id in self.snapshots():
+                referenced.update(self.load_snapshot(snapshot_id).values())
+            removed = 0
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for rest in os.listdir(prefix_dir):
+                    if prefix + rest not in referenced:
+                        os.remove(os.path.join(prefix_dir, rest))
+                        removed += 1
+        return removed
+
+
+def backup_to_repository(repository, ssm_dict=None, records=None):
+    """save the current parameters as a new snapshot; returns its id
+
+    records defaults to a bulk listing from ssm_dict; pass
+    snapshot.snapshot_records for a point-in-time snapshot.
+    """
+    if records is None:
+        if ssm_dict is None:
+            ssm_dict = aws_ssm_dict(return_type="dict")
+        records = ssm_dict.iterate_for_dicts()
+    return repository.save_snapshot(records)
+
+
+def restore_from_repository(
+    repository, snapshot_id, jobs=1, rate=put_parameter_tps, ssm_dict=None
+):
+    """restore a snapshot as restore_from_file restores a backup file"""
+    return restore_records(
+        repository.snapshot_records(snapshot_id), jobs, rate, ssm_dict
+    )
@@ -0,0 +1,138 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_aws_ssm import (
+    restore_parameter,
+    failed,
+    identical,
+)
+from backup_cloud_ssm.backup_format import open_backup, read_records, is_tombstone
+from backup_cloud_ssm.envelope import open_encrypted_backup
+from backup_cloud_ssm.rate_limit import token_bucket, put_parameter_tps
+from backup_cloud_ssm.records import parameter_batch
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+logger = logging.getLogger()
+
+# plan actions for each parameter
+create = "create"
+overwrite = "overwrite"
+extra = "extra"
+actions = (create, overwrite, identical, extra)
+
+
+class restore_plan:
+    """what restoring a backup would change in the parameter store
+
+    each of the actions maps to a sorted list of parameter names:
+    create for parameters missing from SSM, overwrite for those which
+    differ from the backup, identical for those which match and extra
+    for parameters in SSM (within scope) which aren't in the backup.
+    The backup records which need writing are kept in records, a
+    parameter_batch.
+    """
+
+    def __init__(self):
+        self.names = {action: [] for action in actions}
+        self.records = parameter_batch()
+
+    def record(self, name):
+        """the backup's dict for a parameter which needs writing"""
+        return self.records.as_dict(self.records.position(name))
+
+    def summary(self):
+        return {action: len(self.names[action]) for action in actions}
+
+    def lines(self):
+        for action in actions:
+            for name in sorted(self.names[action]):
+                yield action + " " + name
+
+
+def make_plan(records, ssm_dict):
+    """compare backup records with the current contents of SSM
+
+    the current parameters are listed in bulk (descriptions and values
+    a page at a time) rather than looked up one key at a time and held
+    column-wise in a parameter_batch.
+    """
+    current = parameter_batch(ssm_dict.iterate_records())
+    matched = bytearray(len(current))
+    plan = restore_plan()
+    for name, param in records:
+        if is_tombstone(param) or not ssm_dict.wanted(name):
+            continue
+        position = current.position(name)
+        if position is None:
+            action = create
+        else:
+            matched[position] = 1
+            if current.as_dict(position) == param:
+                action = identical
+            else:
+                action = overwrite
+        plan.names[action].append(name)
+        if action != identical:
+            plan.records.add_dict(name, param)
+    plan.names[extra] = [name for name, seen in zip(current.names, matched) if not seen]
+    return plan
+
+
+def diff_restore(
+    file,
+    ssm_dict=None,
+    overwrite_changed=False,
+    dry_run=False,
+    jobs=1,
+    rate=put_parameter_tps,
+    private_key=None,
+):
+    """restore only the differences between a backup and SSM
+
+    returns a (plan, results) pair.  Missing parameters are created;
+    parameters which differ are logged and, with overwrite_changed,
+    replaced.  Identical parameters are skipped without any write.
+    With dry_run nothing is written and results is empty.
+    """
+    if ssm_dict is None:
+        ssm_dict = aws_ssm_dict(return_type="dict")
+    if private_key is None:
+        opened = open_backup(file)
+    else:
+        opened = open_encrypted_backup(file, "r", private_key)
+    with opened as f:
+        plan = make_plan(read_records(f), ssm_dict)
+
+    for name in plan.names[identical]:
+        logger.debug("Parameter " + name + " already exists and matches")
+    for name in plan.names[overwrite]:
+        if not overwrite_changed:
+            logger.warning(
+                "Parameter " + name + " already exists with a different value!"
+            )
+    results = {}
+    if dry_run:
+        return (plan, results)
+
+    writes = list(plan.names[create])
+    create_names = set(writes)
+    if overwrite_changed:
+        writes += plan.names[overwrite]
+    limiter = token_bucket(rate, stats=ssm_dict.stats) if rate else None
+
+    def write(name):
+        try:
+            return restore_parameter(
+                ssm_dict,
+                name,
+                plan.record(name),
+                limiter,
+                overwrite=name not in create_names,
+            )
+        except Exception as e:
+            logger.error("failed to restore parameter " + name + ": " + str(e))
+            return failed
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for name, result in zip(writes, executor.map(write, writes)):
+            results[name] = result
+    return (plan, results)
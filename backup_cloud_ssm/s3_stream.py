@@ -0,0 +1,240 @@
+from backup_cloud_ssm.clients import shared_client
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+import io
+
+s3_scheme = "s3://"
+
+# S3 needs every part of a multipart upload but the last to be at least
+# 5 MiB; backups smaller than one part are written with a single PUT.
+min_part_size = 5 * 1024 * 1024
+default_part_size = 8 * 1024 * 1024
+default_upload_workers = 4
+default_range_size = 8 * 1024 * 1024
+
+
+def is_s3_url(file):
+    return isinstance(file, str) and file.startswith(s3_scheme)
+
+
+def parse_s3_url(url):
+    """split s3://bucket/key into (bucket, key)"""
+    bucket, _, key = url[len(s3_scheme) :].partition("/")
+    if not bucket or not key:
+        raise ValueError("expected s3://bucket/key but got " + url)
+    return (bucket, key)
+
+
+class s3_upload(io.RawIOBase):
+    """write an S3 object as a multipart upload while data arrives
+
+    data is cut into part_size parts which are uploaded by up to
+    max_workers threads.  Writes wait while max_workers parts are in
+    flight, so no more than max_workers + 1 parts are held in memory
+    however big the backup.  Closing completes the upload unless it
+    was aborted, in which case the parts are discarded and no object
+    is created.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket,
+        key,
+        part_size=default_part_size,
+        max_workers=default_upload_workers,
+    ):
+        if part_size < min_part_size:
+            raise ValueError("S3 parts must be at least " + str(min_part_size))
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.executor = None
+        self.parts = []
+        self.aborted = False
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.buffer += b
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(b)
+
+    def upload_part(self, data):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key
+            )["UploadId"]
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        in_flight = [part for part in self.parts if not part.done()]
+        if len(in_flight) >= self.max_workers:
+            wait(in_flight, return_when=FIRST_COMPLETED)
+        for part in self.parts:
+            if part.done():
+                # raise the first failure rather than uploading the rest
+                part.result()
+        self.parts.append(
+            self.executor.submit(self.send_part, len(self.parts) + 1, data)
+        )
+
+    def send_part(self, number, data):
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=data,
+        )
+        return {"ETag": response["ETag"], "PartNumber": number}
+
+    def finish(self):
+        if self.upload_id is None:
+            self.client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer)
+            )
+            return
+        if self.buffer:
+            self.upload_part(bytes(self.buffer))
+        parts = [part.result() for part in self.parts]
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    def abort(self):
+        if self.upload_id is not None:
+            for part in self.parts:
+                part.cancel()
+            self.executor.shutdown(wait=True)
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if not self.aborted:
+                self.finish()
+        except BaseException:
+            self.aborted = True
+            raise
+        finally:
+            try:
+                if self.aborted:
+                    self.abort()
+            finally:
+                self.buffer = bytearray()
+                if self.executor is not None:
+                    self.executor.shutdown(wait=True)
+                super().close()
+
+
+class s3_download(io.RawIOBase):
+    """read an S3 object as a stream of range_size ranged GETs
+
+    the next range is fetched in the background while the current one
+    is being read.  Every range is requested with the ETag of the
+    object when it was opened so that a backup replaced part way
+    through a restore is reported rather than read half old, half new.
+    """
+
+    def __init__(self, client, bucket, key, range_size=default_range_size):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.range_size = range_size
+        head = client.head_object(Bucket=bucket, Key=key)
+        self.size = head["ContentLength"]
+        self.etag = head["ETag"]
+        self.chunk = b""
+        self.chunk_pos = 0
+        self.fetched = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.prefetch()
+
+    def fetch(self, start):
+        end = min(start + self.range_size, self.size) - 1
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range="bytes=" + str(start) + "-" + str(end),
+            IfMatch=self.etag,
+        )
+        return response["Body"].read()
+
+    def prefetch(self):
+        if self.fetched < self.size:
+            self.next_chunk = self.executor.submit(self.fetch, self.fetched)
+            self.fetched += self.range_size
+        else:
+            self.next_chunk = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.chunk_pos >= len(self.chunk):
+            if self.next_chunk is None:
+                return 0
+            self.chunk = self.next_chunk.result()
+            self.chunk_pos = 0
+            self.prefetch()
+        n = min(len(b), len(self.chunk) - self.chunk_pos)
+        b[:n] = self.chunk[self.chunk_pos : self.chunk_pos + n]
+        self.chunk_pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.executor.shutdown(wait=True)
+        super().close()
+
+
+@contextmanager
+def open_s3_backup(
+    url,
+    mode="r",
+    client=None,
+    part_size=default_part_size,
+    max_workers=default_upload_workers,
+    range_size=default_range_size,
+):
+    """open an s3://bucket/key backup for streaming, as open would a path
+
+    mode is "r" or "w", with "b" for a binary file.  Writing streams a
+    multipart upload which is only completed when the file is closed
+    without an exception, so a failed backup never replaces a good
+    object.  Reading streams ranged GETs.
+    """
+    if mode[0] not in "rw":
+        raise ValueError("S3 backups can only be read or written, not " + mode)
+    bucket, key = parse_s3_url(url)
+    if client is None:
+        client = shared_client("s3")
+    writing = mode.startswith("w")
+    if writing:
+        raw = s3_upload(client, bucket, key, part_size, max_workers)
+        f = io.BufferedWriter(raw)
+    else:
+        raw = s3_download(client, bucket, key, range_size)
+        f = io.BufferedReader(raw)
+    if "b" not in mode:
+        f = io.TextIOWrapper(f, encoding="utf-8")
+    try:
+        yield f
+    except BaseException:
+        if writing:
+            raw.aborted = True
+        raise
+    finally:
+        f.close()
@@ -0,0 +1,140 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_format import open_backup, write_records, json_format
+from backup_cloud_ssm.cache import not_found
+from backup_cloud_ssm.envelope import open_encrypted_backup
+from backup_cloud_ssm.records import parameter_batch, parameter_record
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger()
+
+
+def version_as_of(ssm_dict, name, cutoff):
+    """the newest version of name in its history not modified after cutoff
+
+    returns None if the parameter was created after cutoff.
+    """
+    best = None
+    for version in ssm_dict.iterate_param_history(name):
+        if version["LastModifiedDate"] > cutoff:
+            continue
+        if best is None or version["Version"] > best["Version"]:
+            best = version
+    return best
+
+
+class snapshot_counts:
+    """how the parameters of a snapshot were found
+
+    vanished counts the parameters seen in a listing which were gone
+    by the time their history was read.  It is not a count of every
+    parameter deleted after the cutoff: one deleted before both
+    listings leaves no trace at all.
+    """
+
+    def __init__(self):
+        self.listed = 0
+        self.from_history = 0
+        self.after_cutoff = 0
+        self.vanished = 0
+
+    def as_dict(self):
+        return {
+            "listed": self.listed,
+            "from_history": self.from_history,
+            "after_cutoff": self.after_cutoff,
+            "vanished": self.vanished,
+        }
+
+
+def snapshot_records(ssm_dict, cutoff, counts=None, max_workers=4):
+    """(name, dict) pairs for every parameter as it was at cutoff
+
+    parameters are listed in bulk as iterate_for_dicts does.  Those
+    whose value or description was modified after cutoff (or which
+    appear in only one of the listings) are looked up in their
+    history, max_workers at a time, to find the version current at
+    cutoff; parameters created after cutoff are left out.  Parameters
+    deleted after cutoff are gone from SSM, history included, so they
+    can't be recovered; those deleted before either listing reached
+    them are left out without being noticed or counted.
+    """
+    if counts is None:
+        counts = snapshot_counts()
+    # only the description and modification time of each listed
+    # parameter are needed, so they are kept column-wise
+    descs = parameter_batch(
+        parameter_record.from_param(desc) for desc in ssm_dict.iterate_param_descs()
+    )
+    matched = bytearray(len(descs))
+    cutoff_time = cutoff.timestamp()
+
+    late = set()
+    for param in ssm_dict.iterate_parameter_list():
+        name = param["Name"]
+        position = descs.position(name)
+        if position is not None:
+            matched[position] = 1
+        if (
+            position is None
+            or descs.times[position] > cutoff_time
+            or param["LastModifiedDate"] > cutoff
+        ):
+            late.add(name)
+            continue
+        counts.listed += 1
+        yield (name, ssm_dict.param_to_dict(param, descs.descriptions[position]))
+    late.update(name for name, seen in zip(descs.names, matched) if not seen)
+
+    def resolve(name):
+        try:
+            return (name, version_as_of(ssm_dict, name, cutoff))
+        except KeyError:
+            return (name, not_found)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, version in executor.map(resolve, sorted(late)):
+            if version is not_found:
+                logger.warning("parameter " + name + " was deleted during backup")
+                counts.vanished += 1
+                continue
+            if version is None:
+                logger.info("parameter " + name + " was created after the cutoff")
+                counts.after_cutoff += 1
+                continue
+            counts.from_history += 1
+            yield (
+                name,
+                ssm_dict.param_to_dict(version, version.get("Description", "")),
+            )
+
+
+def snapshot_backup(
+    file,
+    format=json_format,
+    ssm_dict=None,
+    cutoff=None,
+    public_key=None,
+    compression="gzip",
+):
+    """write a consistent backup of the parameters as they were at cutoff
+
+    cutoff defaults to the time the backup starts, so changes made
+    while the backup runs are left out rather than half captured.  The
+    cutoff is compared with the modification times SSM records, so
+    the local clock should be accurate.  Otherwise this works as
+    backup_to_file does; returns the snapshot_counts.
+    """
+    if ssm_dict is None:
+        ssm_dict = aws_ssm_dict(return_type="dict")
+    if cutoff is None:
+        cutoff = datetime.now(timezone.utc)
+    counts = snapshot_counts()
+    if public_key is None:
+        opened = open_backup(file, "w")
+    else:
+        opened = open_encrypted_backup(file, "w", public_key, compression)
+    with opened as f:
+        write_records(f, snapshot_records(ssm_dict, cutoff, counts), format)
+    return counts
@@ -0,0 +1,29 @@
+from hamcrest import assert_that, equal_to
+from typing import Dict
+
+# checks used by the tests and behave features; kept out of
+# aws_ssm_dict so that hamcrest isn't needed to run a backup
+
+
+def verify_dictionary(ssm_dict, my_dict: Dict[str, str]):
+    """assert that every parameter in my_dict is stored as given"""
+    params, missing = ssm_dict.fetch_parameters(my_dict.keys())
+    assert_that(missing, equal_to([]))
+    typed_keys = [k for k in my_dict.keys() if isinstance(my_dict[k], dict)]
+    descriptions = ssm_dict.describe_many(typed_keys)
+    for i in my_dict.keys():
+        test_value = my_dict[i]
+        if isinstance(test_value, dict):
+            ssm_param = ssm_dict.param_to_dict(params[i], descriptions[i])
+            assert_that(ssm_param["type"], equal_to(test_value["type"]))
+            assert_that(ssm_param["value"], equal_to(test_value["value"]))
+            assert_that(ssm_param["description"], equal_to(test_value["description"]))
+        if isinstance(test_value, str):
+            assert_that(params[i]["Value"], equal_to(test_value))
+
+
+def verify_deleted_dictionary(ssm_dict, my_dict: Dict[str, str]):
+    """assert that none of the parameters in my_dict exist"""
+    params, missing = ssm_dict.fetch_parameters(my_dict.keys())
+    assert len(params) == 0, "still found keys: " + str(list(params.keys()))
+    assert len(missing) == len(my_dict.keys())
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""benchmark backup, restore and lookups against a mocked account
+
+For each account size a synthetic set of parameters of mixed types and
+description lengths is created and each operation is timed.  SSM API
+calls are counted per operation.  Memory is measured in a separate run
+of each operation in a forked child process, which reports both the
+peak traced Python memory and the child's own peak RSS, so that neither
+tracing slows the timed run nor one operation's peak hides the next.
+Results are written as JSON; given a baseline file the run fails if
+any operation makes more calls or takes noticeably longer than it did
+in the baseline.
+
+The account is mocked with moto by default; --backend memory or
+sqlite uses the local backends instead, which are much faster and so
+suit accounts of production size.
+
+    python benchmarks/benchmark_ssm.py --sizes 100 1000 --output bench.json
+    python benchmarks/benchmark_ssm.py --sizes 100 1000 --baseline bench.json
+    python benchmarks/benchmark_ssm.py --sizes 100000 --backend memory
+"""
+
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import backup_aws_ssm
+from backup_cloud_ssm.backends import backend_client, memory_backend, sqlite_backend
+from contextlib import contextmanager
+from moto import mock_ssm
+from io import StringIO
+from time import perf_counter
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import traceback
+import tracemalloc
+
+backends = ("moto", "memory", "sqlite")
+type_names = ("String", "SecureString", "StringList")
+return_types = ("value", "dict", "tuple")
+lookup_sample = 100
+# timings this close to the baseline are noise, however large the ratio
+time_slack_secs = 0.05
+
+
+def synthetic_params(count, seed=0):
+    rng = random.Random(seed)
+    params = {}
+    for i in range(count):
+        type_name = type_names[i % len(type_names)]
+        value = ",".join(str(rng.random()) for n in range(rng.randint(1, 20)))
+        params["/benchmark/app" + str(i % 20) + "/param" + str(i)] = {
+            "value": value,
+            "type": type_name,
+            "description": "d" * rng.choice((0, 10, 100, 500)),
+        }
+    return params
+
+
+class call_counter:
+    def __init__(self, client):
+        self.counts = {}
+        client.meta.events.register("before-call.ssm", self.count)
+
+    def count(self, model, **kwargs):
+        self.counts[model.name] = self.counts.get(model.name, 0) + 1
+
+    def reset(self):
+        counts = self.counts
+        self.counts = {}
+        return counts
+
+
+def memory_pass(func):
+    """peak traced bytes and peak RSS (kB on Linux) of func run in a child
+
+    the child is forked from this process so it starts from the same
+    state, and everything it changes other than files is thrown away
+    when it exits.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 1
+        try:
+            tracemalloc.start()
+            func()
+            os.write(write_fd, str(tracemalloc.get_traced_memory()[1]).encode())
+            status = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        peak_traced = f.read()
+    pid, status, usage = os.wait4(pid, 0)
+    if status != 0:
+        raise RuntimeError("memory pass failed with status " + str(status))
+    return int(peak_traced), usage.ru_maxrss
+
+
+def measure(name, count, counter, func, setup=None):
+    """time func and count its SSM calls, then measure its memory apart
+
+    setup, when given, is run before each pass to put back the state
+    func expects, for operations (such as restore) which change it.
+    """
+    if setup is not None:
+        setup()
+    peak_traced, peak_rss = memory_pass(func)
+    if setup is not None:
+        setup()
+    counter.reset()
+    start = perf_counter()
+    func()
+    seconds = perf_counter() - start
+    calls = counter.reset()
+    result = {
+        "seconds": round(seconds, 4),
+        "calls": calls,
+        "total_calls": sum(calls.values()),
+        "peak_traced_bytes": peak_traced,
+        "peak_rss_kb": peak_rss,
+        "params_per_second": round(count / seconds, 1) if seconds else None,
+    }
+    print(name, count, result["seconds"], "s", calls, file=sys.stderr)
+    return result
+
+
+@contextmanager
+def empty_account(backend):
+    """an aws_ssm_dict on an empty account of the chosen backend"""
+    if backend == "moto":
+        with mock_ssm():
+            yield aws_ssm_dict(return_type="dict")
+    elif backend == "memory":
+        client = backend_client(memory_backend())
+        yield aws_ssm_dict(return_type="dict", ssm_client=client)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = sqlite_backend(os.path.join(tmp_dir, "ssm.db"))
+            try:
+                client = backend_client(store)
+                yield aws_ssm_dict(return_type="dict", ssm_client=client)
+            finally:
+                store.close()
+
+
+def run_size(count, backend="moto"):
+    results = {}
+    params = synthetic_params(count)
+    with empty_account(backend) as ssm_dict:
+        counter = call_counter(ssm_dict.ssm)
+        for name, param in params.items():
+            ssm_dict.ssm.put_parameter(
+                Name=name,
+                Value=param["value"],
+                Type=param["type"],
+                Description=param["description"] or " ",
+            )
+
+        backup = StringIO()
+        results["backup_to_file"] = measure(
+            "backup_to_file",
+            count,
+            counter,
+            lambda: backup_aws_ssm.backup_to_file(backup, ssm_dict=ssm_dict),
+        )
+
+        sample = random.Random(1).sample(list(params), min(lookup_sample, count))
+        for return_type in return_types:
+            ssm_dict.return_type = return_type
+            results["items_" + return_type] = measure(
+                "items_" + return_type,
+                count,
+                counter,
+                lambda: sum(1 for item in ssm_dict.items()),
+            )
+            results["getitem_" + return_type] = measure(
+                "getitem_" + return_type,
+                len(sample),
+                counter,
+                lambda: [ssm_dict[key] for key in sample],
+            )
+        results["keys"] = measure(
+            "keys", count, counter, lambda: sum(1 for key in ssm_dict)
+        )
+
+        def deleted():
+            ssm_dict.delete_parameters(params.keys(), wait=False)
+            backup.seek(0)
+
+        results["restore_from_file"] = measure(
+            "restore_from_file",
+            count,
+            counter,
+            lambda: backup_aws_ssm.restore_from_file(
+                backup, jobs=8, rate=None, ssm_dict=ssm_dict
+            ),
+            setup=deleted,
+        )
+    return results
+
+
+def compare(results, baseline, time_tolerance):
+    """list the regressions of results against baseline"""
+    regressions = []
+    for size, operations in results.items():
+        for operation, result in operations.items():
+            try:
+                old = baseline[size][operation]
+            except KeyError:
+                continue
+            if result["total_calls"] > old["total_calls"]:
+                regressions.append(
+                    size
+                    + " "
+                    + operation
+                    + ": calls "
+                    + str(old["total_calls"])
+                    + " -> "
+                    + str(result["total_calls"])
+                )
+            if result["seconds"] > old["seconds"] * time_tolerance + time_slack_secs:
+                regressions.append(
+                    size
+                    + " "
+                    + operation
+                    + ": seconds "
+                    + str(old["seconds"])
+                    + " -> "
+                    + str(result["seconds"])
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[100, 1000, 10000], help="account sizes"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=backends,
+        default="moto",
+        help="how to mock the account (default %(default)s)",
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="fail on regressions against this file")
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=1.5,
+        help="allowed ratio of time to the baseline time (default %(default)s)",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    # results from the local backends are kept apart from moto's
+    prefix = "" if args.backend == "moto" else args.backend + "-"
+    results = {prefix + str(size): run_size(size, args.backend) for size in args.sizes}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.time_tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
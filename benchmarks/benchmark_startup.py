@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""benchmark how quickly the CLI starts and makes its first SSM call
+
+Each measurement runs in a fresh Python process so that nothing is
+already imported, and the median of several runs is kept.  "help" is
+`aws-ssm-backup --help`, "import" is `import backup_cloud_ssm` and
+"first_call" is creating an aws_ssm_dict and making one lookup
+against a moto mocked account (moto imports botocore itself, so this
+measures client creation and the call rather than the import).  The
+heavy modules loaded by --help are listed too and the run fails if
+there are any.  Given a baseline file it also fails if anything got
+noticeably slower.
+
+    python benchmarks/benchmark_startup.py --output startup.json
+    python benchmarks/benchmark_startup.py --baseline startup.json
+"""
+
+from statistics import median
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+repository_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+heavy_modules = ("boto3", "botocore", "hamcrest", "cryptography", "moto")
+# timings this close to the baseline are noise, however large the ratio
+time_slack_secs = 0.05
+
+help_script = """
+import sys
+from time import perf_counter
+start = perf_counter()
+sys.argv = ["aws-ssm-backup", "--help"]
+from backup_cloud_ssm import aws_ssm_cli
+try:
+    aws_ssm_cli.main()
+except SystemExit:
+    pass
+print(perf_counter() - start, file=sys.stderr)
+print(" ".join(m for m in %r if m in sys.modules), file=sys.stderr)
+""" % (heavy_modules,)
+
+import_script = """
+import sys
+from time import perf_counter
+start = perf_counter()
+import backup_cloud_ssm
+print(perf_counter() - start, file=sys.stderr)
+"""
+
+first_call_script = """
+import sys
+from time import perf_counter
+from moto import mock_ssm
+with mock_ssm():
+    start = perf_counter()
+    from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+    aws_ssm_dict().get("/benchmark/missing")
+    print(perf_counter() - start, file=sys.stderr)
+"""
+
+
+def run_script(script):
+    """run script in a new interpreter, returning the lines it printed to stderr"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in (repository_root, env.get("PYTHONPATH")) if p
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return result.stderr.splitlines()
+
+
+def measure(script, runs):
+    outputs = [run_script(script) for run in range(runs)]
+    return {
+        "seconds": median(float(output[0]) for output in outputs),
+        "output": outputs[0][1:],
+    }
+
+
+def run_all(runs):
+    help_result = measure(help_script, runs)
+    return {
+        "help": {
+            "seconds": help_result["seconds"],
+            "heavy_modules": help_result["output"][0].split(),
+        },
+        "import": {"seconds": measure(import_script, runs)["seconds"]},
+        "first_call": {"seconds": measure(first_call_script, runs)["seconds"]},
+    }
+
+
+def compare(results, baseline, time_tolerance):
+    """list the regressions of results against baseline"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result["seconds"] > old["seconds"] * time_tolerance + time_slack_secs:
+            regressions.append(
+                name
+                + ": seconds "
+                + str(old["seconds"])
+                + " -> "
+                + str(result["seconds"])
+            )
+        added = set(result.get("heavy_modules", [])) - set(old.get("heavy_modules", []))
+        if added:
+            regressions.append(name + ": now imports " + ", ".join(sorted(added)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--runs", type=int, default=5, help="runs of each measurement to take"
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="fail on regressions against this file")
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=1.5,
+        help="allowed ratio of time to the baseline time (default %(default)s)",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    results = run_all(args.runs)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+
+    regressions = []
+    if results["help"]["heavy_modules"]:
+        regressions.append(
+            "help: imports " + ", ".join(results["help"]["heavy_modules"])
+        )
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions += compare(results, json.load(f), args.time_tolerance)
+    for regression in regressions:
+        print("REGRESSION:", regression, file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
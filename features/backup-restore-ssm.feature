@@ -29,8 +29,6 @@ In order to ensure that I can recover my SSM parameters even
    And I run the aws-ssm-backup command with the restore argument
    Then those parameters should be in SSM parameter store
 
-
-   @future
    Scenario: only warn for preexisting parameters if there is a mismatch
    Given I have an existing parameter with the same value as in my backup
    And I have an existing parameter with the a differnt value from my backup
@@ -12,8 +12,8 @@ backup_cloud to ensure that backups are encrypted and protected but can be recov
           and I have configured my settings in SSM
 
 
-  @future
-  @wip
+  @fixture.mock_aws
+  @fixture.ssm_params
   Scenario: default encryption when ssm is backed up to S3
       Given I have some parameters in SSM parameter store
        When I run the aws-ssm-backup command 
@@ -80,11 +80,25 @@ def preexisting_ssm_parameters(context):
     aws_ssm_dict.verify_deleted_dictionary(ssm_dict, params)
 
 
+@fixture
+def mock_aws(context):
+    """run the scenario against moto's mocked SSM, S3 and STS"""
+    from moto import mock_s3, mock_ssm, mock_sts
+
+    mocks = [mock_ssm(), mock_s3(), mock_sts()]
+    for mock in mocks:
+        mock.start()
+    yield (True)
+    for mock in reversed(mocks):
+        mock.stop()
+
+
 # -- REGISTRY DATA SCHEMA 1: fixture_func
 fixture_registry1 = {
     "fixture.ssm_params": setup_ssm_parameters,
     "fixture.ssm_typed_params": setup_typed_ssm_parameters,
     "fixture.preexist_params": preexisting_ssm_parameters,
+    "fixture.mock_aws": mock_aws,
 }
 
 
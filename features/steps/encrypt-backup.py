@@ -1,46 +1,79 @@
+from backup_cloud_ssm import aws_ssm_cli
+from backup_cloud_ssm.clients import shared_client
+from backup_cloud_ssm.envelope import open_encrypted_backup
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from hamcrest import assert_that, equal_to, has_item
 from behave import given, when, then
+from tempfile import NamedTemporaryFile
+from unittest.mock import patch
+from uuid import uuid4
+import json
+import sys
 
 
 @given(u"I have access to an account for doing backups")
 def step_impl_0(context):
-    raise NotImplementedError(
-        u"STEP: Given I have access to an account for doing backups"
-    )
+    s3 = context.s3 = shared_client("s3")
+    context.key_bucket = "backup-ssm-keys-" + str(uuid4())
+    context.backup_bucket = "backup-ssm-backups-" + str(uuid4())
+    for bucket in (context.key_bucket, context.backup_bucket):
+        s3.create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={
+                "LocationConstraint": s3.meta.region_name or "eu-west-1"
+            },
+        )
 
 
 @given(u"I have a private public key pair")
 def step_impl_1(context):
-    raise NotImplementedError(u"STEP: Given I have a private public key pair")
+    context.private_key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048
+    )
 
 
 @given(u"the public key from that key pair is stored in an s3 bucket")
 def step_impl_2(context):
-    raise NotImplementedError(
-        u"STEP: Given the public key from that key pair is stored in an s3 bucket"
+    public_pem = context.private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    context.s3.put_object(
+        Bucket=context.key_bucket, Key="backup-public-key.pem", Body=public_pem
     )
 
 
 @given(u"I have configured my settings in SSM")
 def step_impl_3(context):
-    raise NotImplementedError(u"STEP: Given I have configured my settings in SSM")
+    # the backup command is configured by its arguments: the public key
+    # is fetched from the key bucket and the backup goes to S3
+    key_file = context.public_key_file = NamedTemporaryFile(suffix=".pem")
+    context.s3.download_fileobj(context.key_bucket, "backup-public-key.pem", key_file)
+    key_file.flush()
+    context.backup_url = "s3://" + context.backup_bucket + "/ssm-backup.json.enc"
 
 
 @when(u"I run the aws-ssm-backup command")
 def step_impl_4(context):
-    raise NotImplementedError(u"STEP: When I run the aws-ssm-backup command")
+    # run in this process so that the backup sees the same mocked account
+    argv = ["aws-ssm-backup", "--encrypt-key", context.public_key_file.name]
+    argv += ["--output", context.backup_url]
+    with patch.object(sys, "argv", argv):
+        aws_ssm_cli.main()
 
 
 @then(u"a backup object should be created in the S3 destination bucket")
 def step_impl_5(context):
-    raise NotImplementedError(
-        u"STEP: Then a backup object should be created in the S3 destination bucket"
-    )
+    listing = context.s3.list_objects_v2(Bucket=context.backup_bucket)
+    keys = [o["Key"] for o in listing.get("Contents", [])]
+    assert_that(keys, has_item("ssm-backup.json.enc"))
 
 
 @then(
     u"if I decrypt that file the content with the private key it should match the original"
 )
 def step_impl_6(context):
-    raise NotImplementedError(
-        u"STEP: Then if I decrypt that file the content with the private key it should match the original"
-    )
+    with open_encrypted_backup(context.backup_url, "r", context.private_key) as f:
+        backup = json.load(f)
+    restored = {name: backup[name]["value"] for name in context.test_params}
+    assert_that(restored, equal_to(context.test_params))
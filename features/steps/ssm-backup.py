@@ -1,8 +1,12 @@
-from hamcrest import assert_that, instance_of
+from hamcrest import assert_that, instance_of, has_item, contains_string
 from backup_cloud_ssm import backup_aws_ssm
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
 from tempfile import NamedTemporaryFile
 from behave import given, when, then
 from subprocess import run, CalledProcessError
+from uuid import uuid4
+import json
+import logging
 
 
 @given(u"I have some parameters in SSM parameter store")
@@ -61,3 +65,79 @@ def step_impl(context):
     for i in test_params.keys():
         assert_that(test_params[i], instance_of(dict))
     context.ssm_dict.verify_dictionary(context.test_params)
+
+
+class record_list_handler(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def preexisting_param(context, backup_value, ssm_value):
+    if not hasattr(context, "backup_params"):
+        context.backup_params = {}
+        context.ssm_dict = aws_ssm_dict(return_type="dict")
+        context.add_cleanup(
+            context.ssm_dict.remove_dictionary, context.backup_params
+        )
+    name = "/backup-ssm-test/" + str(uuid4())
+    description = "aws-ssm-backup testing preexisting parameter"
+    context.backup_params[name] = {
+        "value": backup_value,
+        "type": "String",
+        "description": description,
+    }
+    context.ssm_dict[name] = ("String", ssm_value, description)
+    return name
+
+
+@given(u"I have an existing parameter with the same value as in my backup")
+def step_impl_8(context):
+    context.matching_name = preexisting_param(context, "same", "same")
+
+
+@given(u"I have an existing parameter with the a differnt value from my backup")
+def step_impl_9(context):
+    context.mismatch_name = preexisting_param(context, "backup", "changed")
+
+
+@when(u"I run my restore without overwriting parameters")
+def step_impl_10(context):
+    t = context.backup_temp_file = NamedTemporaryFile(mode="w")
+    json.dump(context.backup_params, t)
+    t.flush()
+    handler = context.log_handler = record_list_handler()
+    root_logger = logging.getLogger()
+    old_level = root_logger.level
+    root_logger.addHandler(handler)
+    root_logger.setLevel(logging.DEBUG)
+    try:
+        backup_aws_ssm.restore_from_file(t.name)
+    finally:
+        root_logger.removeHandler(handler)
+        root_logger.setLevel(old_level)
+
+
+def messages_at(context, level):
+    return [r.getMessage() for r in context.log_handler.records if r.levelno == level]
+
+
+@then(u"I should get a debug message about the matching parameter")
+def step_impl_11(context):
+    assert_that(
+        messages_at(context, logging.DEBUG),
+        has_item(contains_string(context.matching_name)),
+    )
+    for message in messages_at(context, logging.WARNING):
+        assert context.matching_name not in message
+
+
+@then(u"I should get a warning message about the other parameter")
+def step_impl_12(context):
+    assert_that(
+        messages_at(context, logging.WARNING),
+        has_item(contains_string(context.mismatch_name)),
+    )
@@ -23,4 +23,5 @@ setup(
         "console_scripts": ["aws-ssm-backup = backup_cloud_ssm.aws_ssm_cli:main"]
     },
     install_requires=["boto3"],
+    extras_require={"encrypt": ["cryptography"], "zstd": ["zstandard"]},
 )
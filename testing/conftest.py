@@ -0,0 +1,42 @@
+from botocore.awsrequest import AWSResponse
+from moto.core.botocore_stubber import MockRawResponse
+import json
+import pytest
+
+
+def make_count_calls(ssm_dict):
+    """count the SSM API calls made through ssm_dict by operation name"""
+    counts = {}
+
+    def counter(model, **kwargs):
+        counts[model.name] = counts.get(model.name, 0) + 1
+
+    ssm_dict.ssm.meta.events.register("before-call.ssm", counter)
+    return counts
+
+
+def make_throttle_first(ssm, operation, count):
+    """make the first count attempts of operation fail with throttling"""
+    remaining = [count]
+
+    def before_send(request, **kwargs):
+        target = request.headers.get("X-Amz-Target", b"")
+        if remaining[0] > 0 and target.endswith(operation.encode()):
+            remaining[0] -= 1
+            body = json.dumps({"__type": "ThrottlingException", "message": "slow"})
+            return AWSResponse(
+                request.url, 400, {}, MockRawResponse(body.encode("utf-8"))
+            )
+        return None
+
+    ssm.meta.events.register_first("before-send.ssm", before_send)
+
+
+@pytest.fixture
+def count_calls():
+    return make_count_calls
+
+
+@pytest.fixture
+def throttle_first():
+    return make_throttle_first
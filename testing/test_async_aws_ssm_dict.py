@@ -0,0 +1,95 @@
+from backup_cloud_ssm.async_aws_ssm_dict import async_aws_ssm_dict
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from moto import mock_ssm
+from io import BytesIO, StringIO
+import asyncio
+import json
+import pytest
+
+params = {
+    "/async_test/"
+    + str(i): {
+        "value": "value " + str(i),
+        "type": "String",
+        "description": "async test",
+    }
+    for i in range(15)
+}
+
+
+@mock_ssm
+def test_async_get_set_delete():
+    async def check():
+        async with async_aws_ssm_dict(return_type="dict") as ssm_dict:
+            await ssm_dict.set("/async_test/a", ("String", "a", "first"))
+            assert await ssm_dict.get("/async_test/a") == {
+                "value": "a",
+                "type": "String",
+                "description": "first",
+            }
+            await ssm_dict.delete("/async_test/a")
+            with pytest.raises(KeyError):
+                await ssm_dict.get("/async_test/a")
+            with pytest.raises(AttributeError):
+                await ssm_dict.set("", "bad key")
+
+    asyncio.run(check())
+
+
+@mock_ssm
+def test_async_client_made_on_first_use_with_pool_to_match():
+    async def check():
+        async with async_aws_ssm_dict(max_concurrency=25) as ssm_dict:
+            assert ssm_dict.sync_dict.hooked_client is None
+            await ssm_dict.set("/async_test/a", "a")
+            config = ssm_dict.sync_dict.ssm.meta.config
+            assert config.max_pool_connections == 25
+
+    asyncio.run(check())
+
+
+@mock_ssm
+def test_async_bulk_operations():
+    async def check():
+        async with async_aws_ssm_dict(return_type="dict") as ssm_dict:
+            results = await ssm_dict.restore_from_file(
+                StringIO(json.dumps(params)), rate=None
+            )
+            assert len(results) == 15 and set(results.values()) == {"created"}
+            found, missing = await ssm_dict.get_many(list(params) + ["/nope"])
+            assert found == params and missing == ["/nope"]
+            assert dict([item async for item in ssm_dict.items()]) == params
+            assert sorted([key async for key in ssm_dict]) == sorted(params)
+            output = StringIO()
+            await ssm_dict.backup_to_file(output)
+            assert json.loads(output.getvalue()) == params
+
+    asyncio.run(check())
+    aws_ssm_dict().verify_dictionary(params)
+
+
+@mock_ssm
+def test_async_encrypted_restore_and_cached_lookups(count_calls):
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    async def check():
+        async with async_aws_ssm_dict(return_type="dict", cache_ttl=60) as ssm_dict:
+            backup = BytesIO()
+            await ssm_dict.restore_from_file(StringIO(json.dumps(params)), rate=None)
+            await ssm_dict.backup_to_file(backup, public_key=private_key.public_key())
+            ssm_dict.sync_dict.remove_dictionary(params)
+            backup.seek(0)
+            results = await ssm_dict.restore_from_file(
+                backup, rate=None, private_key=private_key
+            )
+            assert set(results.values()) == {"created"}
+
+            counts = count_calls(ssm_dict.sync_dict)
+            for i in range(2):
+                found, missing = await ssm_dict.get_many(list(params))
+                assert found == params
+            assert counts["GetParameters"] == 2
+
+    asyncio.run(check())
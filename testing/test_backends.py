@@ -0,0 +1,115 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import backup_aws_ssm
+from backup_cloud_ssm.backends import backend_client, memory_backend, sqlite_backend
+from backup_cloud_ssm.snapshot import version_as_of
+from io import StringIO
+import pytest
+
+
+def make_backend(kind, tmp_path, **kwargs):
+    if kind == "memory":
+        return memory_backend(**kwargs)
+    return sqlite_backend(str(tmp_path / "ssm.db"), **kwargs)
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_backup_and_restore_through_backend(kind, tmp_path):
+    ssm_dict = aws_ssm_dict(
+        return_type="dict", ssm_client=backend_client(make_backend(kind, tmp_path))
+    )
+    params = {
+        "/backend_test/"
+        + str(i): {
+            "type": ("String", "SecureString", "StringList")[i % 3],
+            "value": "value " + str(i),
+            "description": "" if i % 2 else "desc " + str(i),
+        }
+        for i in range(75)
+    }
+    for name, param in params.items():
+        ssm_dict[name] = param
+    assert len(ssm_dict) == 75
+    assert dict(ssm_dict.items()) == params
+
+    backup = StringIO()
+    backup_aws_ssm.backup_to_file(backup, ssm_dict=ssm_dict)
+    ssm_dict.delete_parameters(params.keys())
+    assert len(ssm_dict) == 0
+    backup.seek(0)
+    results = backup_aws_ssm.restore_from_file(
+        backup, jobs=4, rate=None, ssm_dict=ssm_dict
+    )
+    assert set(results.values()) == {"created"}
+    assert dict(ssm_dict.items()) == params
+    operations = ssm_dict.stats.snapshot()["operations"]
+    # three listings of ten parameters per page, as in SSM
+    assert operations["GetParametersByPath"]["calls"] == 3 * 8
+
+
+def test_backend_keeps_versions_and_rejects_invalid_names():
+    ssm_dict = aws_ssm_dict(
+        return_type="dict", ssm_client=backend_client(memory_backend())
+    )
+    for key in ("", "/", None, "/aws/reserved", "no/leading/slash"):
+        with pytest.raises(AttributeError):
+            ssm_dict[key] = "value"
+    ssm_dict["/backend_test/key"] = ("String", "one", "first")
+    with pytest.raises(AttributeError):
+        ssm_dict["/backend_test/key"] = ("String", "two")
+    ssm_dict.put_param("/backend_test/key", ("String", "two"), overwrite=True)
+    # overwriting without a description keeps the old one
+    assert ssm_dict["/backend_test/key"] == {
+        "type": "String",
+        "value": "two",
+        "description": "first",
+    }
+    history = list(ssm_dict.iterate_param_history("/backend_test/key"))
+    assert [v["Value"] for v in history] == ["one", "two"]
+    assert (
+        version_as_of(ssm_dict, "/backend_test/key", history[0]["LastModifiedDate"])[
+            "Value"
+        ]
+        == "one"
+    )
+    del ssm_dict["/backend_test/key"]
+    with pytest.raises(KeyError):
+        ssm_dict["/backend_test/key"]
+
+
+def test_visibility_delay_models_eventual_consistency():
+    now = [1000.0]
+    backend = memory_backend(visibility_delay=5, clock=lambda: now[0])
+    client = backend_client(backend)
+    client.put_parameter(Name="/backend_test/late", Value="v", Type="String")
+    assert client.get_parameter(Name="/backend_test/late")["Parameter"]["Value"] == "v"
+    assert client.describe_parameters()["Parameters"] == []
+    now[0] += 5
+    assert len(client.describe_parameters()["Parameters"]) == 1
+    client.delete_parameter(Name="/backend_test/late")
+    assert len(client.describe_parameters()["Parameters"]) == 1
+    now[0] += 5
+    assert client.describe_parameters()["Parameters"] == []
+
+
+def test_sqlite_backend_persists(tmp_path):
+    path = str(tmp_path / "ssm.db")
+    first = sqlite_backend(path)
+    aws_ssm_dict(ssm_client=backend_client(first))["/backend_test/kept"] = "kept"
+    first.close()
+    ssm_dict = aws_ssm_dict(ssm_client=backend_client(sqlite_backend(path)))
+    assert ssm_dict["/backend_test/kept"] == "kept"
+
+
+def test_name_filters_are_looked_up_without_a_scan():
+    backend = memory_backend()
+    ssm_dict = aws_ssm_dict(ssm_client=backend_client(backend))
+    names = ["/backend_test/" + str(i) for i in range(120)]
+    for name in names:
+        ssm_dict[name] = "v"
+
+    def scan(start_after=""):
+        raise AssertionError("listed every name for an Equals filter")
+
+    backend.names = scan
+    ssm_dict.wait_until_consistent(present=names)
+    assert ssm_dict.desc_param("/backend_test/7")["Name"] == "/backend_test/7"
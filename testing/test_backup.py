@@ -0,0 +1,130 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import backup_aws_ssm
+from moto import mock_ssm
+from io import StringIO
+import json
+
+test_params = {
+    "/backup_test/string": {
+        "value": "plain value",
+        "type": "String",
+        "description": "a String parameter",
+    },
+    "/backup_test/deeper/secure": {
+        "value": "secret value",
+        "type": "SecureString",
+        "description": "",
+    },
+    "backup_test_no_slash": {
+        "value": "a,b,c",
+        "type": "StringList",
+        "description": "a StringList parameter",
+    },
+}
+
+
+@mock_ssm
+def test_bulk_dicts_match_per_key_dicts():
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict.upload_dictionary(test_params)
+    bulk = dict(ssm_dict.iterate_for_dicts())
+    assert bulk == test_params
+    assert bulk == {k: ssm_dict[k] for k in ssm_dict.keys()}
+
+
+@mock_ssm
+def test_bulk_backup_uses_listing_calls_only(count_calls):
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    many_params = {
+        "/backup_test/many/"
+        + str(i): {
+            "value": str(i),
+            "type": "String",
+            "description": "",
+        }
+        for i in range(100)
+    }
+    ssm_dict.upload_dictionary(many_params)
+    counts = count_calls(ssm_dict)
+    assert dict(ssm_dict.iterate_for_dicts()) == many_params
+    assert "GetParameter" not in counts
+    assert counts["GetParametersByPath"] <= 11
+    # moto ignores MaxResults for describe_parameters; AWS allows 50 per page
+    assert counts["DescribeParameters"] <= 11
+
+
+@mock_ssm
+def test_backup_to_file_format_unchanged():
+    aws_ssm_dict().upload_dictionary(test_params)
+    output = StringIO()
+    backup_aws_ssm.backup_to_file(output)
+    assert json.loads(output.getvalue()) == test_params
+
+
+@mock_ssm
+def test_get_many_batches_lookups(count_calls):
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict.upload_dictionary(test_params)
+    wanted = list(test_params.keys()) + ["/backup_test/missing"]
+    counts = count_calls(ssm_dict)
+    found, missing = ssm_dict.get_many(wanted)
+    assert found == test_params
+    assert missing == ["/backup_test/missing"]
+    assert counts == {"GetParameters": 1, "DescribeParameters": 1}
+
+    ssm_dict.return_type = "tuple"
+    assert ssm_dict.fetch_dict(["/backup_test/string"]) == {
+        "/backup_test/string": ("String", "plain value", "a String parameter")
+    }
+    ssm_dict.return_type = "value"
+    assert ssm_dict.fetch_dict(wanted) == {
+        k: v["value"] for k, v in test_params.items()
+    }
+
+
+@mock_ssm
+def test_verify_dictionary_with_batched_lookups(count_calls):
+    ssm_dict = aws_ssm_dict()
+    plain_params = {"/verify_test/" + str(i): str(i) for i in range(25)}
+    ssm_dict.upload_dictionary(plain_params)
+    ssm_dict.upload_dictionary(test_params)
+    counts = count_calls(ssm_dict)
+    ssm_dict.verify_dictionary(plain_params)
+    ssm_dict.verify_dictionary(test_params)
+    assert counts["GetParameters"] == 4
+    ssm_dict.remove_dictionary(test_params)
+    ssm_dict.verify_deleted_dictionary(test_params)
+
+
+@mock_ssm
+def test_scoped_backup_lists_only_its_path():
+    aws_ssm_dict().upload_dictionary(test_params)
+    scoped = aws_ssm_dict(
+        return_type="dict",
+        path="/backup_test/",
+        include=["/backup_test/*"],
+        exclude=["*/secure"],
+    )
+    assert dict(scoped.iterate_for_dicts()) == {
+        "/backup_test/string": test_params["/backup_test/string"]
+    }
+    assert list(scoped.keys()) == ["/backup_test/string"]
+
+
+@mock_ssm
+def test_views_and_len_use_bulk_listing(count_calls):
+    ssm_dict = aws_ssm_dict(return_type="tuple", cache_ttl=60)
+    assert not ssm_dict
+    ssm_dict.upload_dictionary(test_params)
+    assert ssm_dict
+    counts = count_calls(ssm_dict)
+    assert dict(ssm_dict.items()) == {
+        k: (v["type"], v["value"], v["description"]) for k, v in test_params.items()
+    }
+    assert "GetParameter" not in counts
+    assert len(ssm_dict) == 3
+    assert counts["DescribeParameters"] == 1
+    ssm_dict.return_type = "value"
+    assert sorted(ssm_dict.values()) == sorted(v["value"] for v in test_params.values())
+    del ssm_dict["/backup_test/string"]
+    assert len(ssm_dict) == 2
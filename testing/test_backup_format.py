@@ -0,0 +1,55 @@
+from backup_cloud_ssm import backup_format
+from backup_cloud_ssm.backup_format import read_records, write_records
+from hypothesis import given, settings
+import hypothesis.strategies as strategies
+from io import StringIO
+import json
+
+param_dicts = strategies.fixed_dictionaries(
+    {
+        "value": strategies.text(min_size=1, max_size=100),
+        "type": strategies.sampled_from(("SecureString", "String", "StringList")),
+        "description": strategies.text(max_size=100),
+    }
+)
+backups = strategies.dictionaries(strategies.text(min_size=1), param_dicts)
+
+
+def written(contents, format):
+    f = StringIO()
+    write_records(f, contents.items(), format)
+    return f.getvalue()
+
+
+@settings(deadline=None)
+@given(backups, strategies.sampled_from(backup_format.formats))
+def test_records_round_trip(contents, format):
+    assert dict(read_records(StringIO(written(contents, format)))) == contents
+
+
+@given(backups)
+def test_json_format_matches_json_dump(contents):
+    assert written(contents, "json") == json.dumps(contents)
+
+
+def test_jsonl_has_one_record_per_line():
+    contents = {"/a": {"value": "1", "type": "String", "description": ""}}
+    lines = written(dict(contents, b=contents["/a"]), "jsonl").splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])["name"] == "/a"
+
+
+def test_reading_crosses_buffer_boundaries(monkeypatch):
+    monkeypatch.setattr(backup_format, "read_size", 7)
+    contents = {
+        "/key/" + str(i): {"value": "v" * i, "type": "String", "description": ""}
+        for i in range(20)
+    }
+    for format in backup_format.formats:
+        assert dict(read_records(StringIO(written(contents, format)))) == contents
+
+
+def test_records_are_read_before_the_end_of_the_file():
+    f = StringIO('{"/a": {"value": "1", "type": "String", "description": ""}, "/b": ')
+    records = read_records(f)
+    assert next(records)[0] == "/a"
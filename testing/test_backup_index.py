@@ -0,0 +1,78 @@
+from backup_cloud_ssm.backup_format import write_records, json_format, jsonl_format
+from backup_cloud_ssm.backup_index import backup_index, diff_indexes, redacted
+import os
+import pytest
+
+
+def params(count, changes={}):
+    contents = {
+        "/index_test/"
+        + str(i): {
+            "value": "välue " + str(i),
+            "type": "SecureString" if i % 2 else "String",
+            "description": "",
+        }
+        for i in range(count)
+    }
+    contents.update(changes)
+    return contents
+
+
+def write_backup(path, contents, format):
+    with open(path, "w", encoding="utf-8") as f:
+        write_records(f, contents.items(), format)
+    return str(path)
+
+
+@pytest.mark.parametrize("format", [json_format, jsonl_format])
+def test_index_finds_records_without_parsing_the_backup(tmp_path, format):
+    contents = params(120)
+    backup = write_backup(tmp_path / "backup", contents, format)
+    with backup_index(backup) as index:
+        for name in ("/index_test/0", "/index_test/57", "/index_test/119"):
+            assert index.record(index.lookup(name)) == contents[name]
+        assert index.lookup("/index_test/120") is None
+        assert index.lookup("/") is None
+        assert [e.name for e in index.matching("/index_test/11?")] == [
+            "/index_test/11" + str(i) for i in range(10)
+        ]
+        assert [e.name for e in index.entries()] == sorted(contents)
+
+
+def test_index_is_cached_until_the_backup_changes(tmp_path):
+    backup = write_backup(tmp_path / "backup", params(3), json_format)
+    backup_index(backup).close()
+    index_mtime = os.stat(backup + ".idx").st_mtime_ns
+    with backup_index(backup) as index:
+        assert index.lookup("/index_test/3") is None
+    assert os.stat(backup + ".idx").st_mtime_ns == index_mtime
+
+    write_backup(tmp_path / "backup", params(4), json_format)
+    with backup_index(backup) as index:
+        assert index.lookup("/index_test/3") is not None
+
+
+def test_diff_merge_joins_two_indexes(tmp_path):
+    old_contents = params(10)
+    new_contents = params(12, {"/index_test/4": {"value": "x", "type": "String"}})
+    del new_contents["/index_test/7"]
+    old = write_backup(tmp_path / "old", old_contents, json_format)
+    new = write_backup(tmp_path / "new", new_contents, jsonl_format)
+    with backup_index(old) as old_index, backup_index(new) as new_index:
+        changes = [
+            (change, name) for change, name, o, n in diff_indexes(old_index, new_index)
+        ]
+    assert changes == [
+        ("added", "/index_test/10"),
+        ("added", "/index_test/11"),
+        ("changed", "/index_test/4"),
+        ("removed", "/index_test/7"),
+    ]
+
+
+def test_secure_strings_are_redacted():
+    secret = {"value": "hunter2", "type": "SecureString", "description": ""}
+    assert redacted(secret)["value"] == "<redacted>"
+    assert redacted(secret, show_secrets=True) == secret
+    plain = {"value": "public", "type": "String", "description": ""}
+    assert redacted(plain) == plain
@@ -0,0 +1,56 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import cache
+from backup_cloud_ssm.cache import ttl_lru_cache
+from moto import mock_ssm
+
+
+def test_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache, "monotonic", lambda: now[0])
+    c = ttl_lru_cache(ttl=5)
+    c.put("k", "v")
+    assert c.get("k") == "v"
+    now[0] += 6
+    try:
+        c.get("k")
+    except KeyError:
+        pass
+    else:
+        assert False, "expired entry was returned"
+    assert c.stats() == {"hits": 1, "misses": 1, "size": 0}
+
+
+def test_cache_evicts_least_recently_used():
+    c = ttl_lru_cache(ttl=60, max_entries=2)
+    c.put("a", 1)
+    c.put("b", 2)
+    c.get("a")
+    c.put("c", 3)
+    assert set(c.entries) == {"a", "c"}
+
+
+@mock_ssm
+def test_cached_dict_reads_through_and_invalidates(count_calls):
+    ssm_dict = aws_ssm_dict(return_type="dict", cache_ttl=60)
+    ssm_dict["/cache/key"] = ("String", "first", "cached parameter")
+    counts = count_calls(ssm_dict)
+    for i in range(5):
+        assert ssm_dict["/cache/key"]["value"] == "first"
+    assert counts["GetParameter"] == 1
+    assert counts["DescribeParameters"] == 1
+
+    del ssm_dict["/cache/key"]
+    ssm_dict["/cache/key"] = ("String", "second", "cached parameter")
+    assert ssm_dict["/cache/key"]["value"] == "second"
+    assert ssm_dict.cache_stats()["value"]["hits"] == 4
+
+
+@mock_ssm
+def test_missing_keys_are_cached(count_calls):
+    ssm_dict = aws_ssm_dict(cache_ttl=60)
+    counts = count_calls(ssm_dict)
+    for i in range(3):
+        assert ssm_dict.get("/cache/missing") is None
+    assert counts["GetParameter"] == 1
+    ssm_dict["/cache/missing"] = "now present"
+    assert ssm_dict["/cache/missing"] == "now present"
@@ -0,0 +1,142 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import checkpoint
+from backup_cloud_ssm.checkpoint import resumable_backup, resumable_restore
+from backup_cloud_ssm.backup_format import read_records
+from moto import mock_ssm
+from io import StringIO
+import json
+import os
+
+
+def make_params(ssm_dict, count):
+    params = {
+        "/checkpoint_test/" + str(i): ("String", str(i), "desc " + str(i))
+        for i in range(count)
+    }
+    for name, value in params.items():
+        ssm_dict[name] = value
+    return params
+
+
+def backed_up_names(file):
+    with open(file) as f:
+        return [name for name, param in read_records(f)]
+
+
+def fail_after_pages(ssm_dict, count):
+    """make listing die after count pages, as a lost connection would"""
+    real_pages = ssm_dict.iterate_parameter_pages
+
+    def pages(next_token=None):
+        for number, page in enumerate(real_pages(next_token)):
+            if number == count:
+                raise Exception("connection lost")
+            yield page
+
+    ssm_dict.iterate_parameter_pages = pages
+
+
+@mock_ssm
+def test_interrupted_backup_resumes_from_checkpoint(tmp_path):
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    params = make_params(ssm_dict, 45)
+    file = str(tmp_path / "backup.jsonl")
+    checkpoint_file = str(tmp_path / "backup.checkpoint")
+
+    broken_dict = aws_ssm_dict(return_type="dict")
+    fail_after_pages(broken_dict, 3)
+    try:
+        resumable_backup(file, checkpoint_file, ssm_dict=broken_dict, every=2)
+    except Exception as e:
+        assert str(e) == "connection lost"
+    with open(checkpoint_file) as f:
+        saved = json.load(f)
+    assert saved["next_token"] is not None
+    # the third page was written but not yet checkpointed
+    assert len(backed_up_names(file)) == 30
+    assert os.path.getsize(file) > saved["offset"]
+
+    assert resumable_backup(file, checkpoint_file, resume=True, ssm_dict=ssm_dict) == []
+    names = backed_up_names(file)
+    assert sorted(names) == sorted(params)
+    assert not os.path.exists(checkpoint_file)
+    # only the pages after the checkpoint are listed again
+    operations = ssm_dict.stats.snapshot()["operations"]
+    assert operations["GetParametersByPath"]["calls"] == 3
+
+
+@mock_ssm
+def test_backup_collects_failed_keys_for_retry(tmp_path):
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    params = make_params(ssm_dict, 5)
+    file = str(tmp_path / "backup.jsonl")
+    checkpoint_file = str(tmp_path / "backup.checkpoint")
+    # a parameter listed by path whose description can't be found
+    real_descs = ssm_dict.iterate_param_descs
+    ssm_dict.iterate_param_descs = lambda: (
+        d for d in real_descs() if d["Name"] != "/checkpoint_test/3"
+    )
+    ssm_dict.retrieve_description = lambda name: ssm_dict.desc_param("/missing")
+    ssm_dict.waiter.deadline = 0
+
+    assert resumable_backup(file, checkpoint_file, ssm_dict=ssm_dict) == [
+        "/checkpoint_test/3"
+    ]
+    assert len(backed_up_names(file)) == 4
+    assert os.path.exists(checkpoint_file)
+
+    fixed_dict = aws_ssm_dict(return_type="dict")
+    assert (
+        resumable_backup(file, checkpoint_file, resume=True, ssm_dict=fixed_dict) == []
+    )
+    assert sorted(backed_up_names(file)) == sorted(params)
+    assert not os.path.exists(checkpoint_file)
+
+
+class flaky_restore:
+    """restore_parameter replacement which fails for some keys"""
+
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.restored = []
+
+    def __call__(self, ssm_dict, key, value, limiter=None):
+        if key in self.failing:
+            raise Exception("credentials expired")
+        self.restored.append(key)
+        return "created"
+
+
+@mock_ssm
+def test_restore_retries_only_failed_and_unfinished_records(tmp_path, monkeypatch):
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    contents = {
+        "/checkpoint_test/"
+        + str(i): {"type": "String", "value": str(i), "description": ""}
+        for i in range(10)
+    }
+    backup = json.dumps(contents)
+    checkpoint_file = str(tmp_path / "restore.checkpoint")
+
+    first = flaky_restore(["/checkpoint_test/2"])
+    monkeypatch.setattr(checkpoint, "restore_parameter", first)
+    results = resumable_restore(
+        StringIO(backup), checkpoint_file, rate=None, ssm_dict=ssm_dict, every=3
+    )
+    assert results["/checkpoint_test/2"] == "failed"
+    assert len(first.restored) == 9
+    with open(checkpoint_file) as f:
+        assert json.load(f) == {
+            "kind": "restore",
+            "done": 10,
+            "failed": ["/checkpoint_test/2"],
+        }
+
+    second = flaky_restore([])
+    monkeypatch.setattr(checkpoint, "restore_parameter", second)
+    results = resumable_restore(
+        StringIO(backup), checkpoint_file, resume=True, rate=None, ssm_dict=ssm_dict
+    )
+    assert second.restored == ["/checkpoint_test/2"]
+    assert results == {"/checkpoint_test/2": "created"}
+    assert not os.path.exists(checkpoint_file)
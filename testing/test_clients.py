@@ -0,0 +1,45 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.instrument import api_stats
+from moto import mock_ssm
+import subprocess
+import sys
+
+
+def test_cli_imports_no_heavy_modules():
+    script = (
+        "import sys, backup_cloud_ssm.aws_ssm_cli\n"
+        "print(' '.join(m for m in ('boto3', 'botocore', 'hamcrest') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    assert result.stdout.strip() == ""
+
+
+@mock_ssm
+def test_clients_made_lazily_and_shared_within_region():
+    stats = api_stats()
+    first = aws_ssm_dict(stats=stats)
+    second = aws_ssm_dict(stats=stats)
+    assert first.hooked_client is None
+    first["/clients_test/a"] = "a"
+    assert second["/clients_test/a"] == "a"
+    assert first.ssm.client is second.ssm.client
+    # each call is counted once even though both dictionaries use it
+    assert stats.snapshot()["operations"]["GetParameter"]["calls"] == 1
+
+    separate = aws_ssm_dict()
+    assert separate.ssm.client is first.ssm.client
+    assert separate["/clients_test/a"] == "a"
+    assert list(separate.keys()) == ["/clients_test/a"]
+    assert stats.snapshot()["operations"]["GetParameter"]["calls"] == 1
+    assert "DescribeParameters" not in stats.snapshot()["operations"]
+    separate_operations = separate.stats.snapshot()["operations"]
+    assert separate_operations["GetParameter"]["calls"] == 1
+    assert separate_operations["DescribeParameters"]["calls"] >= 1
+
+    elsewhere = aws_ssm_dict(region_name="us-east-1")
+    assert elsewhere.ssm.client is not first.ssm.client
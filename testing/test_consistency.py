@@ -0,0 +1,68 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import consistency
+from backup_cloud_ssm.consistency import consistency_waiter, consistency_timeout
+from moto import mock_ssm
+
+
+class lagging_ssm:
+    """fake client where deleted names stay visible for a number of sweeps"""
+
+    def __init__(self, names, lag):
+        self.visible = {name: lag for name in names}
+        self.describe_calls = 0
+
+    def get_paginator(self, name):
+        assert name == "describe_parameters"
+        return self
+
+    def paginate(self, ParameterFilters):
+        self.describe_calls += 1
+        names = ParameterFilters[0]["Values"]
+        assert len(names) <= 50
+        params = []
+        for name in names:
+            if self.visible.get(name, 0) > 0:
+                self.visible[name] -= 1
+                params.append({"Name": name, "Description": "lingering"})
+        yield {"Parameters": params}
+
+
+def test_waiter_sweeps_all_pending_keys_together(monkeypatch):
+    monkeypatch.setattr(consistency, "sleep", lambda secs: None)
+    names = ["/lag/" + str(i) for i in range(60)]
+    ssm = lagging_ssm(names, lag=3)
+    waiter = consistency_waiter(ssm)
+    waiter.expect_deleted(names)
+    assert waiter.wait() == {}
+    # three sweeps with the names visible then one clean, two calls each
+    assert ssm.describe_calls == 8
+    assert waiter.pending() == set()
+
+
+def test_waiter_gives_up_at_deadline(monkeypatch):
+    monkeypatch.setattr(consistency, "sleep", lambda secs: None)
+    waiter = consistency_waiter(lagging_ssm(["/lag/a"], lag=1000), deadline=0)
+    waiter.expect_deleted(["/lag/a"])
+    try:
+        waiter.wait()
+    except consistency_timeout:
+        assert waiter.pending() == set()
+        return
+    assert False, "waiter did not time out"
+
+
+@mock_ssm
+def test_delete_parameters_batches_deletes():
+    ssm_dict = aws_ssm_dict()
+    params = {"/delete_test/" + str(i): str(i) for i in range(25)}
+    ssm_dict.upload_dictionary(params)
+    deleted, missing = ssm_dict.delete_parameters(
+        list(params.keys()) + ["/delete_test/none"], wait=False
+    )
+    assert sorted(deleted) == sorted(params.keys())
+    assert missing == ["/delete_test/none"]
+    # only keys which are waited for are tracked, not every write
+    assert ssm_dict.waiter.pending() == set()
+    ssm_dict.wait_until_consistent(deleted=deleted)
+    assert ssm_dict.waiter.pending() == set()
+    ssm_dict.verify_deleted_dictionary(params)
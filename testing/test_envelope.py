@@ -0,0 +1,81 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import backup_aws_ssm
+from backup_cloud_ssm.envelope import open_encrypted_backup
+from cryptography.hazmat.primitives.asymmetric import rsa
+from moto import mock_ssm
+from io import BytesIO
+import pytest
+
+private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+public_key = private_key.public_key()
+
+text = "".join(
+    '{"name": "/param/%d", "value": "%s"}\n' % (i, "x" * i) for i in range(500)
+)
+
+
+def encrypted(data, compression="gzip", chunk_size=1024):
+    f = BytesIO()
+    with open_encrypted_backup(f, "w", public_key, compression, chunk_size) as out:
+        out.write(data)
+    return f.getvalue()
+
+
+def decrypted(data, key=private_key):
+    with open_encrypted_backup(BytesIO(data), "r", key) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_encrypted_round_trip(compression):
+    data = encrypted(text, compression)
+    assert text.encode() not in data
+    assert decrypted(data) == text
+
+
+def test_compression_shrinks_backup():
+    assert len(encrypted(text, "gzip")) * 5 < len(encrypted(text, "none"))
+
+
+def test_tampered_backup_rejected():
+    data = bytearray(encrypted(text, "none"))
+    data[-10] ^= 1
+    with pytest.raises(ValueError):
+        decrypted(bytes(data))
+
+
+def test_truncated_backup_rejected():
+    data = encrypted(text, "none")
+    with pytest.raises(ValueError):
+        decrypted(data[: len(data) - 1500])
+
+
+def test_wrong_key_rejected():
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(ValueError):
+        decrypted(encrypted(text), other_key)
+
+
+@mock_ssm
+def test_encrypted_backup_and_restore():
+    params = {
+        "/encrypt_test/"
+        + str(i): {
+            "value": "secret " + str(i),
+            "type": "SecureString",
+            "description": "",
+        }
+        for i in range(20)
+    }
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict.upload_dictionary(params)
+    backup = BytesIO()
+    backup_aws_ssm.backup_to_file(backup, public_key=public_key)
+    ssm_dict.remove_dictionary(params)
+
+    backup.seek(0)
+    results = backup_aws_ssm.restore_from_file(
+        backup, rate=None, private_key=private_key
+    )
+    assert set(results.values()) == {backup_aws_ssm.created}
+    ssm_dict.verify_dictionary(params)
@@ -0,0 +1,96 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_format import read_records, tombstone
+from backup_cloud_ssm.incremental import incremental_backup, compact
+from moto import mock_ssm
+from io import StringIO
+
+
+def param(value):
+    return {"value": value, "type": "String", "description": "incremental test"}
+
+
+def delta(ssm_dict, manifest_file, full=False):
+    f = StringIO()
+    incremental_backup(f, manifest_file, full=full, ssm_dict=ssm_dict)
+    f.seek(0)
+    return dict(read_records(f))
+
+
+@mock_ssm
+def test_incremental_backup_writes_only_changes(tmp_path):
+    manifest_file = str(tmp_path / "manifest.json")
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict.upload_dictionary({"/inc/a": param("1"), "/inc/b": param("2")})
+
+    base = delta(ssm_dict, manifest_file)
+    assert base == {"/inc/a": param("1"), "/inc/b": param("2")}
+    assert delta(ssm_dict, manifest_file) == {}
+
+    ssm_dict.ssm.put_parameter(
+        Name="/inc/a",
+        Value="changed",
+        Type="String",
+        Description="incremental test",
+        Overwrite=True,
+    )
+    ssm_dict["/inc/c"] = param("3")
+    del ssm_dict["/inc/b"]
+    counts = {}
+    ssm_dict.ssm.meta.events.register(
+        "before-call.ssm",
+        lambda model, **kwargs: counts.update(
+            {model.name: counts.get(model.name, 0) + 1}
+        ),
+    )
+    changes = delta(ssm_dict, manifest_file)
+    assert changes == {
+        "/inc/a": param("changed"),
+        "/inc/c": param("3"),
+        "/inc/b": tombstone,
+    }
+    assert counts["GetParameters"] == 1
+
+    assert delta(ssm_dict, manifest_file, full=True) == {
+        "/inc/a": param("changed"),
+        "/inc/c": param("3"),
+    }
+
+
+def test_compact_applies_deltas_in_order(tmp_path):
+    base = tmp_path / "base.jsonl"
+    base.write_text(
+        '{"name": "/a", "value": "1", "type": "String", "description": ""}\n'
+        '{"name": "/b", "value": "2", "type": "String", "description": ""}\n'
+    )
+    change = tmp_path / "delta.jsonl"
+    change.write_text(
+        '{"name": "/a", "value": "3", "type": "String", "description": ""}\n'
+        '{"name": "/b", "deleted": true}\n'
+    )
+    output = StringIO()
+    compact([str(base), str(change)], output)
+    output.seek(0)
+    assert dict(read_records(output)) == {
+        "/a": {"value": "3", "type": "String", "description": ""}
+    }
+
+
+@mock_ssm
+def test_incremental_backup_and_compact_encrypted(tmp_path):
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_key = private_key.public_key()
+    manifest_file = str(tmp_path / "manifest.json")
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    secret = {"value": "hunter2", "type": "SecureString", "description": ""}
+    ssm_dict.upload_dictionary({"/inc/secret": secret})
+    base = str(tmp_path / "base.bak")
+    incremental_backup(base, manifest_file, ssm_dict=ssm_dict, public_key=public_key)
+    with open(base, "rb") as f:
+        assert b"hunter2" not in f.read()
+
+    output = StringIO()
+    compact([base], output, private_key=private_key)
+    output.seek(0)
+    assert dict(read_records(output)) == {"/inc/secret": secret}
@@ -0,0 +1,63 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.instrument import api_stats
+from moto import mock_ssm
+
+
+@mock_ssm
+def test_stats_count_calls_per_operation():
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    for i in range(3):
+        ssm_dict["/stats_test/" + str(i)] = ("String", str(i))
+    dict(ssm_dict.items())
+    try:
+        ssm_dict["/stats_test/none"]
+    except KeyError:
+        pass
+    operations = ssm_dict.stats.snapshot()["operations"]
+    assert operations["PutParameter"]["calls"] == 3
+    assert operations["GetParametersByPath"]["calls"] >= 1
+    assert operations["GetParameter"]["errors"] == 1
+    buckets = operations["PutParameter"]["latency_buckets"]
+    assert sum(buckets.values()) == 3
+
+
+@mock_ssm
+def test_stats_count_botocore_retries_and_throttles(throttle_first):
+    ssm_dict = aws_ssm_dict()
+    ssm_dict["/stats_test/a"] = "a"
+    throttle_first(ssm_dict.ssm, "GetParameter", 2)
+    assert ssm_dict["/stats_test/a"] == "a"
+    get = ssm_dict.stats.snapshot()["operations"]["GetParameter"]
+    assert get["calls"] == 1
+    assert get["retries"] == 2
+    assert get["throttles"] == 2
+    assert get["errors"] == 0
+
+
+@mock_ssm
+def test_shared_stats_are_not_counted_twice():
+    stats = api_stats()
+    first = aws_ssm_dict(stats=stats)
+    second = aws_ssm_dict(ssm_client=first.ssm, stats=stats)
+    second["/stats_test/a"] = "a"
+    assert stats.snapshot()["operations"]["PutParameter"]["calls"] == 1
+
+
+def test_stats_export_formats():
+    stats = api_stats()
+    with stats.lock:
+        stats.operation("GetParameter").calls = 2
+        stats.operation("GetParameter").observe(0.02)
+        stats.operation("GetParameter").observe(20)
+    stats.add_sleep("consistency", 1.5)
+    text = stats.prometheus_text()
+    assert 'ssm_backup_api_calls_total{operation="GetParameter"} 2' in text
+    assert (
+        'ssm_backup_api_latency_seconds_bucket{operation="GetParameter",le="0.025"} 1'
+        in text
+    )
+    assert 'ssm_backup_api_latency_seconds_count{operation="GetParameter"} 2' in text
+    assert 'ssm_backup_sleep_seconds_total{reason="consistency"} 1.5' in text
+    lines = stats.statsd_lines()
+    assert "ssm_backup.api.GetParameter.calls:2|c" in lines
+    assert "ssm_backup.sleep.consistency_seconds:1.5|g" in lines
@@ -0,0 +1,93 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.backup_format import read_records
+from backup_cloud_ssm.orchestrate import (
+    assume_role_provider,
+    backup_targets,
+    make_targets,
+    session_pool,
+    target_name,
+)
+from backup_cloud_ssm.envelope import open_encrypted_backup
+from cryptography.hazmat.primitives.asymmetric import rsa
+from datetime import datetime, timedelta, timezone
+from moto import mock_ssm, mock_sts
+import json
+import os
+
+regions = ["eu-west-1", "us-east-1", "ap-southeast-2"]
+
+
+@mock_ssm
+@mock_sts
+def test_backup_targets_writes_one_file_per_region(tmp_path):
+    for region in regions:
+        aws_ssm_dict(region_name=region)["/orchestrate/region"] = ("String", region)
+    role = "arn:aws:iam::123456789012:role/backup"
+    targets = make_targets(regions, role_arns=[None, role])
+    assert len(targets) == 6
+
+    results = backup_targets(targets, str(tmp_path), max_workers=4, rate=100)
+
+    assert [r["status"] for r in results] == ["ok"] * 6
+    for target, result in zip(targets, results):
+        with open(result["output"]) as f:
+            contents = dict(read_records(f))
+        assert contents["/orchestrate/region"]["value"] == target.region
+    with open(os.path.join(str(tmp_path), "summary.json")) as f:
+        assert json.load(f) == results
+
+
+@mock_ssm
+def test_encrypted_target_backups_are_named_enc(tmp_path):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    aws_ssm_dict(region_name="eu-west-1")["/orchestrate/region"] = "eu-west-1"
+    targets = make_targets(["eu-west-1"])
+
+    results = backup_targets(
+        targets, str(tmp_path), public_key=private_key.public_key()
+    )
+
+    assert results[0]["output"].endswith("eu-west-1.json.enc")
+    with open_encrypted_backup(results[0]["output"], "r", private_key) as f:
+        assert dict(read_records(f))["/orchestrate/region"]["value"] == "eu-west-1"
+
+
+def test_target_names_are_unique_and_safe():
+    role = "arn:aws:iam::123456789012:role/path/backup"
+    names = [target_name(t) for t in make_targets(regions, ["dev", "prod"], [role])]
+    assert len(set(names)) == len(names)
+    assert names[0] == "dev_123456789012-backup_eu-west-1"
+
+
+@mock_sts
+def test_assumed_role_sessions_use_the_role():
+    pool = session_pool()
+    session = pool.session(role_arn="arn:aws:iam::123456789012:role/backup")
+    credentials = session.get_credentials()
+    assert credentials.method == "assume-role"
+    assert credentials.get_frozen_credentials().token
+    assert pool.session(role_arn="arn:aws:iam::123456789012:role/backup") is session
+
+
+def test_assume_role_provider_refreshes_before_expiry():
+    now = [datetime(2024, 1, 1, tzinfo=timezone.utc)]
+    fetches = []
+
+    def fetch():
+        fetches.append(now[0])
+        return {
+            "access_key": "key" + str(len(fetches)),
+            "secret_key": "secret",
+            "token": "token",
+            "expiry_time": (now[0] + timedelta(hours=1)).isoformat(),
+        }
+
+    credentials = assume_role_provider(fetch, time_fetcher=lambda: now[0]).load()
+    assert fetches == []
+    assert credentials.get_frozen_credentials().access_key == "key1"
+    now[0] += timedelta(minutes=30)
+    assert credentials.get_frozen_credentials().access_key == "key1"
+    # as the role session runs out
+    now[0] += timedelta(minutes=25)
+    assert credentials.get_frozen_credentials().access_key == "key2"
+    assert len(fetches) == 2
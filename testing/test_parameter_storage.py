@@ -2,30 +2,28 @@ fixed_key = "/backup_cloud_aws_ssm_test/test_key"
 from hypothesis import given, settings, example
 import hypothesis.strategies as strategies
 from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
-from moto import mock_ssm
+from backup_cloud_ssm.backends import backend_client, memory_backend
 from os import environ as env
 import pytest
 from time import sleep
 from warnings import warn
 
 
-def identity(ob):
-    return ob
+def storage_dict(**kwargs):
+    """an aws_ssm_dict on SSM or, with MOCK_AWS, an in-memory backend"""
+    if env.get("MOCK_AWS", "false") == "true":
+        kwargs["ssm_client"] = backend_client(memory_backend())
+    return aws_ssm_dict(**kwargs)
 
 
-if env.get("MOCK_AWS", "false") == "true":
-    sometimes_mock_ssm = mock_ssm
-else:
-    sometimes_mock_ssm = identity
-
 badkey_examples = ("", "/", None)
 
 
-# this cannot be mocked via moto because moto accepts these keys!
+# moto accepts these keys but the memory backend checks names as SSM does
 @settings(deadline=10000)
 @given(strategies.sampled_from(badkey_examples))
 def test_bad_key_raises_exception(key):
-    ssm_dict = aws_ssm_dict()
+    ssm_dict = storage_dict()
     exception_thrown = False
     try:
         ssm_dict[key] = "the_value"
@@ -54,7 +52,6 @@ def store_key_with_types(ssm_dict, key, value, type_name, description):
     ssm_dict[key] = {"value": value, "type": type_name, "description": description}
 
 
-@sometimes_mock_ssm
 @pytest.mark.wip
 def test_store_restore_keys_with_common_start():
     key = "/test/fake/key_part"
@@ -62,7 +59,7 @@ def test_store_restore_keys_with_common_start():
     key2 = key + "_too"
     type_name = "String"
     description = "two matching strings test parameter"
-    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict = storage_dict(return_type="dict")
     try:
         ssm_dict[key2] = "this"
     except AttributeError as e:
@@ -97,11 +94,10 @@ def test_store_restore_keys_with_common_start():
     ), "return parameter mismatch"
 
 
-@sometimes_mock_ssm
 @settings(deadline=10000)
 @given(strategies.text(min_size=1, max_size=400))
 def test_store_returns_input(value):
-    ssm_dict = aws_ssm_dict()
+    ssm_dict = storage_dict()
     assert store_restore_key(ssm_dict, fixed_key, value) == value
 
 
@@ -112,7 +108,6 @@ type_names = ("SecureString", "String", "StringList")
 # function so we leave it in and keep increasing the time and retrys
 
 
-@sometimes_mock_ssm
 @settings(deadline=100000)
 @given(
     strategies.text(min_size=1, max_size=400),
@@ -122,7 +117,7 @@ type_names = ("SecureString", "String", "StringList")
 @example(value="0", type_name="SecureString", description="0")
 @example(value="0", type_name="SecureString", description="")
 def test_store_returns_input_with_type(value, type_name, description):
-    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict = storage_dict(return_type="dict")
     store_key_with_types(ssm_dict, fixed_key, value, type_name, description)
 
     max_retries = 10
@@ -151,12 +146,11 @@ def test_store_returns_input_with_type(value, type_name, description):
     ), "return parameter mismatch"
 
 
-@sometimes_mock_ssm
 def test_empty_string_is_stored_as_none_and_returned_as_empty():
     value = "empty desc demo"
     type_name = "SecureString"
     description = ""
-    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict = storage_dict(return_type="dict")
     try:
         del ssm_dict[fixed_key]
     except KeyError:
@@ -0,0 +1,82 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import rate_limit
+from backup_cloud_ssm.rate_limit import aimd_bucket, rate_controller
+from moto import mock_ssm
+import os
+
+
+def test_aimd_bucket_increases_additively_and_cuts_multiplicatively():
+    bucket = aimd_bucket(4.0, min_rate=1.0, max_rate=5.0, increase=1.0)
+    for i in range(4):
+        bucket.succeeded()
+    assert 4.5 < bucket.rate() < 5.0
+    for i in range(10):
+        bucket.succeeded()
+    assert bucket.rate() == 5.0
+    bucket.throttled()
+    assert bucket.rate() == 2.5
+    # throttles from calls already in flight don't cut again at once
+    bucket.throttled()
+    assert bucket.rate() == 2.5
+
+
+def test_aimd_bucket_never_drops_below_min_rate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit, "time", lambda: now[0])
+    bucket = aimd_bucket(4.0, min_rate=1.0)
+    for i in range(10):
+        now[0] += 10
+        bucket.throttled()
+    assert bucket.rate() == 1.0
+
+
+def test_aimd_buckets_share_state_through_a_file(tmp_path, monkeypatch):
+    now = [1000.0]
+    slept = []
+
+    def fake_sleep(secs):
+        slept.append(secs)
+        now[0] += secs
+
+    monkeypatch.setattr(rate_limit, "time", lambda: now[0])
+    monkeypatch.setattr(rate_limit, "sleep", fake_sleep)
+    state_file = str(tmp_path / "rate.json")
+    first = aimd_bucket(2.0, state_file=state_file)
+    second = aimd_bucket(2.0, state_file=state_file)
+    first.acquire()
+    assert slept == []
+    # the token was taken through the other bucket so this one waits
+    second.acquire()
+    assert slept == [0.5]
+    second.throttled()
+    assert first.rate() == 1.0
+
+
+@mock_ssm
+def test_controller_adapts_read_and_write_budgets_separately(throttle_first):
+    controller = rate_controller(read_rate=20.0, write_rate=20.0, max_write_rate=40.0)
+    ssm_dict = aws_ssm_dict(rate_controller=controller)
+    ssm_dict["/rate_test/a"] = "a"
+    throttle_first(ssm_dict.ssm, "GetParameter", 1)
+    assert ssm_dict["/rate_test/a"] == "a"
+    rates = controller.rates()
+    assert rates["read"] < 20.0
+    assert rates["write"] > 20.0
+
+
+def test_controller_state_is_kept_per_account_and_region(tmp_path):
+    state_dir = str(tmp_path)
+    ireland = rate_controller(
+        state_dir=state_dir, region_name="eu-west-1", account_id="123456789012"
+    )
+    virginia = rate_controller(
+        state_dir=state_dir, region_name="us-east-1", account_id="123456789012"
+    )
+    virginia.write.throttled()
+    assert ireland.rates()["write"] > virginia.rates()["write"]
+    assert sorted(os.listdir(state_dir)) == [
+        "123456789012-eu-west-1-read-rate.json",
+        "123456789012-eu-west-1-write-rate.json",
+        "123456789012-us-east-1-read-rate.json",
+        "123456789012-us-east-1-write-rate.json",
+    ]
@@ -0,0 +1,60 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.records import parameter_batch, parameter_record
+from datetime import datetime, timezone
+from moto import mock_ssm
+import tracemalloc
+
+
+def test_batch_round_trips_records_and_shapes():
+    when = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+    first = parameter_record("/records_test/a", "String", "a", "desc", 3, when)
+    second = parameter_record("/records_test/b", "SecureString", "b")
+    batch = parameter_batch([first, second])
+    assert len(batch) == 2
+    assert list(batch) == [first, second]
+    assert batch.get("/records_test/b").version is None
+    assert batch.get("/records_test/missing") is None
+    assert dict(batch.items())["/records_test/a"] == first.as_dict()
+    assert batch.as_tuple(batch.position("/records_test/a")) == first.as_tuple()
+
+    batch.append(parameter_record("/records_test/a", "String", "new"))
+    assert len(batch) == 2
+    assert batch.get("/records_test/a").value == "new"
+
+
+def test_batch_is_smaller_than_dicts():
+    def make(i):
+        # fresh strings for every parameter, as parsed responses have
+        return ("/records_test/" + str(i), "".join(["String"]), "value " + str(i))
+
+    def traced(build):
+        tracemalloc.start()
+        held = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del held
+        return size
+
+    dicts = traced(
+        lambda: {
+            name: {"value": value, "type": param_type, "description": ""}
+            for name, param_type, value in map(make, range(10000))
+        }
+    )
+    batch = traced(
+        lambda: parameter_batch(
+            parameter_record(name, param_type, value)
+            for name, param_type, value in map(make, range(10000))
+        )
+    )
+    assert batch < dicts * 0.75
+
+
+@mock_ssm
+def test_listed_records_match_dicts():
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    for i in range(12):
+        ssm_dict["/records_test/" + str(i)] = ("String", str(i), "desc " + str(i))
+    records = list(ssm_dict.iterate_records())
+    assert {r.name: r.as_dict() for r in records} == dict(ssm_dict.iterate_for_dicts())
+    assert all(r.version == 1 and r.last_modified is not None for r in records)
@@ -0,0 +1,85 @@
+from backup_cloud_ssm import backup_aws_ssm, replicate
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.replicate import sync
+from botocore.exceptions import ClientError
+from moto import mock_ssm
+import pytest
+
+
+def put_calls(ssm_dict):
+    operations = ssm_dict.stats.snapshot()["operations"]
+    return operations.get("PutParameter", {"calls": 0})["calls"]
+
+
+@mock_ssm
+def test_sync_copies_only_changes_between_regions(tmp_path):
+    source = aws_ssm_dict(return_type="dict", region_name="eu-west-1")
+    target = aws_ssm_dict(return_type="dict", region_name="us-east-1")
+    state_file = str(tmp_path / "sync.state")
+    for i in range(12):
+        source["/sync_test/" + str(i)] = ("String", str(i), "desc " + str(i))
+
+    counts = sync(source, target, state_file, rate=None, once=True)
+    assert counts == {"updated": 12, "deleted": 0, "failed": 0}
+    assert dict(target.items()) == dict(source.items())
+
+    # a restarted sync with nothing changed writes nothing
+    restarted_target = aws_ssm_dict(return_type="dict", region_name="us-east-1")
+    counts = sync(source, restarted_target, state_file, rate=None, once=True)
+    assert counts == {"updated": 0, "deleted": 0, "failed": 0}
+    assert put_calls(restarted_target) == 0
+
+    source.put_param("/sync_test/3", ("String", "changed"), overwrite=True)
+    source["/sync_test/new"] = ("String", "new")
+    source.delete_parameters(["/sync_test/5"])
+    counts = sync(source, restarted_target, state_file, rate=None, once=True)
+    assert counts == {"updated": 2, "deleted": 1, "failed": 0}
+    assert put_calls(restarted_target) == 2
+    assert dict(target.items()) == dict(source.items())
+
+
+@mock_ssm
+def test_sync_survives_failures_without_copying_twice(tmp_path, monkeypatch):
+    source = aws_ssm_dict(return_type="dict", region_name="eu-west-1")
+    target = aws_ssm_dict(return_type="dict", region_name="us-east-1")
+    state_file = str(tmp_path / "sync.state")
+    for i in range(14):
+        source["/sync_test/" + str(i)] = ("String", str(i))
+    sync(source, target, state_file, rate=None, once=True)
+
+    # a throttled delete is retried
+    monkeypatch.setattr(backup_aws_ssm, "sleep", lambda secs: None)
+    delete_parameters = target.delete_parameters
+    throttles = [ClientError({"Error": {"Code": "ThrottlingException"}}, "Delete")]
+
+    def throttled_delete(*args, **kwargs):
+        if throttles:
+            raise throttles.pop()
+        return delete_parameters(*args, **kwargs)
+
+    monkeypatch.setattr(target, "delete_parameters", throttled_delete)
+    source.delete_parameters(["/sync_test/0", "/sync_test/1"])
+    counts = sync(source, target, state_file, rate=None, once=True)
+    assert counts == {"updated": 0, "deleted": 2, "failed": 0}
+
+    # a pass which fails part way keeps what it copied and polling goes on
+    for i in range(2, 14):
+        source.put_param("/sync_test/" + str(i), ("String", "new"), overwrite=True)
+    batches = source.iterate_parameter_batches
+
+    def failing_batches(names):
+        listing = batches(names)
+        yield next(listing)
+        raise ConnectionError("network down")
+
+    def interrupt(secs):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(source, "iterate_parameter_batches", failing_batches)
+    monkeypatch.setattr(replicate, "sleep", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        sync(source, target, state_file, rate=None)
+    monkeypatch.setattr(source, "iterate_parameter_batches", batches)
+    counts = sync(source, target, state_file, rate=None, once=True)
+    assert counts == {"updated": 2, "deleted": 0, "failed": 0}
+    assert dict(target.items()) == dict(source.items())
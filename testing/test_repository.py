@@ -0,0 +1,87 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.repository import (
+    backup_repository,
+    backup_to_repository,
+    restore_from_repository,
+)
+from moto import mock_ssm
+import os
+import stat
+import threading
+
+
+def count_objects(repository):
+    return sum(len(files) for path, dirs, files in os.walk(repository.objects_dir))
+
+
+@mock_ssm
+def test_repository_stores_unchanged_parameters_once(tmp_path):
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    for i in range(12):
+        ssm_dict["/repo_test/" + str(i)] = ("String", str(i), "desc")
+    repository = backup_repository(str(tmp_path / "repo"))
+    first = backup_to_repository(repository, ssm_dict)
+    assert count_objects(repository) == 12
+
+    ssm_dict.put_param("/repo_test/3", ("String", "changed"), overwrite=True)
+    ssm_dict["/repo_test/new"] = ("String", "new")
+    del ssm_dict["/repo_test/5"]
+    second = backup_to_repository(repository, ssm_dict)
+    assert count_objects(repository) == 14
+    assert repository.snapshots() == [first, second]
+    assert repository.diff(first, second) == {
+        "added": ["/repo_test/new"],
+        "removed": ["/repo_test/5"],
+        "changed": ["/repo_test/3"],
+    }
+
+    repository.forget(first)
+    # the old /repo_test/3 and /repo_test/5 records are no longer used
+    assert repository.gc() == 2
+    assert count_objects(repository) == 12
+
+
+@mock_ssm
+def test_restore_snapshot_from_repository(tmp_path):
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    contents = {
+        "/repo_test/" + str(i): {"value": str(i), "type": "String", "description": ""}
+        for i in range(5)
+    }
+    for name, param in contents.items():
+        ssm_dict[name] = param
+    repository = backup_repository(str(tmp_path / "repo"))
+    snapshot_id = backup_to_repository(repository, ssm_dict)
+    ssm_dict.delete_parameters(contents.keys())
+
+    results = restore_from_repository(
+        repository, snapshot_id, rate=None, ssm_dict=ssm_dict
+    )
+    assert set(results.values()) == {"created"}
+    assert dict(ssm_dict.items()) == contents
+
+
+def test_repository_is_private_and_gc_waits_for_backups(tmp_path):
+    repository = backup_repository(str(tmp_path / "repo"))
+    collected = []
+    collector = threading.Thread(target=lambda: collected.append(repository.gc()))
+
+    def records():
+        yield ("/repo_test/a", {"value": "a", "type": "SecureString"})
+        # gc runs while the snapshot's manifest is still unwritten
+        collector.start()
+        collector.join(0.2)
+        assert collector.is_alive()
+        yield ("/repo_test/b", {"value": "b", "type": "SecureString"})
+
+    snapshot_id = repository.save_snapshot(records())
+    collector.join()
+    assert collected == [0]
+    assert len(dict(repository.snapshot_records(snapshot_id))) == 2
+
+    for path, dirs, files in os.walk(repository.path):
+        for name in dirs:
+            assert stat.S_IMODE(os.stat(os.path.join(path, name)).st_mode) == 0o700
+        for name in files:
+            if name != "lock":
+                assert stat.S_IMODE(os.stat(os.path.join(path, name)).st_mode) == 0o600
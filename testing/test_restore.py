@@ -0,0 +1,133 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import backup_aws_ssm
+from botocore.exceptions import ClientError
+from backup_cloud_ssm.restore_plan import diff_restore
+from backup_cloud_ssm.instrument import api_stats
+from moto import mock_ssm
+from io import StringIO
+import json
+
+
+def backup_contents(count):
+    return {
+        "/restore_test/"
+        + str(i): {
+            "value": "value " + str(i),
+            "type": "String",
+            "description": "restore test " + str(i),
+        }
+        for i in range(count)
+    }
+
+
+@mock_ssm
+def test_parallel_restore_reports_each_key():
+    contents = backup_contents(30)
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict["/restore_test/0"] = ("String", "preexisting")
+
+    results = backup_aws_ssm.restore_from_file(
+        StringIO(json.dumps(contents)), jobs=8, rate=1000
+    )
+
+    assert results["/restore_test/0"] == backup_aws_ssm.already_exists
+    summary = backup_aws_ssm.summarise_restore(results)
+    assert summary[backup_aws_ssm.created] == 29
+    assert summary[backup_aws_ssm.already_exists] == 1
+    assert summary[backup_aws_ssm.failed] == 0
+    del contents["/restore_test/0"]
+    assert {k: ssm_dict[k] for k in contents} == contents
+
+
+class throttled_dict:
+    """fake ssm dictionary which is throttled a number of times"""
+
+    exceptions = type("exceptions", (), {"ClientError": ClientError})
+
+    def __init__(self, throttle_count):
+        self.throttle_count = throttle_count
+        self.contents = {}
+        self.stats = api_stats()
+
+    def put_param(self, key, value, overwrite=False):
+        if self.throttle_count > 0:
+            self.throttle_count -= 1
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "slow down"}},
+                "PutParameter",
+            )
+        self.contents[key] = value
+
+
+def test_restore_parameter_retries_throttling(monkeypatch):
+    monkeypatch.setattr(backup_aws_ssm, "sleep", lambda secs: None)
+    fake_dict = throttled_dict(3)
+    assert backup_aws_ssm.restore_parameter(fake_dict, "k", "v") == "created"
+    assert fake_dict.contents == {"k": "v"}
+    assert fake_dict.stats.snapshot()["sleep_secs"]["throttle_backoff"] > 0
+
+
+def test_restore_parameter_gives_up_when_throttled_too_long(monkeypatch):
+    monkeypatch.setattr(backup_aws_ssm, "sleep", lambda secs: None)
+    try:
+        backup_aws_ssm.restore_parameter(throttled_dict(10), "k", "v", max_retries=2)
+    except ClientError:
+        return
+    assert False, "throttling error not raised after retries"
+
+
+@mock_ssm
+def test_restore_skips_parameters_outside_path():
+    contents = backup_contents(3)
+    contents["/elsewhere/key"] = contents["/restore_test/0"]
+    scoped = aws_ssm_dict(path="/elsewhere")
+    results = backup_aws_ssm.restore_from_file(
+        StringIO(json.dumps(contents)), rate=None, ssm_dict=scoped
+    )
+    assert results == {"/elsewhere/key": backup_aws_ssm.created}
+
+
+@mock_ssm
+def test_restore_tells_matching_from_mismatching_parameters():
+    contents = backup_contents(2)
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    ssm_dict["/restore_test/0"] = contents["/restore_test/0"]
+    ssm_dict["/restore_test/1"] = ("String", "changed", "restore test 1")
+    results = backup_aws_ssm.restore_from_file(
+        StringIO(json.dumps(contents)), rate=None
+    )
+    assert results == {
+        "/restore_test/0": backup_aws_ssm.identical,
+        "/restore_test/1": backup_aws_ssm.already_exists,
+    }
+
+
+@mock_ssm
+def test_diff_restore_writes_only_differences(count_calls):
+    contents = backup_contents(4)
+    ssm_dict = aws_ssm_dict(return_type="dict", path="/restore_test")
+    ssm_dict["/restore_test/0"] = contents["/restore_test/0"]
+    ssm_dict["/restore_test/1"] = ("String", "changed", "restore test 1")
+    ssm_dict["/restore_test/extra"] = ("String", "extra")
+
+    plan, results = diff_restore(StringIO(json.dumps(contents)), ssm_dict, dry_run=True)
+    assert plan.names == {
+        "create": ["/restore_test/2", "/restore_test/3"],
+        "overwrite": ["/restore_test/1"],
+        "identical": ["/restore_test/0"],
+        "extra": ["/restore_test/extra"],
+    }
+    assert results == {}
+    assert "/restore_test/2" not in list(ssm_dict.keys())
+
+    counts = count_calls(ssm_dict)
+    plan, results = diff_restore(
+        StringIO(json.dumps(contents)), ssm_dict, overwrite_changed=True, rate=None
+    )
+    assert counts["PutParameter"] == 3
+    assert results == {
+        "/restore_test/1": backup_aws_ssm.overwritten,
+        "/restore_test/2": backup_aws_ssm.created,
+        "/restore_test/3": backup_aws_ssm.created,
+    }
+    assert {k: ssm_dict[k] for k in contents} == contents
@@ -0,0 +1,69 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm import backup_aws_ssm
+from backup_cloud_ssm.s3_stream import open_s3_backup, min_part_size
+from botocore.config import Config
+from moto import mock_s3, mock_ssm
+import boto3
+import os
+import pytest
+
+bucket = "backup-test-bucket"
+
+
+def make_bucket():
+    # moto doesn't decode the aws-chunked bodies newer botocore sends
+    # for upload_part with checksums
+    s3 = boto3.client(
+        "s3",
+        region_name="us-east-1",
+        config=Config(request_checksum_calculation="when_required"),
+    )
+    s3.create_bucket(Bucket=bucket)
+    return s3
+
+
+@mock_s3
+def test_multipart_upload_and_ranged_read_round_trip():
+    s3 = make_bucket()
+    data = os.urandom(min_part_size * 2 + 12345)
+    url = "s3://" + bucket + "/big.bin"
+    with open_s3_backup(url, "wb", s3, part_size=min_part_size) as f:
+        for start in range(0, len(data), 100000):
+            f.write(data[start : start + 100000])
+    assert s3.list_multipart_uploads(Bucket=bucket).get("Uploads", []) == []
+    head = s3.head_object(Bucket=bucket, Key="big.bin")
+    # the ETag of a multipart object records how many parts it had
+    assert head["ETag"].endswith('-3"')
+
+    with open_s3_backup(url, "rb", s3, range_size=1000000) as f:
+        assert f.read() == data
+
+
+@mock_s3
+def test_failed_backup_leaves_no_object():
+    s3 = make_bucket()
+    url = "s3://" + bucket + "/failed.bin"
+    with pytest.raises(Exception, match="lost"):
+        with open_s3_backup(url, "wb", s3, part_size=min_part_size) as f:
+            f.write(b"x" * (min_part_size + 1))
+            raise Exception("connection lost")
+    assert s3.list_multipart_uploads(Bucket=bucket).get("Uploads", []) == []
+    assert s3.list_objects_v2(Bucket=bucket)["KeyCount"] == 0
+
+
+@mock_s3
+@mock_ssm
+def test_backup_and_restore_through_s3():
+    make_bucket()
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    for i in range(15):
+        ssm_dict["/s3_test/" + str(i)] = ("String", str(i), "desc " + str(i))
+    url = "s3://" + bucket + "/ssm.json"
+    backup_aws_ssm.backup_to_file(url, ssm_dict=ssm_dict)
+    original = dict(ssm_dict.items())
+
+    for name in list(original):
+        del ssm_dict[name]
+    results = backup_aws_ssm.restore_from_file(url, rate=None, ssm_dict=ssm_dict)
+    assert set(results.values()) == {"created"}
+    assert dict(ssm_dict.items()) == original
@@ -0,0 +1,46 @@
+from backup_cloud_ssm.aws_ssm_dict import aws_ssm_dict
+from backup_cloud_ssm.snapshot import snapshot_backup
+from datetime import datetime, timezone
+from moto import mock_ssm
+from io import StringIO
+import json
+import time
+
+
+def now_between_writes():
+    """a cutoff with writes on either side at SSM's millisecond resolution"""
+    time.sleep(0.01)
+    cutoff = datetime.now(timezone.utc)
+    time.sleep(0.01)
+    return cutoff
+
+
+@mock_ssm
+def test_snapshot_captures_parameters_as_of_cutoff():
+    ssm_dict = aws_ssm_dict(return_type="dict")
+    for i in range(15):
+        ssm_dict["/snapshot_test/" + str(i)] = ("String", "old " + str(i), "desc")
+    cutoff = now_between_writes()
+    ssm_dict.put_param(
+        "/snapshot_test/3", ("String", "new 3", "changed desc"), overwrite=True
+    )
+    ssm_dict["/snapshot_test/new"] = ("String", "created later")
+
+    backup = StringIO()
+    counts = snapshot_backup(backup, ssm_dict=ssm_dict, cutoff=cutoff)
+    contents = json.loads(backup.getvalue())
+    assert sorted(contents) == sorted("/snapshot_test/" + str(i) for i in range(15))
+    assert contents["/snapshot_test/3"] == {
+        "value": "old 3",
+        "type": "String",
+        "description": "desc",
+    }
+    assert counts.as_dict() == {
+        "listed": 14,
+        "from_history": 1,
+        "after_cutoff": 1,
+        "vanished": 0,
+    }
+    # history is only looked up for the parameters changed after cutoff
+    operations = ssm_dict.stats.snapshot()["operations"]
+    assert operations["GetParameterHistory"]["calls"] == 2